@@ -0,0 +1,189 @@
+"""
+Concurrent RL state load/save throughput against the SQLite backend.
+
+Compares three connection setups, each in a fresh process on its own database:
+
+    legacy           new connection per operation, rollback journal (the old get_db_connection)
+    pooled-rollback  per-thread pooled connections, rollback journal, synchronous=FULL
+    pooled-wal       per-thread pooled connections, WAL, synchronous=NORMAL (the default)
+
+legacy replaces get_db_connection with the old code, and its settings pin the pragmas
+to SQLite's and Python's defaults (2000 KiB page cache, no mmap, 5s busy timeout, 128
+cached statements) so the connections init_database opens match it too. Both pooled
+configurations use the tuned cache_size and mmap_size defaults.
+
+Every thread loads and saves randomly chosen users' states (--read-ratio of the
+operations are loads). Reports throughput, p50/p95/p99 latency and errors.
+
+Usage:
+    python -m benchmarks.bench_sqlite_state --threads 8 --ops 500 --users 50 --chunks 200
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.common import percentile
+
+
+CONFIGS = {
+    "legacy": {
+        "SQLITE_POOL_ENABLED": "false", "SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_CACHE_SIZE_KB": "2000", "SQLITE_MMAP_SIZE_MB": "0", "SQLITE_BUSY_TIMEOUT_MS": "5000",
+        "SQLITE_STATEMENT_CACHE": "128",
+    },
+    "pooled-rollback": {"SQLITE_POOL_ENABLED": "true", "SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "pooled-wal": {"SQLITE_POOL_ENABLED": "true", "SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"},
+}
+
+
+def make_state(rng: random.Random, chunks: int) -> Dict[str, Any]:
+    """Synthetic RL state with `chunks` tracked chunks"""
+    modes = ["quiz", "flashcard", "interactive"]
+    return {
+        "mode_alpha": {mode: rng.uniform(1, 20) for mode in modes},
+        "mode_beta": {mode: rng.uniform(1, 20) for mode in modes},
+        "mode_history": [{"mode": rng.choice(modes), "reward": rng.random()} for _ in range(50)],
+        "chunk_performance": {
+            f"doc{i % 5}_chunk_{i}": {"attempts": rng.randint(1, 9), "correct": rng.randint(0, 9), "last_attempt": None}
+            for i in range(chunks)
+        },
+        "file_mapping": {f"doc{i}": {"filename": f"doc{i}.pdf", "chunk_count": chunks // 5} for i in range(5)},
+        "survey_completed": True,
+        "initial_preference": "quiz",
+        "total_sessions": rng.randint(0, 100),
+        "last_updated": None,
+    }
+
+
+def run_worker(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one configuration in this process (settings come from the environment)"""
+    from src.core import database
+
+    if args.worker == "legacy":
+        @contextmanager
+        def legacy_db_connection():
+            conn = sqlite3.connect(str(database.get_db_path()), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+        database.get_db_connection = legacy_db_connection
+
+    rng = random.Random(args.seed)
+    usernames = [f"bench_user_{i}" for i in range(args.users)]
+    states = {username: make_state(rng, args.chunks) for username in usernames}
+    for username in usernames:
+        database.save_rl_state(username, states[username])
+
+    latencies: Dict[str, List[float]] = {"load": [], "save": []}
+    errors = {"load": 0, "save": 0}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(args.threads)
+
+    def run_thread(thread_index: int) -> None:
+        thread_rng = random.Random(args.seed * 1000 + thread_index)
+        local = {"load": [], "save": []}
+        local_errors = {"load": 0, "save": 0}
+        start_barrier.wait()
+        for _ in range(args.ops):
+            username = thread_rng.choice(usernames)
+            action = "load" if thread_rng.random() < args.read_ratio else "save"
+            started = time.perf_counter()
+            if action == "load":
+                ok = database.load_rl_state(username) is not None
+            else:
+                state = dict(states[username], total_sessions=thread_rng.randint(0, 1000))
+                ok = database.save_rl_state(username, state)
+            local[action].append(time.perf_counter() - started)
+            if not ok:
+                local_errors[action] += 1
+        with lock:
+            for action in local:
+                latencies[action].extend(local[action])
+                errors[action] += local_errors[action]
+
+    threads = [threading.Thread(target=run_thread, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    all_latencies = latencies["load"] + latencies["save"]
+    result = {
+        "config": args.worker,
+        "ops": len(all_latencies),
+        "seconds": elapsed,
+        "ops_per_second": len(all_latencies) / elapsed if elapsed else 0.0,
+        "errors": errors["load"] + errors["save"],
+    }
+    for action, values in latencies.items():
+        for pct in (50, 95, 99):
+            result[f"{action}_p{pct}_ms"] = percentile(values, pct) * 1000
+    return result
+
+
+def run_config(name: str, args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """Run one configuration in a child process and return its result"""
+    env = dict(os.environ)
+    env.update(CONFIGS[name])
+    env.update({"APP_DB_PATH": str(workdir / f"{name}.db"), "SUPABASE_URL": "", "SUPABASE_KEY": ""})
+    command = [
+        sys.executable, "-m", "benchmarks.bench_sqlite_state", "--worker", name,
+        "--threads", str(args.threads), "--ops", str(args.ops), "--users", str(args.users),
+        "--chunks", str(args.chunks), "--read-ratio", str(args.read_ratio), "--seed", str(args.seed),
+    ]
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    # The result is the last line; anything before it is log output
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent threads")
+    parser.add_argument("--ops", type=int, default=500, help="Operations per thread")
+    parser.add_argument("--users", type=int, default=50, help="Distinct users")
+    parser.add_argument("--chunks", type=int, default=200, help="Tracked chunks per user state")
+    parser.add_argument("--read-ratio", type=float, default=0.7, help="Fraction of operations that are loads")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--configs", default=",".join(CONFIGS), help="Comma-separated configurations to run")
+    parser.add_argument("--worker", choices=list(CONFIGS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    names = [name.strip() for name in args.configs.split(",") if name.strip()]
+    print(f"{args.threads} threads x {args.ops} ops, {args.users} users, {args.chunks} chunks/state, "
+          f"{args.read_ratio:.0%} loads")
+    print(f"{'config':<16} {'ops/s':>9} {'load p50':>9} {'load p95':>9} {'save p50':>9} {'save p95':>9} {'save p99':>9} {'errors':>7}")
+    with tempfile.TemporaryDirectory(prefix="bench_sqlite_") as tmp:
+        for name in names:
+            result = run_config(name, args, Path(tmp))
+            print(f"{name:<16} {result['ops_per_second']:>9.0f} "
+                  f"{result['load_p50_ms']:>7.2f}ms {result['load_p95_ms']:>7.2f}ms "
+                  f"{result['save_p50_ms']:>7.2f}ms {result['save_p95_ms']:>7.2f}ms "
+                  f"{result['save_p99_ms']:>7.2f}ms {result['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
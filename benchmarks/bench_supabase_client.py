@@ -0,0 +1,77 @@
+"""
+Per-call latency removed by caching the Supabase client.
+
+"fresh" drops the cached client before every call (reset_supabase_client), so each
+call re-reads the credentials, builds a new client and opens a new HTTPS
+connection, as every call used to. "cached" reuses the process-wide client and its
+keep-alive connections.
+
+Without --live only client construction is measured (no network). With --live,
+each call also loads an RL state from the configured project (SUPABASE_URL /
+SUPABASE_KEY), which includes the connection setup a fresh client pays for.
+
+Usage:
+    python -m benchmarks.bench_supabase_client --calls 200
+    python -m benchmarks.bench_supabase_client --live --calls 50 --username some_user
+"""
+
+import argparse
+import sys
+import time
+from typing import Callable, Dict
+
+from benchmarks.common import percentile
+
+
+def measure(call: Callable[[], object], calls: int, fresh: bool) -> Dict[str, float]:
+    """Latency of `calls` calls in ms, dropping the cached client before each one if fresh"""
+    from src.core.supabase_client import reset_supabase_client
+
+    # Warm up (imports, first connection)
+    call()
+    latencies = []
+    for _ in range(calls):
+        if fresh:
+            reset_supabase_client()
+        started = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    reset_supabase_client()
+    return {
+        "mean": sum(latencies) / len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--calls", type=int, default=200, help="Calls per mode")
+    parser.add_argument("--live", action="store_true", help="Include a state load against the configured project")
+    parser.add_argument("--username", default="benchmark_user", help="User whose state is loaded with --live")
+    args = parser.parse_args()
+
+    from src.core.supabase_client import get_supabase_client, load_rl_state_supabase
+
+    if get_supabase_client() is None:
+        print("Supabase is not configured (set SUPABASE_URL and SUPABASE_KEY and install supabase)")
+        sys.exit(1)
+
+    if args.live:
+        label = "client + load_rl_state_supabase"
+        call = lambda: load_rl_state_supabase(args.username)
+    else:
+        label = "get_supabase_client"
+        call = get_supabase_client
+
+    results = {mode: measure(call, args.calls, fresh=(mode == "fresh")) for mode in ("fresh", "cached")}
+    print(f"{label}, {args.calls} calls per mode")
+    print(f"{'mode':<8} {'mean':>10} {'p50':>10} {'p95':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<8} {result['mean']:>8.2f}ms {result['p50']:>8.2f}ms {result['p95']:>8.2f}ms")
+    saved = results["fresh"]["mean"] - results["cached"]["mean"]
+    print(f"Removed per call: {saved:.2f}ms mean")
+
+
+if __name__ == "__main__":
+    main()
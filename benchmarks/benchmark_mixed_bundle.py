@@ -0,0 +1,142 @@
+"""
+Benchmark mixed bundle generation: three parallel calls vs one combined call.
+
+Runs LLMAgent.generate_mixed_bundle on the same document in both modes and
+reports wall-clock latency, number of API calls, prompt/cached/completion
+tokens and estimated cost, so MIXED_BUNDLE_MODE can be chosen per deployment.
+
+Usage:
+    python -m benchmarks.benchmark_mixed_bundle path/to/document.pdf --runs 3
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from typing import Any, Dict, List
+
+from src.agents.llm_agent import LLMAgent, MIXED_BUNDLE_MODE_PARALLEL, MIXED_BUNDLE_MODE_SINGLE_CALL
+from src.agents.nlp_agent import NLPAgent
+from src.core.messages import ContentType, ExtractionRequest, GenerationRequest
+from src.core.usage import estimate_cost
+
+
+class UsageRecorder:
+    """Wraps chat.completions.create to record usage and latency of every call"""
+
+    def __init__(self, client):
+        self._create = client.chat.completions.create
+        self._lock = threading.Lock()
+        self.calls: List[Dict[str, Any]] = []
+        client.chat.completions.create = self.create
+
+    def create(self, *args, **kwargs):
+        start = time.perf_counter()
+        response = self._create(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self._lock:
+            self.calls.append({
+                "latency": elapsed,
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+                "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            })
+        return response
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = []
+
+
+def count_items(data: Dict[str, Any]) -> str:
+    """Summarize how many items each part of the bundle contains"""
+    questions = len((data.get("quiz") or {}).get("questions", []))
+    cards = len((data.get("flashcards") or {}).get("cards", []))
+    steps = len((data.get("interactive") or {}).get("steps", []))
+    return f"{questions}q/{cards}c/{steps}s"
+
+
+def run_mode(agent: LLMAgent, recorder: UsageRecorder, request: GenerationRequest, mode: str, runs: int) -> Dict[str, Any]:
+    """Run the mixed bundle in one mode and aggregate the measurements"""
+    agent.mixed_bundle_mode = mode
+    latencies, costs, prompt_tokens, cached_tokens, completion_tokens, calls = [], [], [], [], [], []
+    items = []
+
+    for run in range(runs):
+        recorder.reset()
+        start = time.perf_counter()
+        response = agent.generate_mixed_bundle(request)
+        latencies.append(time.perf_counter() - start)
+
+        prompt = sum(call["prompt_tokens"] for call in recorder.calls)
+        cached = sum(call["cached_tokens"] for call in recorder.calls)
+        completion = sum(call["completion_tokens"] for call in recorder.calls)
+        prompt_tokens.append(prompt)
+        cached_tokens.append(cached)
+        completion_tokens.append(completion)
+        calls.append(len(recorder.calls))
+        costs.append(estimate_cost(agent.model, prompt, cached, completion))
+        items.append(count_items(response.data) if response.success else f"failed: {response.error}")
+        print(f"  [{mode}] run {run + 1}/{runs}: {latencies[-1]:.1f}s, {prompt} prompt ({cached} cached) + "
+              f"{completion} completion tokens, {len(recorder.calls)} calls, {items[-1]}")
+
+    return {
+        "mode": mode,
+        "latency_median": statistics.median(latencies),
+        "latency_max": max(latencies),
+        "calls": statistics.mean(calls),
+        "prompt_tokens": statistics.mean(prompt_tokens),
+        "cached_tokens": statistics.mean(cached_tokens),
+        "completion_tokens": statistics.mean(completion_tokens),
+        "cost": statistics.mean(costs),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark parallel vs single-call mixed bundle generation")
+    parser.add_argument("document", help="PDF or text file to generate content from")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per mode (default: 3)")
+    parser.add_argument("--quiz", type=int, default=5, help="Quiz questions per bundle")
+    parser.add_argument("--flashcards", type=int, default=10, help="Flashcards per bundle")
+    parser.add_argument("--steps", type=int, default=3, help="Interactive steps per bundle")
+    args = parser.parse_args()
+
+    file_type = "pdf" if args.document.lower().endswith(".pdf") else "text"
+    extraction = NLPAgent().extract(ExtractionRequest(file_path=args.document, file_type=file_type))
+    if not extraction.success or not extraction.chunks:
+        raise SystemExit(f"Extraction failed: {extraction.error}")
+    print(f"Extracted {len(extraction.chunks)} chunks from {args.document}")
+
+    agent = LLMAgent()
+    recorder = UsageRecorder(agent.client)
+    request = GenerationRequest(
+        content_type=ContentType.MIXED,
+        chunks=extraction.chunks,
+        feedback_context={
+            "quiz": {"adaptive_count": args.quiz},
+            "flashcard": {"adaptive_count": args.flashcards},
+            "interactive": {"adaptive_count": args.steps},
+        }
+    )
+
+    results = [
+        run_mode(agent, recorder, request, mode, args.runs)
+        for mode in (MIXED_BUNDLE_MODE_PARALLEL, MIXED_BUNDLE_MODE_SINGLE_CALL)
+    ]
+
+    print()
+    print(f"Model: {agent.model}, runs per mode: {args.runs}")
+    print(f"{'mode':<12} {'p50 s':>7} {'max s':>7} {'calls':>6} {'prompt':>8} {'cached':>8} {'output':>8} {'cost $':>9}")
+    for result in results:
+        print(
+            f"{result['mode']:<12} {result['latency_median']:>7.1f} {result['latency_max']:>7.1f} "
+            f"{result['calls']:>6.1f} {result['prompt_tokens']:>8.0f} {result['cached_tokens']:>8.0f} "
+            f"{result['completion_tokens']:>8.0f} {result['cost']:>9.5f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
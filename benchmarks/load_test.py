@@ -0,0 +1,261 @@
+"""
+Headless load test: N simulated learners driving ManagerAgent end to end.
+
+Each simulated user completes the survey, then repeatedly uploads a document
+(extract), generates content, answers the quiz questions and gives feedback,
+with exponentially distributed think time between actions. OpenAI is replaced by
+the bundled fake server (src/tools/fake_llm_server.py) and state goes to a
+throwaway SQLite database, so runs are offline and reproducible.
+
+Reports p50/p95/p99 latency per action, throughput and RSS growth.
+
+Usage:
+    python -m benchmarks.load_test --users 40 --iterations 3 --think-time 2 --latency-mean 1.5
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.common import percentile
+
+
+MODES = ["quiz", "flashcard", "interactive"]
+
+SAMPLE_PARAGRAPHS = [
+    "Photosynthesis is the process by which green plants convert light energy into chemical energy. "
+    "Chlorophyll in the chloroplasts absorbs light, which drives the synthesis of glucose from carbon dioxide and water.",
+    "Cellular respiration releases the energy stored in glucose. It takes place in the mitochondria and "
+    "produces ATP, the energy currency of the cell, along with carbon dioxide and water as by-products.",
+    "The cell membrane is a phospholipid bilayer that controls which substances enter and leave the cell. "
+    "Proteins embedded in the membrane act as channels, pumps and receptors.",
+    "DNA stores genetic information as a sequence of nucleotides. During transcription the sequence is copied "
+    "into messenger RNA, which ribosomes translate into proteins.",
+    "Enzymes are biological catalysts that lower the activation energy of reactions. Their activity depends on "
+    "temperature, pH and the concentration of substrate.",
+]
+
+
+def current_rss_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Not Linux: fall back to peak RSS (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Recorder:
+    """Thread-safe latency and error recorder per action"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def timed(self, action: str, func: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            result = func()
+        except Exception:
+            with self._lock:
+                self.errors[action] += 1
+                self.latencies[action].append(time.perf_counter() - start)
+            return None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[action].append(elapsed)
+            if isinstance(result, dict) and not result.get("success", True):
+                self.errors[action] += 1
+        return result
+
+
+def write_sample_document(path: Path, paragraphs: int) -> None:
+    """Write a synthetic study document"""
+    rng = random.Random(0)
+    text = "\n\n".join(
+        f"Section {i + 1}. {rng.choice(SAMPLE_PARAGRAPHS)} {rng.choice(SAMPLE_PARAGRAPHS)}"
+        for i in range(paragraphs)
+    )
+    path.write_text(text, encoding="utf-8")
+
+
+def simulate_user(
+    user_index: int,
+    args: argparse.Namespace,
+    document: Path,
+    recorder: Recorder,
+    stop_at: Optional[float]
+) -> None:
+    """One learner: survey, then extract -> generate -> answer -> feedback cycles"""
+    from src.agents.manager_agent import ManagerAgent
+    from src.core.analytics import record_quiz_answers, extract_chunk_id_from_reference
+
+    rng = random.Random((args.seed or 0) * 100003 + user_index)
+
+    def think(mean: float) -> None:
+        if mean > 0:
+            time.sleep(rng.expovariate(1.0 / mean))
+
+    # Stagger start times over the ramp-up period
+    time.sleep(rng.uniform(0, args.ramp_up))
+
+    username = f"loadtest_user_{user_index}"
+    session_id = f"loadtest_session_{user_index}"
+    manager = recorder.timed("login", lambda: ManagerAgent(username=username))
+    if manager is None:
+        return
+
+    preference = rng.choice(MODES)
+    recorder.timed("survey", lambda: manager.process_user_request("survey", {"preference": preference}, session_id))
+
+    for _ in range(args.iterations):
+        if stop_at and time.time() >= stop_at:
+            break
+
+        extract_result = recorder.timed("extract", lambda: manager.process_user_request(
+            "extract",
+            {"file_path": str(document), "file_type": document.suffix[1:], "filename": document.name},
+            session_id
+        ))
+        chunks = (extract_result or {}).get("chunks") or []
+        if not chunks:
+            continue
+        think(args.think_time)
+
+        mode = preference if rng.random() < 0.7 else rng.choice(MODES)
+        generate_result = recorder.timed("generate", lambda: manager.process_user_request(
+            "generate",
+            {"content_type": mode, "chunks": chunks},
+            session_id
+        ))
+        data = (generate_result or {}).get("data") or {}
+
+        # Answers are buffered like the UI does and recorded together once the quiz is done
+        answers = []
+        for question in data.get("questions", []):
+            think(args.think_time / 2)
+            source_ref = question.get("source_reference", "")
+            answers.append({
+                "chunk_id": extract_chunk_id_from_reference(source_ref, filename=document.name),
+                "source_reference": source_ref,
+                "is_correct": rng.random() < 0.7,
+                "question_text": question.get("question", ""),
+                "filename": document.name
+            })
+        if answers:
+            recorder.timed("record_answers", lambda: record_quiz_answers(answers, username=username))
+
+        think(args.think_time)
+        recorder.timed("feedback", lambda: manager.process_user_request(
+            "update_rl",
+            {"mode": mode, "feedback": rng.choice([0.0, 0.5, 1.0])},
+            session_id
+        ))
+        think(args.think_time)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the learning platform with simulated users")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=3, help="Extract/generate/answer/feedback cycles per user")
+    parser.add_argument("--duration", type=float, default=None, help="Stop starting new cycles after this many seconds")
+    parser.add_argument("--think-time", type=float, default=3.0, help="Mean think time between actions (seconds)")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Spread user start times over this many seconds")
+    parser.add_argument("--document", type=str, default=None, help="PDF/text document (default: synthetic text)")
+    parser.add_argument("--paragraphs", type=int, default=40, help="Paragraphs in the synthetic document")
+    parser.add_argument("--latency-mean", type=float, default=1.0, help="Fake LLM mean latency (seconds)")
+    parser.add_argument("--latency-stddev", type=float, default=0.5, help="Fake LLM latency spread (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake LLM HTTP 500 rate")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fake LLM HTTP 429 rate")
+    parser.add_argument("--db-path", type=str, default=None, help="SQLite database (default: temporary file)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="loadtest_"))
+
+    # Configure the app before importing it: fake LLM, local SQLite only, no Supabase
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from src.tools.fake_llm_server import FakeLLMConfig, start_fake_llm_server
+
+    server = start_fake_llm_server(config=FakeLLMConfig(
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed
+    ))
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "fake-key"
+    os.environ["SUPABASE_URL"] = ""
+    os.environ["SUPABASE_KEY"] = ""
+    os.environ["APP_DB_PATH"] = args.db_path or str(workdir / "app_data.db")
+
+    if args.document:
+        document = Path(args.document)
+    else:
+        document = workdir / "loadtest_document.txt"
+        write_sample_document(document, args.paragraphs)
+
+    # Import the app up front so RSS growth measures the run, not module loading
+    import src.agents.manager_agent  # noqa: F401
+
+    recorder = Recorder()
+    rss_start = current_rss_mb()
+    rss_samples = [rss_start]
+    stop_at = time.time() + args.duration if args.duration else None
+
+    print(f"Running {args.users} users x {args.iterations} cycles against {server.base_url} "
+          f"(db: {os.environ['APP_DB_PATH']})")
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=simulate_user, args=(i, args, document, recorder, stop_at), daemon=True)
+        for i in range(args.users)
+    ]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(1.0)
+        rss_samples.append(current_rss_mb())
+    wall_time = time.perf_counter() - start
+    rss_end = current_rss_mb()
+    server.shutdown()
+
+    total_actions = sum(len(values) for values in recorder.latencies.values())
+    print()
+    print(f"{'action':<14} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for action, values in sorted(recorder.latencies.items()):
+        print(
+            f"{action:<14} {len(values):>6} {recorder.errors.get(action, 0):>6} "
+            f"{percentile(values, 50) * 1000:>9.1f} {percentile(values, 95) * 1000:>9.1f} "
+            f"{percentile(values, 99) * 1000:>9.1f} {max(values) * 1000:>9.1f}"
+        )
+    print()
+    print(f"Wall time: {wall_time:.1f}s, throughput: {total_actions / wall_time:.2f} actions/s "
+          f"({len(recorder.latencies.get('generate', [])) / wall_time * 60:.1f} generations/min)")
+    print(f"RSS: start {rss_start:.1f} MB, end {rss_end:.1f} MB, peak {max(rss_samples):.1f} MB, "
+          f"growth {rss_end - rss_start:+.1f} MB")
+    print(f"Fake LLM: {server.stats['requests']} requests, {server.stats['rate_limited']} rate limited, "
+          f"{server.stats['errors']} errors")
+
+    from src.core.usage import get_usage_totals
+
+    usage = get_usage_totals()
+    print(f"LLM usage: {usage['calls']} calls, {usage['prompt_tokens']} prompt + {usage['completion_tokens']} "
+          f"completion tokens, {usage['failures']} failed, ${usage['cost_usd']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
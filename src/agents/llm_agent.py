@@ -2,16 +2,122 @@
 
 import json
 import os
-from typing import Dict, Any
+import re
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple
 from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from openai import OpenAI
 from dotenv import load_dotenv
 
 from ..core.messages import GenerationRequest, GenerationResponse, ContentType
 from ..core.logger import logger
+from ..core.config import get_setting
+from ..core.rate_limiter import get_rate_limiter
+from ..core.schemas import validate_content
+from ..core.single_flight import SingleFlight
+from ..core.usage import get_response_usage, record_usage
+from ..tools.prompt_packer import PromptPacker, PackedChunks
+from ..tools.chunk_index import get_chunk_index, chunks_digest
 
 load_dotenv()
 
+# Maximum number of chunks considered for a prompt, ranked by information density
+MAX_RANKED_CHUNKS = 50
+
+# Keep at least this many chunks (adding back list-like chunks) when filtering
+MIN_SOURCE_CHUNKS = 20
+
+# Token room kept free for the mode-specific instructions when packing the shared source corpus
+INSTRUCTIONS_TOKEN_RESERVE = 1500
+
+# Expected completion tokens per call, charged to the rate limiter before the real usage is known
+COMPLETION_TOKEN_ESTIMATE = 2000
+
+# Maximum number of already-asked questions listed when generating the next page of a quiz
+MAX_EXCLUDED_QUESTIONS = 60
+
+# Mixed bundle generation: three parallel completions, or one completion returning all three types
+MIXED_BUNDLE_MODE_PARALLEL = "parallel"
+MIXED_BUNDLE_MODE_SINGLE_CALL = "single_call"
+
+# Prompt layout: [system prompt][source corpus][shared rules] form a prefix that is byte-identical
+# across quiz, flashcard and interactive requests (and retries) so the provider's prompt cache can
+# reuse it; only the mode-specific instructions at the end differ.
+SYSTEM_MESSAGE = """You are an educational content generator. Your ONLY job is to create learning content (quiz questions, flashcards, or interactive lesson plans) based EXCLUSIVELY on the source content provided by the user.
+
+⚠️ CRITICAL ANTI-HALLUCINATION CONSTRAINTS:
+- You MUST NOT use ANY information from your training data, general knowledge, or external sources
+- You MUST NOT add facts, examples, definitions, or knowledge NOT in the provided source
+- You MUST NOT paraphrase or interpret beyond what is explicitly stated
+- If information is missing from the source, you MUST NOT invent it - create fewer items instead
+- Every item MUST be directly traceable to a SPECIFIC chunk with exact quotes
+- If you cannot find explicit information in the source, DO NOT create that item
+- Adapt difficulty, clarity, and style based on user feedback, but ALWAYS use ONLY source content
+- Quote directly from the source when possible - use exact wording
+
+VALIDATION: Before including any information, ask: "Is this EXPLICITLY stated in the source?" If NO, do not include it.
+
+Always return valid JSON. NEVER hallucinate or add external knowledge. Better to have fewer accurate items than many invented ones."""
+
+SOURCE_HEADER = "Source Content (numbered by chunk):"
+
+SOURCE_RULES = """⚠️ CRITICAL ANTI-HALLUCINATION RULES - VIOLATION OF THESE RULES IS UNACCEPTABLE:
+1. ONLY use information that is EXPLICITLY and VERBATIM stated in the source content above
+2. DO NOT use ANY knowledge from your training data, general knowledge, or external sources
+3. DO NOT add facts, examples, definitions, or information NOT in the source
+4. DO NOT paraphrase or interpret - use the EXACT wording from the source when possible
+5. If information is not in the source, DO NOT include it in any question, card, step, option, or answer
+6. Every generated item MUST be directly traceable to a SPECIFIC chunk number
+7. For each item, you MUST quote or reference the EXACT text from the source that supports it
+8. If you cannot find the information in the source, DO NOT create that item
+9. DO NOT make assumptions or inferences beyond what is explicitly stated
+10. CRITICAL: In source_reference, use the ACTUAL chunk number from the source (e.g., if the item uses content from [Chunk 2], write "Chunk 2" in source_reference, NOT "Chunk 1" or "Chunk X")
+11. Different items can come from different chunks - use the correct chunk number for each item"""
+
+QUIZ_JSON_FORMAT = """{
+  "questions": [
+    {
+      "question": "Question text here (MUST be answerable DIRECTLY from source content - quote the relevant part)",
+      "options": ["Option A (from source)", "Option B (from source)", "Option C (from source)", "Option D (from source)"],
+      "correct_answer": 0,
+      "explanation": "Explanation with DIRECT QUOTE from source content showing where this answer comes from",
+      "difficulty": "easy, medium or hard",
+      "source_reference": "Chunk [NUMBER] - EXACT quote: '...' from the source above. IMPORTANT: Use the ACTUAL chunk number from the source (e.g., if content is from [Chunk 2], write 'Chunk 2', not 'Chunk 1' or 'Chunk X')"
+    }
+  ]
+}"""
+
+FLASHCARD_JSON_FORMAT = """{
+  "cards": [
+    {
+      "front": "Question or term on the front (MUST be from source content only)",
+      "back": "Answer or definition on the back (MUST be from source content only)",
+      "difficulty": "easy, medium or hard",
+      "source_reference": "Chunk [NUMBER] - brief quote or description. IMPORTANT: Use the ACTUAL chunk number from the source (e.g., if content is from [Chunk 2], write 'Chunk 2', not 'Chunk 1' or 'Chunk X')"
+    }
+  ]
+}"""
+
+INTERACTIVE_JSON_FORMAT = """{
+  "title": "Lesson title (MUST be based on source content only)",
+  "steps": [
+    {
+      "step_number": 1,
+      "title": "Step title (from source content)",
+      "content": "Step content and instructions (ONLY from source content)",
+      "checkpoint": "Question or task to check understanding (based on source content)",
+      "checkpoint_answer": "Model answer or solution (ONLY from source content)",
+      "difficulty": "easy, medium or hard",
+      "source_reference": "Chunk [NUMBER] - brief quote or description. IMPORTANT: Use the ACTUAL chunk number from the source (e.g., if content is from [Chunk 2], write 'Chunk 2', not 'Chunk 1' or 'Chunk X')"
+    }
+  ]
+}"""
+
+
+# Identical generations in flight across all sessions (same handout uploaded by a whole class)
+_generation_flights = SingleFlight()
+
 
 class LLMAgent:
     """Generates learning content using OpenAI GPT-4o-mini"""
@@ -41,9 +147,22 @@ class LLMAgent:
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in Streamlit secrets or environment variables. Please configure it in Streamlit Cloud secrets or .env file.")
         
-        self.client = OpenAI(api_key=api_key)
+        # Retries of rate-limited calls are handled by the shared rate limiter.
+        # OPENAI_BASE_URL points the agent at another OpenAI-compatible server (e.g. src/tools/fake_llm_server.py)
+        self.client = OpenAI(api_key=api_key, base_url=get_setting("OPENAI_BASE_URL") or None, max_retries=0)
         self.model = model
-        self.logger.info(f"LLM Agent initialized with model: {self.model}")
+        self.rate_limiter = get_rate_limiter()
+        self.packer = PromptPacker(self.model)
+        self._corpus_cache: Dict[Any, PackedChunks] = {}  # Shared source corpus per chunk list (mixed bundle, retries)
+        
+        self.mixed_bundle_mode = (get_setting("MIXED_BUNDLE_MODE", MIXED_BUNDLE_MODE_PARALLEL) or "").strip().lower()
+        if self.mixed_bundle_mode not in (MIXED_BUNDLE_MODE_PARALLEL, MIXED_BUNDLE_MODE_SINGLE_CALL):
+            self.logger.warning(f"Unknown MIXED_BUNDLE_MODE '{self.mixed_bundle_mode}', using '{MIXED_BUNDLE_MODE_PARALLEL}'")
+            self.mixed_bundle_mode = MIXED_BUNDLE_MODE_PARALLEL
+        self.logger.info(
+            f"LLM Agent initialized with model: {self.model} "
+            f"(prompt token budget: {self.packer.budget}, mixed bundle mode: {self.mixed_bundle_mode})"
+        )
     
     def generate(self, request: GenerationRequest) -> GenerationResponse:
         """
@@ -55,6 +174,75 @@ class LLMAgent:
         Returns:
             GenerationResponse with generated content
         """
+        try:
+            start = time.perf_counter()
+            response, shared = _generation_flights.do(
+                self._get_generation_key(request),
+                lambda: self._generate(request)
+            )
+            if shared:
+                self.logger.info(f"Reused in-flight {request.content_type.value} generation for identical request")
+                # The shared call's tokens are charged to the request that made it
+                record_usage(
+                    model=self.model,
+                    latency_ms=(time.perf_counter() - start) * 1000,
+                    success=response.success,
+                    username=request.username,
+                    file_hash=request.file_hash,
+                    content_type=request.content_type.value,
+                    priority=request.priority,
+                    coalesced=True
+                )
+            return response
+        
+        except Exception as e:
+            self.logger.exception("Error in LLM generation")
+            return GenerationResponse(
+                content_type=request.content_type,
+                data={},
+                success=False,
+                error=str(e)
+            )
+    
+    def _get_generation_key(self, request: GenerationRequest) -> Tuple:
+        """
+        Key identifying generations that produce interchangeable results.
+        
+        Priority is part of the key: an interactive request that joined a prefetch would wait
+        behind it in the rate limiter's prefetch queue.
+        
+        Feedback contexts are bucketed (adaptation instructions plus average feedback
+        rounded to 10%), so students with similar feedback history share one call.
+        """
+        def feedback_bucket(fc: Optional[Dict[str, Any]]) -> Tuple:
+            if not fc:
+                return ()
+            return (
+                bool(fc.get("has_feedback")),
+                fc.get("adaptation_instructions", ""),
+                round(float(fc.get("average_feedback", 0.5)), 1),
+                fc.get("adaptive_count")
+            )
+        
+        feedback_context = request.feedback_context or {}
+        if request.content_type == ContentType.MIXED:
+            feedback = tuple(feedback_bucket(feedback_context.get(key)) for key in ("quiz", "flashcard", "interactive"))
+        else:
+            feedback = feedback_bucket(feedback_context)
+        
+        return (
+            chunks_digest(request.chunks or []),
+            tuple(request.chunk_numbers or ()),
+            request.content_type.value,
+            request.num_items,
+            feedback,
+            tuple(request.exclude_questions or ()),
+            request.rotation,
+            request.priority
+        )
+    
+    def _generate(self, request: GenerationRequest) -> GenerationResponse:
+        """Dispatch a request to the generator for its content type"""
         try:
             if request.content_type == ContentType.QUIZ:
                 return self.generate_quiz(request)
@@ -98,125 +286,31 @@ class LLMAgent:
         
         num_questions = request.num_items or 5
         self.logger.info(f"Quiz generation requested: {num_questions} questions")
-        # Create numbered chunks for reference
-        chunks_with_numbers = []
-        chunk_objects = []  # Store (index, chunk) pairs for filtering
-        
-        for i, chunk in enumerate(chunks, 1):
-            if chunk.strip():  # Only include non-empty chunks
-                chunk_objects.append((i, chunk))
         
-        if not chunk_objects:
+        corpus = self._build_source_corpus(request)
+        if not corpus.chunks:
             return GenerationResponse(
                 content_type=ContentType.QUIZ,
                 data={},
                 success=False,
                 error="All chunks are empty. PDF extraction may have failed."
             )
+        num_source_chunks = len(corpus.chunks)
         
-        # Filter out very short chunks or simple lists (likely not useful for questions)
-        # Keep chunks that are substantial (more than just a list of terms)
-        filtered_chunks = []
-        for i, chunk in chunk_objects:
-            # Skip chunks that are just comma-separated lists with no sentences
-            # A chunk is likely a simple list if it has many commas but few periods/question marks
-            comma_count = chunk.count(',')
-            sentence_endings = chunk.count('.') + chunk.count('?') + chunk.count('!')
-            word_count = len(chunk.split())
-            
-            # Keep chunk if it has substantial content (sentences) or is long enough
-            if sentence_endings > 0 or word_count > 20 or comma_count < 5:
-                filtered_chunks.append((i, chunk))
-            else:
-                self.logger.debug(f"Skipping Chunk {i} - appears to be a simple list")
-        
-        # If we filtered out too many, keep some of the filtered ones
-        if len(filtered_chunks) < num_questions:
-            # Add back some of the filtered chunks to ensure we have enough
-            needed = num_questions - len(filtered_chunks)
-            for i, chunk in chunk_objects:
-                if (i, chunk) not in filtered_chunks and needed > 0:
-                    filtered_chunks.append((i, chunk))
-                    needed -= 1
-        
-        # For better diversity, sample chunks from across the document
-        if len(filtered_chunks) > 20:  # If we have many chunks, sample strategically
-            import random
-            # Sample evenly across the document
-            num_to_sample = min(50, len(filtered_chunks))
-            if num_to_sample < len(filtered_chunks):
-                step = max(1, len(filtered_chunks) // num_to_sample)
-                sampled = [filtered_chunks[i] for i in range(0, len(filtered_chunks), step)][:num_to_sample]
-                # Add some random chunks for extra diversity
-                if len(filtered_chunks) > num_to_sample:
-                    random_indices = random.sample(range(len(filtered_chunks)), min(10, len(filtered_chunks) - num_to_sample))
-                    for idx in random_indices:
-                        if filtered_chunks[idx] not in sampled:
-                            sampled.append(filtered_chunks[idx])
-                filtered_chunks = sampled
-                self.logger.info(f"Sampled {len(filtered_chunks)} chunks from {len(chunk_objects)} total chunks for diversity")
-        
-        # Format chunks with numbers
-        for i, chunk in filtered_chunks:
-            chunks_with_numbers.append(f"[Chunk {i}]\n{chunk}")
-        
-        chunks_text = "\n\n".join(chunks_with_numbers)
-        
-        # Limit total text to avoid token limits (GPT-4o-mini has 128k context, so we can use more)
-        # Using ~50k chars (~12k tokens) leaves plenty of room for prompt and response
-        max_chars = 50000
-        if len(chunks_text) > max_chars:
-            self.logger.warning(f"Chunks text too long ({len(chunks_text)} chars), truncating to {max_chars}")
-            # Instead of just truncating, try to include complete chunks
-            truncated_chunks = []
-            current_length = 0
-            for chunk in chunks_with_numbers:
-                if current_length + len(chunk) + 2 <= max_chars:  # +2 for "\n\n"
-                    truncated_chunks.append(chunk)
-                    current_length += len(chunk) + 2
-                else:
-                    break
-            chunks_text = "\n\n".join(truncated_chunks)
-            if len(chunks_with_numbers) > len(truncated_chunks):
-                chunks_text += f"\n\n[Note: {len(chunks_with_numbers) - len(truncated_chunks)} additional chunks were truncated due to length limits]"
+        feedback_section = self._build_feedback_section(request.feedback_context, "quiz questions")
         
-        # Build feedback adaptation section
-        feedback_section = ""
-        if request.feedback_context and request.feedback_context.get("has_feedback"):
-            fc = request.feedback_context
-            feedback_section = f"""
-
-FEEDBACK-BASED ADAPTATION:
-Based on user feedback history ({fc.get('feedback_count', 0)} previous interactions):
-- Average feedback: {fc.get('average_feedback', 0.5)*100:.1f}% positive
-- Recent feedback trend: {fc.get('positive_rate', 0.5)*100:.1f}% positive
+        # Next page of a quiz: don't repeat what the user has already seen
+        exclude_section = ""
+        if request.exclude_questions:
+            seen_questions = "\n".join(f"- {q}" for q in request.exclude_questions[-MAX_EXCLUDED_QUESTIONS:])
+            exclude_section = f"""
 
-ADAPTATION GUIDELINES:
-{fc.get('adaptation_instructions', 'Provide balanced, clear content.')}
-
-Please adapt the quiz questions accordingly while still using ONLY the source content below.
-"""
+ALREADY ASKED - the user has already answered these questions. Generate DIFFERENT questions, preferably from chunks these questions did not use:
+{seen_questions}"""
         
-        prompt = f"""You are generating quiz questions based EXCLUSIVELY on the source content provided below.{feedback_section}
+        instructions = f"""TASK: Generate quiz questions from the source content above.{feedback_section}{exclude_section}
 
-⚠️ CRITICAL ANTI-HALLUCINATION RULES - VIOLATION OF THESE RULES IS UNACCEPTABLE:
-1. ONLY use information that is EXPLICITLY and VERBATIM stated in the source content below
-2. DO NOT use ANY knowledge from your training data, general knowledge, or external sources
-3. DO NOT add facts, examples, definitions, or information NOT in the source
-4. DO NOT paraphrase or interpret - use the EXACT wording from the source when possible
-5. If information is not in the source, DO NOT include it in questions, options, or answers
-6. IMPORTANT: With {len(chunks_with_numbers)} chunks of content provided, you should be able to generate {num_questions} questions. Only generate fewer if you truly cannot find enough distinct information. Try to use different chunks for different questions.
-7. Every question, option, and explanation MUST be directly traceable to a SPECIFIC chunk number
-8. For each question, you MUST quote or reference the EXACT text from the source that supports it
-9. If you cannot find the answer in the source, DO NOT create that question
-10. DO NOT make assumptions or inferences beyond what is explicitly stated
-11. CRITICAL: In source_reference, use the ACTUAL chunk number from the source (e.g., if the question uses content from [Chunk 2], write "Chunk 2" in source_reference, NOT "Chunk 1" or "Chunk X")
-12. Different questions can come from different chunks - use the correct chunk number for each question
-
-Source Content (numbered by chunk):
-{chunks_text}
-
-CRITICAL REQUIREMENT: You have {len(chunks_with_numbers)} chunks of content available (over 50,000 characters). This is MORE than enough material to create {num_questions} questions.
+IMPORTANT: With {num_source_chunks} chunks of content provided, you should be able to generate {num_questions} questions. Only generate fewer if you truly cannot find enough distinct information.
 
 YOU MUST GENERATE EXACTLY {num_questions} QUESTIONS - NO FEWER, NO MORE.
 
@@ -224,24 +318,14 @@ YOU MUST GENERATE EXACTLY {num_questions} QUESTIONS - NO FEWER, NO MORE.
 - You MUST use DIFFERENT chunks for DIFFERENT questions - NO EXCEPTIONS
 - DO NOT use the same chunk for multiple questions - each question MUST come from a different chunk
 - Question 1 should use Chunk X, Question 2 should use Chunk Y (different from X), Question 3 should use Chunk Z (different from X and Y), etc.
-- Spread questions across as many different chunks as possible (aim to use at least {min(num_questions, len(chunks_with_numbers))} different chunks)
+- Spread questions across as many different chunks as possible (aim to use at least {min(num_questions, num_source_chunks)} different chunks)
 - If you see a chunk that's just a simple list (like "Term1, Term2, Term3"), SKIP IT and use chunks with more detailed content
 - Prioritize chunks with substantial content over simple lists or headings
 - Before creating each question, check: "Have I already used this chunk number?" If YES, use a different chunk
 - The source_reference MUST show different chunk numbers for different questions
 
 Generate EXACTLY {num_questions} multiple-choice quiz questions. Return a JSON object with this exact structure:
-{{
-  "questions": [
-    {{
-      "question": "Question text here (MUST be answerable DIRECTLY from source content - quote the relevant part)",
-      "options": ["Option A (from source)", "Option B (from source)", "Option C (from source)", "Option D (from source)"],
-      "correct_answer": 0,
-      "explanation": "Explanation with DIRECT QUOTE from source content showing where this answer comes from",
-      "source_reference": "Chunk [NUMBER] - EXACT quote: '...' from the source above. IMPORTANT: Use the ACTUAL chunk number from the source (e.g., if content is from [Chunk 2], write 'Chunk 2', not 'Chunk 1' or 'Chunk X')"
-    }}
-  ]
-}}
+{QUIZ_JSON_FORMAT}
 
 VALIDATION CHECKLIST before generating each question:
 - [ ] Can I find the answer EXPLICITLY stated in the source?
@@ -250,81 +334,69 @@ VALIDATION CHECKLIST before generating each question:
 - [ ] Have I NOT added any external knowledge?
 
 FINAL REMINDER: 
-- You have {len(chunks_with_numbers)} chunks with over 50,000 characters of content
 - You MUST return EXACTLY {num_questions} questions in the "questions" array
 - CRITICAL: Use DIFFERENT chunks for different questions - each question MUST have a different chunk number in source_reference
-- DO NOT use the same chunk twice - if you see "Chunk 1" in one question, use "Chunk 2", "Chunk 3", etc. for other questions
 - Skip simple list chunks - prioritize chunks with detailed explanations or substantial content
 - NEVER invent information - only use what's explicitly in the source
-- The JSON must have exactly {num_questions} items in the questions array
-- DO NOT return fewer than {num_questions} questions
 - Verify: Check that your source_reference values show different chunk numbers for each question"""
         
-        system_message = """You are an educational content generator. Your ONLY job is to create quiz questions based EXCLUSIVELY on the source content provided by the user.
-
-⚠️ CRITICAL ANTI-HALLUCINATION CONSTRAINTS:
-- You MUST NOT use ANY information from your training data, general knowledge, or external sources
-- You MUST NOT add facts, examples, definitions, or knowledge NOT in the provided source
-- You MUST NOT paraphrase or interpret beyond what is explicitly stated
-- If information is missing from the source, you MUST NOT invent it - create fewer questions instead
-- Every question, option, and answer MUST be directly traceable to a SPECIFIC chunk with exact quotes
-- If you cannot find explicit information in the source, DO NOT create that question
-- Adapt question difficulty, clarity, and style based on user feedback, but ALWAYS use ONLY source content
-- Quote directly from the source when possible - use exact wording
-
-VALIDATION: Before including any information, ask: "Is this EXPLICITLY stated in the source?" If NO, do not include it.
-
-Always return valid JSON. NEVER hallucinate or add external knowledge. Better to have fewer accurate questions than many invented ones."""
+        messages = self._build_messages(corpus, instructions)
         
         try:
             max_retries = 1  # Reduced to 1 retry for speed (only retry if < 50% of requested)
             questions = []
+            data = {}
             
             for attempt in range(max_retries + 1):
                 if attempt > 0:
-                    # On retry, be more explicit about needing the exact number
-                    retry_prompt = f"""You previously generated only {len(questions)} questions, but I need EXACTLY {num_questions} questions.
-
-You have {len(chunks_with_numbers)} chunks of content available. This is MORE than enough to create {num_questions} questions.
-
-REQUIREMENT: Generate EXACTLY {num_questions} questions. Use different chunks for different questions. Even if some chunks have less information, you can still create questions from them.
-
-Here is the source content again:
-{chunks_text}
-
-Generate EXACTLY {num_questions} multiple-choice quiz questions. Return a JSON object with this exact structure:
-{{
-  "questions": [
-    {{
-      "question": "Question text here (MUST be answerable DIRECTLY from source content - quote the relevant part)",
-      "options": ["Option A (from source)", "Option B (from source)", "Option C (from source)", "Option D (from source)"],
-      "correct_answer": 0,
-      "explanation": "Explanation with DIRECT QUOTE from source content showing where this answer comes from",
-      "source_reference": "Chunk [NUMBER] - EXACT quote: '...' from the source above. IMPORTANT: Use the ACTUAL chunk number from the source (e.g., if content is from [Chunk 2], write 'Chunk 2', not 'Chunk 1' or 'Chunk X')"
-    }}
-  ]
-}}
+                    # On retry, only top up the missing questions instead of regenerating the whole set.
+                    # The retry is a follow-up turn after the original prompt, so the cached prefix
+                    # (system prompt + source corpus) is reused and only the short request below is new.
+                    missing_count = num_questions - len(questions)
+                    used_chunk_numbers = self._get_referenced_chunks(questions)
+                    unused_numbers = [i for i, _ in corpus.chunks if i not in used_chunk_numbers]
+                    if not unused_numbers:
+                        # Every chunk was already used - allow any chunk
+                        unused_numbers = [i for i, _ in corpus.chunks]
+                    
+                    self.logger.info(
+                        f"Top-up retry: requesting {missing_count} more questions from "
+                        f"{len(unused_numbers)} unused chunks (skipping {len(used_chunk_numbers)} already referenced)"
+                    )
+                    
+                    retry_prompt = f"""You generated {len(questions)} questions, but I need {missing_count} MORE.
 
-You MUST return EXACTLY {num_questions} questions in the array."""
-                    current_prompt = retry_prompt
+Generate EXACTLY {missing_count} NEW multiple-choice quiz questions using ONLY these chunks, which no question has used yet: {", ".join(f"Chunk {i}" for i in unused_numbers)}.
+DO NOT repeat any of the questions you already generated. Follow the same rules and return a JSON object with the same structure, containing ONLY the {missing_count} new questions in the "questions" array."""
+                    current_messages = messages + [
+                        {"role": "assistant", "content": json.dumps({"questions": questions})},
+                        {"role": "user", "content": retry_prompt}
+                    ]
                 else:
-                    current_prompt = prompt
+                    current_messages = messages
                 
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": current_prompt}
-                    ],
+                response = self._chat_completion(
+                    current_messages,
+                    request,
                     temperature=0.1,  # Very low temperature to minimize creativity/hallucination
                     response_format={"type": "json_object"}
                 )
                 
                 content = response.choices[0].message.content
-                data = json.loads(content)
+                # Invalid questions are dropped individually; the top-up retry replaces them
+                attempt_data = validate_content(ContentType.QUIZ, json.loads(content))
+                new_questions = attempt_data["questions"]
+                
+                if attempt == 0:
+                    data = attempt_data
+                    questions = new_questions
+                else:
+                    # Merge top-up questions with the ones we already have
+                    questions = questions + new_questions[:num_questions - len(questions)]
+                    self.logger.info(f"Top-up retry returned {len(new_questions)} questions, {len(questions)} total after merge")
+                data["questions"] = questions
                 
                 # Validate that we got questions
-                questions = data.get("questions", [])
                 if not questions or len(questions) == 0:
                     if attempt < max_retries:
                         self.logger.warning(f"Attempt {attempt + 1}: Quiz generation returned empty questions array, retrying...")
@@ -345,7 +417,7 @@ You MUST return EXACTLY {num_questions} questions in the array."""
                 # Only retry if we got significantly fewer questions (< 50% of requested)
                 # This avoids unnecessary retries for small differences
                 if len(questions) < (num_questions * 0.5) and attempt < max_retries:
-                    self.logger.warning(f"Attempt {attempt + 1}: Generated {len(questions)} questions but {num_questions} were requested. Retrying to get more...")
+                    self.logger.warning(f"Attempt {attempt + 1}: Generated {len(questions)} questions but {num_questions} were requested. Topping up the missing questions...")
                 elif attempt < max_retries:
                     # Got at least 50% but not all - accept it to save time
                     self.logger.info(f"Generated {len(questions)} questions (requested {num_questions}). Accepting result to save time.")
@@ -377,6 +449,182 @@ You MUST return EXACTLY {num_questions} questions in the array."""
                 error=str(e)
             )
     
+    def _chat_completion(self, messages: List[Dict[str, str]], request: GenerationRequest, **kwargs):
+        """Send a chat completion through the process-wide rate limiter and record its token usage"""
+        estimated_tokens = self.packer.count_message_tokens(messages) + kwargs.get("max_tokens", COMPLETION_TOKEN_ESTIMATE)
+        call_stats = {"retries": 0}
+        usage = {}
+        success = False
+        start = time.perf_counter()
+        try:
+            response = self.rate_limiter.call(
+                self.client.chat.completions.create,
+                estimated_tokens=estimated_tokens,
+                priority=request.priority,
+                call_stats=call_stats,
+                model=self.model,
+                messages=messages,
+                **kwargs
+            )
+            usage = get_response_usage(response)
+            success = True
+            return response
+        finally:
+            record_usage(
+                model=self.model,
+                latency_ms=(time.perf_counter() - start) * 1000,
+                retries=call_stats["retries"],
+                success=success,
+                username=request.username,
+                file_hash=request.file_hash,
+                content_type=request.content_type.value,
+                priority=request.priority,
+                **usage
+            )
+    
+    def _get_chunk_numbers(self, request: GenerationRequest) -> List[int]:
+        """
+        Chunk numbers used in prompts and source references (1..n unless the request carries its own).
+        
+        Raises:
+            ValueError: If chunk_numbers doesn't have one number per chunk (positional numbers
+                would make source references, and analytics chunk IDs, point at the wrong chunks)
+        """
+        if not request.chunk_numbers:
+            return list(range(1, len(request.chunks) + 1))
+        if len(request.chunk_numbers) != len(request.chunks):
+            self.logger.error(
+                f"Got {len(request.chunk_numbers)} chunk numbers for {len(request.chunks)} chunks"
+            )
+            raise ValueError("chunk_numbers must have one entry per chunk")
+        return list(request.chunk_numbers)
+    
+    def _build_source_corpus(self, request: GenerationRequest) -> PackedChunks:
+        """
+        Select and pack the source chunks shared by every content type.
+        
+        The selection only depends on the chunks and the rotation (never on the content type,
+        item count or feedback), so quiz, flashcard and interactive prompts - and their retries -
+        start with a byte-identical prefix that the provider can serve from its prompt cache.
+        
+        Args:
+            request: GenerationRequest with chunks (and optional chunk_numbers and rotation)
+        
+        Returns:
+            PackedChunks with the corpus text and the selected (chunk_number, chunk) pairs
+        """
+        chunks = request.chunks or []
+        chunk_numbers = self._get_chunk_numbers(request)
+        cache_key = (chunks_digest(chunks), tuple(chunk_numbers), request.rotation)
+        cached = self._corpus_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Drop empty chunks and simple lists (likely not useful for learning content) using the
+        # feature table built with the chunk index at extraction time; if that leaves too few
+        # chunks, list chunks are added back in document order
+        index = get_chunk_index(chunks)
+        useful = index.features.useful_mask(min_count=MIN_SOURCE_CHUNKS)
+        skipped = int((~index.features.is_empty).sum() - useful.sum())
+        if skipped:
+            self.logger.debug(f"Skipping {skipped} chunks that appear to be simple lists")
+        
+        # Rank chunks by information density so the prompt carries the most useful material
+        filtered_chunks, chunk_scores = self._select_dense_chunks(chunks, useful, chunk_numbers, rotation=request.rotation)
+        
+        # Reserve the system prompt, shared rules and room for the mode-specific instructions
+        reserved_tokens = self.packer.count_message_tokens([
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": f"{SOURCE_HEADER}\n\n{SOURCE_RULES}"}
+        ]) + INSTRUCTIONS_TOKEN_RESERVE
+        corpus = self.packer.pack(filtered_chunks, reserved_tokens=reserved_tokens, scores=chunk_scores)
+        if corpus.dropped:
+            corpus.text += f"\n\n[Note: {len(corpus.dropped)} additional chunks were left out due to length limits]"
+        
+        if len(self._corpus_cache) >= 8:
+            self._corpus_cache.clear()
+        self._corpus_cache[cache_key] = corpus
+        return corpus
+    
+    def _select_dense_chunks(
+        self,
+        chunks: List[str],
+        mask: np.ndarray,
+        chunk_numbers: List[int],
+        limit: int = MAX_RANKED_CHUNKS,
+        rotation: int = 0
+    ) -> Tuple[List[Tuple[int, str]], Dict[int, float]]:
+        """
+        Keep the top-k candidate chunks by information density using the document's BM25 index.
+        
+        Rotation n skips the n*limit densest chunks (wrapping around), so regenerated content
+        and later quiz pages are drawn from the chunks earlier generations left out.
+        
+        Args:
+            chunks: Chunk list of the request
+            mask: Boolean mask of candidate chunk positions
+            chunk_numbers: Chunk number of each entry in chunks
+            limit: Maximum number of chunks to keep
+            rotation: Number of earlier selections to skip
+        
+        Returns:
+            (selected (chunk_number, chunk) pairs in document order, chunk_number -> density score)
+        """
+        index = get_chunk_index(chunks)
+        scores = index.density_scores()
+        candidates = np.flatnonzero(mask)
+        chunk_scores = {chunk_numbers[pos]: float(scores[pos]) for pos in candidates}
+        
+        positions = index.top_k(limit, mask=mask, offset=rotation * limit)
+        if len(positions) < len(candidates):
+            self.logger.info(f"Selected {len(positions)} densest chunks from {len(candidates)} candidates (rotation {rotation})")
+        
+        return [(chunk_numbers[pos], chunks[pos]) for pos in positions], chunk_scores
+    
+    def _build_feedback_section(self, feedback_context: Optional[Dict[str, Any]], content_label: str) -> str:
+        """Build the feedback adaptation section for the mode-specific instructions"""
+        if not feedback_context or not feedback_context.get("has_feedback"):
+            return ""
+        
+        fc = feedback_context
+        return f"""
+
+FEEDBACK-BASED ADAPTATION:
+Based on user feedback history ({fc.get('feedback_count', 0)} previous interactions):
+- Average feedback: {fc.get('average_feedback', 0.5)*100:.1f}% positive
+- Recent feedback trend: {fc.get('positive_rate', 0.5)*100:.1f}% positive
+
+ADAPTATION GUIDELINES:
+{fc.get('adaptation_instructions', 'Provide balanced, clear content.')}
+
+Please adapt the {content_label} accordingly while still using ONLY the source content above."""
+    
+    def _build_messages(self, corpus: PackedChunks, instructions: str) -> List[Dict[str, str]]:
+        """
+        Build chat messages with a stable prefix (system prompt, source corpus, shared rules)
+        followed by the mode-specific instructions.
+        """
+        user_content = f"{SOURCE_HEADER}\n{corpus.text}\n\n{SOURCE_RULES}\n\n{instructions}"
+        messages = [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": user_content}
+        ]
+        self.logger.info(
+            f"Prompt uses {self.packer.count_message_tokens(messages)} tokens "
+            f"({corpus.tokens} source, budget {self.packer.budget}) with {len(corpus.chunks)} chunks"
+        )
+        return messages
+    
+    def _get_referenced_chunks(self, items) -> Set[int]:
+        """Collect the chunk numbers referenced in the source_reference of generated items"""
+        chunk_numbers = set()
+        for item in items:
+            source_ref = item.get("source_reference", "") if isinstance(item, dict) else ""
+            match = re.search(r'[Cc]hunk\s*(\d+)', str(source_ref))
+            if match:
+                chunk_numbers.add(int(match.group(1)))
+        return chunk_numbers
+    
     def generate_flashcards(self, request: GenerationRequest) -> GenerationResponse:
         """Generate flashcards"""
         # Validate chunks are present and non-empty
@@ -393,13 +641,9 @@ You MUST return EXACTLY {num_questions} questions in the array."""
         self.logger.info(f"Generating flashcards with {len(chunks)} chunks, total length: {sum(len(c) for c in chunks)} chars")
         
         num_cards = request.num_items or 10
-        # Create numbered chunks for reference
-        chunks_with_numbers = []
-        for i, chunk in enumerate(chunks, 1):
-            if chunk.strip():  # Only include non-empty chunks
-                chunks_with_numbers.append(f"[Chunk {i}]\n{chunk}")
         
-        if not chunks_with_numbers:
+        corpus = self._build_source_corpus(request)
+        if not corpus.chunks:
             return GenerationResponse(
                 content_type=ContentType.FLASHCARD,
                 data={},
@@ -407,104 +651,30 @@ You MUST return EXACTLY {num_questions} questions in the array."""
                 error="All chunks are empty. PDF extraction may have failed."
             )
         
-        chunks_text = "\n\n".join(chunks_with_numbers)
-        
-        # Limit total text to avoid token limits (GPT-4o-mini has 128k context, so we can use more)
-        # Using ~50k chars (~12k tokens) leaves plenty of room for prompt and response
-        max_chars = 50000
-        if len(chunks_text) > max_chars:
-            self.logger.warning(f"Chunks text too long ({len(chunks_text)} chars), truncating to {max_chars}")
-            # Instead of just truncating, try to include complete chunks
-            truncated_chunks = []
-            current_length = 0
-            for chunk in chunks_with_numbers:
-                if current_length + len(chunk) + 2 <= max_chars:  # +2 for "\n\n"
-                    truncated_chunks.append(chunk)
-                    current_length += len(chunk) + 2
-                else:
-                    break
-            chunks_text = "\n\n".join(truncated_chunks)
-            if len(chunks_with_numbers) > len(truncated_chunks):
-                chunks_text += f"\n\n[Note: {len(chunks_with_numbers) - len(truncated_chunks)} additional chunks were truncated due to length limits]"
+        feedback_section = self._build_feedback_section(request.feedback_context, "flashcards")
         
-        # Build feedback adaptation section
-        feedback_section = ""
-        if request.feedback_context and request.feedback_context.get("has_feedback"):
-            fc = request.feedback_context
-            feedback_section = f"""
+        instructions = f"""TASK: Generate flashcards from the source content above.{feedback_section}
 
-FEEDBACK-BASED ADAPTATION:
-Based on user feedback history ({fc.get('feedback_count', 0)} previous interactions):
-- Average feedback: {fc.get('average_feedback', 0.5)*100:.1f}% positive
-- Recent feedback trend: {fc.get('positive_rate', 0.5)*100:.1f}% positive
-
-ADAPTATION GUIDELINES:
-{fc.get('adaptation_instructions', 'Provide balanced, clear content.')}
-
-Please adapt the flashcards accordingly while still using ONLY the source content below.
-"""
-        
-        prompt = f"""You are generating flashcards based EXCLUSIVELY on the source content provided below.{feedback_section}
-
-⚠️ CRITICAL ANTI-HALLUCINATION RULES - VIOLATION OF THESE RULES IS UNACCEPTABLE:
-1. ONLY use information that is EXPLICITLY and VERBATIM stated in the source content below
-2. DO NOT use ANY knowledge from your training data, general knowledge, or external sources
-3. DO NOT add facts, examples, definitions, or information NOT in the source
-4. DO NOT paraphrase or interpret - use the EXACT wording from the source when possible
-5. If information is not in the source, DO NOT include it in flashcards
-6. If the source doesn't contain enough information for {num_cards} cards, generate FEWER cards (even just 1-2 if needed)
-7. Every front and back content MUST be directly traceable to a SPECIFIC chunk number
-8. For each flashcard, you MUST quote or reference the EXACT text from the source
-9. If you cannot find the information in the source, DO NOT create that flashcard
-10. DO NOT make assumptions or inferences beyond what is explicitly stated
-11. CRITICAL: In source_reference, use the ACTUAL chunk number from the source (e.g., if the flashcard uses content from [Chunk 2], write "Chunk 2" in source_reference, NOT "Chunk 1" or "Chunk X")
-12. Different flashcards can come from different chunks - use the correct chunk number for each flashcard
-
-Source Content (numbered by chunk):
-{chunks_text}
+If the source doesn't contain enough information for {num_cards} cards, generate FEWER cards (even just 1-2 if needed).
+Every front and back MUST be directly traceable to a SPECIFIC chunk number.
 
 Generate {num_cards} flashcards. Return a JSON object with this exact structure:
-{{
-  "cards": [
-    {{
-      "front": "Question or term on the front (MUST be from source content only)",
-      "back": "Answer or definition on the back (MUST be from source content only)",
-      "source_reference": "Chunk [NUMBER] - brief quote or description. IMPORTANT: Use the ACTUAL chunk number from the source (e.g., if content is from [Chunk 2], write 'Chunk 2', not 'Chunk 1' or 'Chunk X')"
-    }}
-  ]
-}}
+{FLASHCARD_JSON_FORMAT}
 
 REMEMBER: If you cannot create a flashcard using ONLY the source content, create fewer cards. Never invent information."""
         
-        system_message = """You are an educational content generator. Your ONLY job is to create flashcards based EXCLUSIVELY on the source content provided by the user.
-
-⚠️ CRITICAL ANTI-HALLUCINATION CONSTRAINTS:
-- You MUST NOT use ANY information from your training data, general knowledge, or external sources
-- You MUST NOT add facts, examples, definitions, or knowledge NOT in the provided source
-- You MUST NOT paraphrase or interpret beyond what is explicitly stated
-- If information is missing from the source, you MUST NOT invent it - create fewer cards instead
-- Every flashcard front and back MUST be directly traceable to a SPECIFIC chunk with exact quotes
-- If you cannot find explicit information in the source, DO NOT create that flashcard
-- Adapt flashcard complexity and clarity based on user feedback, but ALWAYS use ONLY source content
-- Quote directly from the source when possible - use exact wording
-
-VALIDATION: Before including any information, ask: "Is this EXPLICITLY stated in the source?" If NO, do not include it.
-
-Always return valid JSON. NEVER hallucinate or add external knowledge. Better to have fewer accurate cards than many invented ones."""
+        messages = self._build_messages(corpus, instructions)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt}
-                ],
+            response = self._chat_completion(
+                messages,
+                request,
                 temperature=0.1,  # Very low temperature to minimize creativity/hallucination
                 response_format={"type": "json_object"}
             )
             
             content = response.choices[0].message.content
-            data = json.loads(content)
+            data = validate_content(ContentType.FLASHCARD, json.loads(content))
             
             # Store chunks for source reference display
             data["_source_chunks"] = chunks
@@ -540,13 +710,9 @@ Always return valid JSON. NEVER hallucinate or add external knowledge. Better to
         self.logger.info(f"Generating interactive content with {len(chunks)} chunks, total length: {sum(len(c) for c in chunks)} chars")
         
         num_steps = request.num_items or 3
-        # Create numbered chunks for reference
-        chunks_with_numbers = []
-        for i, chunk in enumerate(chunks, 1):
-            if chunk.strip():  # Only include non-empty chunks
-                chunks_with_numbers.append(f"[Chunk {i}]\n{chunk}")
         
-        if not chunks_with_numbers:
+        corpus = self._build_source_corpus(request)
+        if not corpus.chunks:
             return GenerationResponse(
                 content_type=ContentType.INTERACTIVE,
                 data={},
@@ -554,108 +720,30 @@ Always return valid JSON. NEVER hallucinate or add external knowledge. Better to
                 error="All chunks are empty. PDF extraction may have failed."
             )
         
-        chunks_text = "\n\n".join(chunks_with_numbers)
-        
-        # Limit total text to avoid token limits (GPT-4o-mini has 128k context, so we can use more)
-        # Using ~50k chars (~12k tokens) leaves plenty of room for prompt and response
-        max_chars = 50000
-        if len(chunks_text) > max_chars:
-            self.logger.warning(f"Chunks text too long ({len(chunks_text)} chars), truncating to {max_chars}")
-            # Instead of just truncating, try to include complete chunks
-            truncated_chunks = []
-            current_length = 0
-            for chunk in chunks_with_numbers:
-                if current_length + len(chunk) + 2 <= max_chars:  # +2 for "\n\n"
-                    truncated_chunks.append(chunk)
-                    current_length += len(chunk) + 2
-                else:
-                    break
-            chunks_text = "\n\n".join(truncated_chunks)
-            if len(chunks_with_numbers) > len(truncated_chunks):
-                chunks_text += f"\n\n[Note: {len(chunks_with_numbers) - len(truncated_chunks)} additional chunks were truncated due to length limits]"
-        
-        # Build feedback adaptation section
-        feedback_section = ""
-        if request.feedback_context and request.feedback_context.get("has_feedback"):
-            fc = request.feedback_context
-            feedback_section = f"""
-
-FEEDBACK-BASED ADAPTATION:
-Based on user feedback history ({fc.get('feedback_count', 0)} previous interactions):
-- Average feedback: {fc.get('average_feedback', 0.5)*100:.1f}% positive
-- Recent feedback trend: {fc.get('positive_rate', 0.5)*100:.1f}% positive
-
-ADAPTATION GUIDELINES:
-{fc.get('adaptation_instructions', 'Provide balanced, clear content.')}
-
-Please adapt the interactive lesson accordingly while still using ONLY the source content below.
-"""
+        feedback_section = self._build_feedback_section(request.feedback_context, "interactive lesson")
         
-        prompt = f"""You are generating an interactive lesson plan based EXCLUSIVELY on the source content provided below.{feedback_section}
+        instructions = f"""TASK: Generate an interactive lesson plan from the source content above.{feedback_section}
 
-⚠️ CRITICAL ANTI-HALLUCINATION RULES - VIOLATION OF THESE RULES IS UNACCEPTABLE:
-1. ONLY use information that is EXPLICITLY and VERBATIM stated in the source content below
-2. DO NOT use ANY knowledge from your training data, general knowledge, or external sources
-3. DO NOT add facts, examples, definitions, or information NOT in the source
-4. DO NOT paraphrase or interpret - use the EXACT wording from the source when possible
-5. If information is not in the source, DO NOT include it in the lesson
-6. If the source doesn't contain enough information for {num_steps} steps, generate FEWER steps (even just 1-2 if needed)
-7. Every step, checkpoint, and answer MUST be directly traceable to a SPECIFIC chunk number
-8. For each step, you MUST quote or reference the EXACT text from the source
-9. If you cannot find the information in the source, DO NOT create that step
-10. DO NOT make assumptions or inferences beyond what is explicitly stated
-11. CRITICAL: In source_reference, use the ACTUAL chunk number from the source (e.g., if the step uses content from [Chunk 2], write "Chunk 2" in source_reference, NOT "Chunk 1" or "Chunk X")
-12. Different steps can come from different chunks - use the correct chunk number for each step
-
-Source Content (numbered by chunk):
-{chunks_text}
+If the source doesn't contain enough information for {num_steps} steps, generate FEWER steps (even just 1-2 if needed).
+Every step, checkpoint, and answer MUST be directly traceable to a SPECIFIC chunk number.
 
 Generate an interactive {num_steps}-step lesson plan. Return a JSON object with this exact structure:
-{{
-  "title": "Lesson title (MUST be based on source content only)",
-  "steps": [
-    {{
-      "step_number": 1,
-      "title": "Step title (from source content)",
-      "content": "Step content and instructions (ONLY from source content)",
-      "checkpoint": "Question or task to check understanding (based on source content)",
-      "checkpoint_answer": "Model answer or solution (ONLY from source content)",
-      "source_reference": "Chunk [NUMBER] - brief quote or description. IMPORTANT: Use the ACTUAL chunk number from the source (e.g., if content is from [Chunk 2], write 'Chunk 2', not 'Chunk 1' or 'Chunk X')"
-    }}
-  ]
-}}
+{INTERACTIVE_JSON_FORMAT}
 
 REMEMBER: If you cannot create a step using ONLY the source content, create fewer steps. Never invent information, examples, or facts."""
         
-        system_message = """You are an educational content generator. Your ONLY job is to create interactive lesson plans based EXCLUSIVELY on the source content provided by the user.
-
-⚠️ CRITICAL ANTI-HALLUCINATION CONSTRAINTS:
-- You MUST NOT use ANY information from your training data, general knowledge, or external sources
-- You MUST NOT add facts, examples, definitions, or knowledge NOT in the provided source
-- You MUST NOT paraphrase or interpret beyond what is explicitly stated
-- If information is missing from the source, you MUST NOT invent it - create fewer steps instead
-- Every step, checkpoint, and answer MUST be directly traceable to a SPECIFIC chunk with exact quotes
-- If you cannot find explicit information in the source, DO NOT create that step
-- Adapt lesson complexity, step size, and clarity based on user feedback, but ALWAYS use ONLY source content
-- Quote directly from the source when possible - use exact wording
-
-VALIDATION: Before including any information, ask: "Is this EXPLICITLY stated in the source?" If NO, do not include it.
-
-Always return valid JSON. NEVER hallucinate or add external knowledge. Better to have fewer accurate steps than many invented ones."""
+        messages = self._build_messages(corpus, instructions)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt}
-                ],
+            response = self._chat_completion(
+                messages,
+                request,
                 temperature=0.1,  # Very low temperature to minimize creativity/hallucination
                 response_format={"type": "json_object"}
             )
             
             content = response.choices[0].message.content
-            data = json.loads(content)
+            data = validate_content(ContentType.INTERACTIVE, json.loads(content))
             
             # Store chunks for source reference display
             data["_source_chunks"] = chunks
@@ -718,26 +806,51 @@ Always return valid JSON. NEVER hallucinate or add external knowledge. Better to
                 if interactive_feedback and "adaptive_count" in interactive_feedback:
                     interactive_count = interactive_feedback["adaptive_count"]
         
+        if self.mixed_bundle_mode == MIXED_BUNDLE_MODE_SINGLE_CALL:
+            return self._generate_mixed_bundle_single_call(
+                request,
+                quiz_count, flashcard_count, interactive_count,
+                quiz_feedback, flashcard_feedback, interactive_feedback
+            )
+        
         # Generate all three content types in parallel for speed
         quiz_request = GenerationRequest(
             content_type=ContentType.QUIZ,
             chunks=request.chunks,
+            chunk_numbers=request.chunk_numbers,
+            rotation=request.rotation,
+            priority=request.priority,
+            username=request.username,
+            file_hash=request.file_hash,
             num_items=quiz_count,
             feedback_context=quiz_feedback
         )
         flashcard_request = GenerationRequest(
             content_type=ContentType.FLASHCARD,
             chunks=request.chunks,
+            chunk_numbers=request.chunk_numbers,
+            rotation=request.rotation,
+            priority=request.priority,
+            username=request.username,
+            file_hash=request.file_hash,
             num_items=flashcard_count,
             feedback_context=flashcard_feedback
         )
         interactive_request = GenerationRequest(
             content_type=ContentType.INTERACTIVE,
             chunks=request.chunks,
+            chunk_numbers=request.chunk_numbers,
+            rotation=request.rotation,
+            priority=request.priority,
+            username=request.username,
+            file_hash=request.file_hash,
             num_items=interactive_count,
             feedback_context=interactive_feedback
         )
         
+        # Build the shared source corpus once so all three prompts start with the same cached prefix
+        self._build_source_corpus(request)
+        
         # Generate all three in parallel
         self.logger.info("Starting parallel generation of quiz, flashcards, and interactive content...")
         try:
@@ -792,6 +905,122 @@ Always return valid JSON. NEVER hallucinate or add external knowledge. Better to
         
         self.logger.info("Parallel generation completed")
         
+        return self._combine_mixed_responses(quiz_response, flashcard_response, interactive_response)
+    
+    def _generate_mixed_bundle_single_call(
+        self,
+        request: GenerationRequest,
+        quiz_count: int,
+        flashcard_count: int,
+        interactive_count: int,
+        quiz_feedback: Optional[Dict[str, Any]] = None,
+        flashcard_feedback: Optional[Dict[str, Any]] = None,
+        interactive_feedback: Optional[Dict[str, Any]] = None
+    ) -> GenerationResponse:
+        """
+        Generate quiz, flashcards and interactive lesson with one completion over one copy of the source.
+        
+        Args:
+            request: Mixed bundle GenerationRequest
+            quiz_count: Number of quiz questions
+            flashcard_count: Number of flashcards
+            interactive_count: Number of lesson steps
+            quiz_feedback: Feedback context for quiz adaptation
+            flashcard_feedback: Feedback context for flashcard adaptation
+            interactive_feedback: Feedback context for interactive adaptation
+        
+        Returns:
+            GenerationResponse with the same data layout as the parallel mixed bundle
+        """
+        chunks = request.chunks or []
+        corpus = self._build_source_corpus(request)
+        if not corpus.chunks:
+            return GenerationResponse(
+                content_type=ContentType.MIXED,
+                data={},
+                success=False,
+                error="All chunks are empty. PDF extraction may have failed."
+            )
+        
+        quiz_feedback_section = self._build_feedback_section(quiz_feedback, "quiz questions")
+        flashcard_feedback_section = self._build_feedback_section(flashcard_feedback, "flashcards")
+        interactive_feedback_section = self._build_feedback_section(interactive_feedback, "interactive lesson")
+        
+        instructions = f"""TASK: Generate a mixed learning bundle from the source content above: quiz questions, flashcards AND an interactive lesson plan.
+
+PART 1 - QUIZ: Generate EXACTLY {quiz_count} multiple-choice quiz questions. Use a DIFFERENT chunk for each question and skip chunks that are just simple lists.{quiz_feedback_section}
+
+PART 2 - FLASHCARDS: Generate {flashcard_count} flashcards. If the source doesn't contain enough information, generate FEWER cards.{flashcard_feedback_section}
+
+PART 3 - INTERACTIVE LESSON: Generate an interactive {interactive_count}-step lesson plan. If the source doesn't contain enough information, generate FEWER steps.{interactive_feedback_section}
+
+Every question, card and step MUST be directly traceable to a SPECIFIC chunk number. Return a JSON object with this exact structure:
+{{
+  "quiz": {QUIZ_JSON_FORMAT},
+  "flashcards": {FLASHCARD_JSON_FORMAT},
+  "interactive": {INTERACTIVE_JSON_FORMAT}
+}}
+
+REMEMBER: All three parts are required. Never invent information - create fewer items instead."""
+        
+        messages = self._build_messages(corpus, instructions)
+        
+        self.logger.info("Starting single-call generation of quiz, flashcards, and interactive content...")
+        try:
+            response = self._chat_completion(
+                messages,
+                request,
+                temperature=0.1,  # Very low temperature to minimize creativity/hallucination
+                response_format={"type": "json_object"}
+            )
+            
+            content = response.choices[0].message.content
+            bundle = json.loads(content)
+        except Exception as e:
+            self.logger.error(f"Error generating mixed bundle in a single call: {e}")
+            return GenerationResponse(
+                content_type=ContentType.MIXED,
+                data={},
+                success=False,
+                error=str(e)
+            )
+        
+        self.logger.info("Single-call generation completed")
+        
+        def section_response(content_type: ContentType, key: str, items_key: str) -> GenerationResponse:
+            section = bundle.get(key)
+            if isinstance(section, dict):
+                section = validate_content(content_type, section)
+            if not isinstance(section, dict) or not section.get(items_key):
+                return GenerationResponse(
+                    content_type=content_type,
+                    data={},
+                    success=False,
+                    error=f"No {items_key} were generated"
+                )
+            # Store chunks for source reference display
+            section["_source_chunks"] = chunks
+            return GenerationResponse(content_type=content_type, data=section, success=True)
+        
+        quiz_response = section_response(ContentType.QUIZ, "quiz", "questions")
+        flashcard_response = section_response(ContentType.FLASHCARD, "flashcards", "cards")
+        interactive_response = section_response(ContentType.INTERACTIVE, "interactive", "steps")
+        
+        if quiz_response.success and len(quiz_response.data["questions"]) < quiz_count:
+            self.logger.warning(
+                f"Single-call bundle generated {len(quiz_response.data['questions'])} questions "
+                f"but {quiz_count} were requested."
+            )
+        
+        return self._combine_mixed_responses(quiz_response, flashcard_response, interactive_response)
+    
+    def _combine_mixed_responses(
+        self,
+        quiz_response: GenerationResponse,
+        flashcard_response: GenerationResponse,
+        interactive_response: GenerationResponse
+    ) -> GenerationResponse:
+        """Combine the per-type responses into a mixed bundle response"""
         # Combine into mixed bundle
         # Include data even if generation had errors, as long as we have some content
         data = {
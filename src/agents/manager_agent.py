@@ -3,14 +3,21 @@
 from typing import Dict, Any, Optional
 from openai import OpenAI
 import os
+import time
 from dotenv import load_dotenv
 
 from ..core.orchestrator import ManagerAgent as Orchestrator
 from ..core.messages import ManagerCommand, LearningMode
 from ..core.logger import logger
+from ..core.config import get_setting
+from ..core.rate_limiter import get_rate_limiter, PRIORITY_INTERACTIVE
+from ..core.usage import get_response_usage, record_usage
 
 load_dotenv()
 
+# Expected prompt + completion tokens of a preference reasoning call (for the rate limiter)
+REASONING_TOKEN_ESTIMATE = 600
+
 
 class ManagerAgent:
     """
@@ -28,7 +35,8 @@ class ManagerAgent:
         api_key = os.getenv("OPENAI_API_KEY")
         if api_key:
             try:
-                self.openai_client = OpenAI(api_key=api_key)
+                # Retries of rate-limited calls are handled by the shared rate limiter
+                self.openai_client = OpenAI(api_key=api_key, base_url=get_setting("OPENAI_BASE_URL") or None, max_retries=0)
                 self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
             except Exception as e:
                 self.logger.warning(f"Could not initialize OpenAI client: {e}")
@@ -100,15 +108,38 @@ Return JSON with this structure:
 }}
 """
             
-            response = self.openai_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert learning advisor. Always return valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5,
-                response_format={"type": "json_object"}
-            )
+            call_stats = {"retries": 0}
+            usage = {}
+            success = False
+            start = time.perf_counter()
+            try:
+                response = get_rate_limiter().call(
+                    self.openai_client.chat.completions.create,
+                    estimated_tokens=REASONING_TOKEN_ESTIMATE,
+                    priority=PRIORITY_INTERACTIVE,
+                    call_stats=call_stats,
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "You are an expert learning advisor. Always return valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.5,
+                    response_format={"type": "json_object"}
+                )
+                usage = get_response_usage(response)
+                success = True
+            finally:
+                # Failed calls are recorded too (latency, retries)
+                record_usage(
+                    model=self.model,
+                    latency_ms=(time.perf_counter() - start) * 1000,
+                    retries=call_stats["retries"],
+                    success=success,
+                    username=self.username,
+                    content_type="reasoning",
+                    priority=PRIORITY_INTERACTIVE,
+                    **usage
+                )
             
             import json
             result = json.loads(response.choices[0].message.content)
@@ -7,6 +7,7 @@ from transformers import pipeline
 from ..core.messages import ExtractionRequest, ExtractionResponse
 from ..core.logger import logger
 from ..tools.pdf_extractor import extract_text_from_pdf, extract_text_from_file
+from ..tools.chunk_index import build_chunk_index
 
 
 class NLPAgent:
@@ -86,6 +87,13 @@ class NLPAgent:
             # Clean and chunk text
             chunks = self.chunk_text(raw_text)
             
+            # Build the relevance index once so generation can rank chunks cheaply
+            if chunks:
+                try:
+                    build_chunk_index(chunks)
+                except Exception as e:
+                    self.logger.warning(f"Could not build chunk index: {e}")
+            
             # Generate summary if text is long
             summary = None
             if len(raw_text) > 1000 and self.summarizer:
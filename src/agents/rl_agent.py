@@ -6,6 +6,7 @@ from typing import Dict, Optional
 
 from ..core.messages import RLUpdateRequest, RLRecommendation
 from ..core.memory import load_state, save_state, RLState
+from ..core import performance_store
 from ..core.logger import logger
 
 
@@ -47,6 +48,10 @@ class RLAgent:
             self.logger.warning(f"Unknown mode: {mode}")
             return
         
+        # Migrate before changing the blob, so this feedback isn't counted twice
+        normalized = performance_store.ensure_migrated(self.username)
+        previous_version = performance_store.get_state_version(vars(self.state)) if normalized else None
+        
         # Ensure mode exists in state
         if mode not in self.state.mode_alpha:
             self.state.mode_alpha[mode] = 1.0
@@ -66,22 +71,23 @@ class RLAgent:
             self.state.mode_alpha[mode] += feedback
         else:
             self.state.mode_beta[mode] += (1.0 - feedback)
+        self.state.mark_changed("mode_alpha")
+        self.state.mark_changed("mode_beta")
         
-        # Record in history
-        self.state.mode_history.append({
+        # Record in history, limiting its size to prevent unbounded growth (keep last 1000 entries)
+        timestamp = datetime.now().isoformat()
+        self.state.append_history({
             "mode": mode,
             "feedback": feedback,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "session_id": request.session_id
-        })
+        }, max_entries=1000)
+        if normalized and performance_store.record_mode_feedback(self.username, mode, feedback, request.session_id, timestamp):
+            performance_store.mark_synced(self.username, previous_version, vars(self.state))
         
         # Update metadata
         self.state.last_updated = datetime.now().isoformat()
         
-        # Limit history size to prevent unbounded growth (keep last 1000 entries)
-        if len(self.state.mode_history) > 1000:
-            self.state.mode_history = self.state.mode_history[-1000:]
-        
         # Save state with error handling
         if not save_state(self.state, self.username):
             self.logger.error(f"Failed to save RL state for user {self.username}")
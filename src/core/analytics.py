@@ -1,14 +1,26 @@
 """Analytics module for performance tracking and analysis"""
 
+import threading
 from typing import Dict, List, Any, Tuple, Optional
 from datetime import datetime
 from collections import defaultdict
 
 from .memory import load_state, save_state
 from .logger import logger
+from . import performance_store
 import hashlib
 
 
+# Per-file chunk index (file_hash -> chunk texts), backed by the database
+_file_chunks: Dict[str, List[str]] = {}
+_file_chunks_lock = threading.Lock()
+
+
+def get_file_hash(filename: str) -> str:
+    """Short hash identifying a file in chunk IDs (8-character hex string)"""
+    return hashlib.md5(filename.encode()).hexdigest()[:8]
+
+
 def register_file(filename: str, username: Optional[str] = None) -> str:
     """
     Register a file and create a mapping from file hash to filename.
@@ -20,24 +32,126 @@ def register_file(filename: str, username: Optional[str] = None) -> str:
     Returns:
         File hash (8-character hex string)
     """
+    normalized = performance_store.ensure_migrated(username)
     state = load_state(username)
+    previous_version = performance_store.get_state_version(vars(state)) if normalized else None
     
     # Ensure file_mapping exists
     if not hasattr(state, 'file_mapping') or state.file_mapping is None:
         state.file_mapping = {}
     
     # Create hash from filename
-    file_hash = hashlib.md5(filename.encode()).hexdigest()[:8]
+    file_hash = get_file_hash(filename)
     
     # Store mapping if not already present
     if file_hash not in state.file_mapping:
         state.file_mapping[file_hash] = filename
+        state.mark_changed("file_mapping", file_hash)
         save_state(state, username)
+        if normalized and performance_store.record_file(username, file_hash, filename):
+            performance_store.mark_synced(username, previous_version, vars(state))
         logger.get_logger().info(f"Registered file: {filename} -> {file_hash}")
     
     return file_hash
 
 
+def register_file_chunks(filename: str, chunks: List[str]) -> str:
+    """
+    Store the chunks of a file so chunk IDs ("{file_hash}_chunk_{n}") can be mapped back to text.
+    
+    Args:
+        filename: The actual filename
+        chunks: Extracted chunks in the order they are numbered in prompts (Chunk 1 = chunks[0])
+        
+    Returns:
+        File hash (8-character hex string)
+    """
+    file_hash = get_file_hash(filename)
+    with _file_chunks_lock:
+        _file_chunks[file_hash] = list(chunks)
+    
+    try:
+        from .database import save_document_chunks
+        save_document_chunks(file_hash, chunks)
+    except Exception as e:
+        logger.get_logger().debug(f"Database not available for document chunks: {e}")
+    
+    logger.get_logger().info(f"Registered {len(chunks)} chunks for file: {filename} -> {file_hash}")
+    return file_hash
+
+
+def get_file_chunks(file_hash: str) -> List[str]:
+    """
+    Get the chunks registered for a file.
+    
+    Args:
+        file_hash: File hash from register_file / register_file_chunks
+        
+    Returns:
+        List of chunk texts (empty if the file was never registered)
+    """
+    with _file_chunks_lock:
+        chunks = _file_chunks.get(file_hash)
+    if chunks is not None:
+        return chunks
+    
+    try:
+        from .database import load_document_chunks
+        chunks = load_document_chunks(file_hash)
+    except Exception as e:
+        logger.get_logger().debug(f"Database not available for document chunks: {e}")
+        chunks = []
+    
+    if chunks:
+        with _file_chunks_lock:
+            _file_chunks[file_hash] = chunks
+    return chunks
+
+
+def get_weak_area_chunks(
+    filename: str,
+    threshold: float = 60.0,
+    min_attempts: int = 2,
+    username: Optional[str] = None,
+    max_chunks: int = 10
+) -> List[Tuple[int, str]]:
+    """
+    Map the user's weak chunk IDs for a file back to chunk text.
+    
+    Args:
+        filename: File to practice
+        threshold: Accuracy threshold below which a chunk is considered weak (default 60%)
+        min_attempts: Minimum number of attempts required to be considered (default 2)
+        username: Username for user-specific state (optional)
+        max_chunks: Maximum number of weak chunks to return (weakest first)
+        
+    Returns:
+        List of (chunk_number, chunk_text) sorted by chunk number
+    """
+    file_hash = get_file_hash(filename)
+    chunks = get_file_chunks(file_hash)
+    if not chunks:
+        logger.get_logger().warning(f"No chunks registered for file {filename} ({file_hash})")
+        return []
+    
+    prefix = f"{file_hash}_chunk_"
+    selected = {}
+    for area in get_weak_areas(threshold=threshold, min_attempts=min_attempts, username=username):
+        chunk_id = area["chunk_id"]
+        if not chunk_id.startswith(prefix):
+            continue
+        chunk_num = chunk_id[len(prefix):]
+        if not chunk_num.isdigit():
+            continue
+        number = int(chunk_num)
+        if 1 <= number <= len(chunks) and number not in selected:
+            selected[number] = chunks[number - 1]
+        if len(selected) >= max_chunks:
+            break
+    
+    return sorted(selected.items())
+
+
 def record_quiz_answer(
     chunk_id: str,
     source_reference: str,
@@ -56,14 +170,21 @@ def record_quiz_answer(
         question_text: The question text (optional, for reference)
         username: Username for user-specific state (optional)
     """
-    state = load_state(username)
-    
-    # Handle case where chunk_performance might not exist (for old state files)
-    if not hasattr(state, 'chunk_performance') or state.chunk_performance is None:
-        state.chunk_performance = {}
-    
-    # Use source_reference as key if chunk_id is not available
-    key = chunk_id if chunk_id else source_reference
+    record_quiz_answers([{
+        "chunk_id": chunk_id,
+        "source_reference": source_reference,
+        "is_correct": is_correct,
+        "question_text": question_text,
+        "filename": filename,
+    }], username=username)
+
+
+def _apply_answer(state, key: str, event: Dict[str, Any], timestamp: str) -> None:
+    """Add one answer to the chunk's entry in state.chunk_performance"""
+    source_reference = event.get("source_reference", "")
+    filename = event.get("filename")
+    is_correct = bool(event.get("is_correct"))
+    question_text = event.get("question_text") or ""
     
     if key not in state.chunk_performance:
         state.chunk_performance[key] = {
@@ -86,24 +207,68 @@ def record_quiz_answer(
     else:
         state.chunk_performance[key]["incorrect"] += 1
     
-    state.chunk_performance[key]["last_attempt"] = datetime.now().isoformat()
+    state.chunk_performance[key]["last_attempt"] = timestamp
     
     # Store question for reference
     if question_text:
         state.chunk_performance[key]["questions"].append({
             "question": question_text[:200],  # Truncate for storage
             "correct": is_correct,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": timestamp
         })
         # Keep only last 10 questions per chunk
         if len(state.chunk_performance[key]["questions"]) > 10:
             state.chunk_performance[key]["questions"] = state.chunk_performance[key]["questions"][-10:]
     
+    state.mark_changed("chunk_performance", key)
+
+
+def record_quiz_answers(events: List[Dict[str, Any]], username: Optional[str] = None) -> int:
+    """
+    Record a batch of answers (e.g. a whole submitted quiz) with one state load and save.
+    
+    Args:
+        events: Answer events, each a dict with chunk_id, source_reference, is_correct and
+            optionally question_text, filename and timestamp (ISO time of the answer; defaults to now)
+        username: Username for user-specific state (optional)
+        
+    Returns:
+        Number of answers recorded
+    """
+    if not events:
+        return 0
+    # Migrate before changing the blob, so the answers aren't counted twice
+    normalized = performance_store.ensure_migrated(username)
+    state = load_state(username)
+    previous_version = performance_store.get_state_version(vars(state)) if normalized else None
+    
+    # Handle case where chunk_performance might not exist (for old state files)
+    if not hasattr(state, 'chunk_performance') or state.chunk_performance is None:
+        state.chunk_performance = {}
+    
+    attempts = []
+    for event in events:
+        # Use source_reference as key if chunk_id is not available
+        key = event.get("chunk_id") or event.get("source_reference", "")
+        timestamp = event.get("timestamp") or datetime.now().isoformat()
+        _apply_answer(state, key, event, timestamp)
+        attempts.append(dict(event, chunk_id=key, timestamp=timestamp))
+    
     save_state(state, username)
+    if normalized and performance_store.record_attempts(username, attempts):
+        performance_store.mark_synced(username, previous_version, vars(state))
     
-    logger.get_logger().info(
-        f"Recorded quiz answer for {key}: {'correct' if is_correct else 'incorrect'}"
-    )
+    if len(attempts) == 1:
+        logger.get_logger().info(
+            f"Recorded quiz answer for {attempts[0]['chunk_id']}: {'correct' if attempts[0].get('is_correct') else 'incorrect'}"
+        )
+    else:
+        correct = sum(1 for attempt in attempts if attempt.get("is_correct"))
+        logger.get_logger().info(
+            f"Recorded {len(attempts)} quiz answers ({correct} correct) across "
+            f"{len({attempt['chunk_id'] for attempt in attempts})} chunks"
+        )
+    return len(attempts)
 
 
 def get_chunk_performance(chunk_id: str, username: Optional[str] = None) -> Dict[str, Any]:
@@ -117,6 +282,19 @@ def get_chunk_performance(chunk_id: str, username: Optional[str] = None) -> Dict
     Returns:
         Dictionary with performance metrics
     """
+    if performance_store.ensure_migrated(username):
+        perf = performance_store.get_chunk_stats(username, chunk_id).get(chunk_id)
+        if perf is None:
+            return {
+                "correct": 0,
+                "incorrect": 0,
+                "attempts": 0,
+                "accuracy": 0.0,
+                "source_reference": ""
+            }
+        perf.pop("filename")
+        return perf
+    
     state = load_state(username)
     
     # Handle case where chunk_performance might not exist (for old state files)
@@ -155,6 +333,9 @@ def get_all_chunk_performance(username: Optional[str] = None) -> Dict[str, Dict[
     Returns:
         Dictionary mapping chunk_id to performance metrics
     """
+    if performance_store.ensure_migrated(username):
+        return performance_store.get_chunk_stats(username)
+    
     state = load_state(username)
     
     # Handle case where chunk_performance might not exist (for old state files)
@@ -237,6 +418,7 @@ def backfill_file_mapping_from_chunks(username: Optional[str] = None) -> None:
                 # Register this file if not already registered
                 if file_hash not in state.file_mapping:
                     state.file_mapping[file_hash] = filename
+                    state.mark_changed("file_mapping", file_hash)
                     updated = True
                     logger.get_logger().info(f"Backfilled file mapping: {filename} -> {file_hash}")
     
@@ -255,6 +437,17 @@ def group_chunks_by_file(all_perf: Dict[str, Dict[str, Any]], username: Optional
     Returns:
         Dictionary mapping file_hash to file-level aggregated performance and chunks
     """
+    if performance_store.ensure_migrated(username):
+        # File totals and names come from indexed aggregates; only the chunk lists are built here
+        files = performance_store.get_file_stats(username)
+        for file_data in files.values():
+            file_data["chunks"] = {}
+        for chunk_id, perf in all_perf.items():
+            file_hash = performance_store.get_chunk_file_hash(chunk_id)
+            if file_hash in files:
+                files[file_hash]["chunks"][chunk_id] = perf
+        return files
+    
     # First, try to backfill file mapping from existing chunk data
     backfill_file_mapping_from_chunks(username)
     
@@ -300,6 +493,7 @@ def group_chunks_by_file(all_perf: Dict[str, Dict[str, Any]], username: Optional
                     state.file_mapping = {}
                 if file_hash not in state.file_mapping:
                     state.file_mapping[file_hash] = filename
+                    state.mark_changed("file_mapping", file_hash)
                     save_state(state, username)
                     logger.get_logger().info(f"Auto-registered file from chunk data: {filename} -> {file_hash}")
         # Also check file mapping if filename still not set
@@ -348,6 +542,9 @@ def get_weak_areas(threshold: float = 60.0, min_attempts: int = 2, username: Opt
     Returns:
         List of weak areas with performance details, sorted by accuracy (worst first)
     """
+    if performance_store.ensure_migrated(username):
+        return performance_store.get_chunk_areas(username, min_attempts, below=threshold)
+    
     all_perf = get_all_chunk_performance(username)
     weak_areas = []
     
@@ -381,6 +578,9 @@ def get_strong_areas(threshold: float = 80.0, min_attempts: int = 2, username: O
     Returns:
         List of strong areas with performance details, sorted by accuracy (best first)
     """
+    if performance_store.ensure_migrated(username):
+        return performance_store.get_chunk_areas(username, min_attempts, at_least=threshold)
+    
     all_perf = get_all_chunk_performance(username)
     strong_areas = []
     
@@ -412,6 +612,9 @@ def get_performance_summary(username: Optional[str] = None) -> Dict[str, Any]:
     Returns:
         Dictionary with summary statistics
     """
+    if performance_store.ensure_migrated(username):
+        return performance_store.get_summary(username)
+    
     all_perf = get_all_chunk_performance(username)
     
     if not all_perf:
@@ -441,6 +644,36 @@ def get_performance_summary(username: Optional[str] = None) -> Dict[str, Any]:
     }
 
 
+def get_mode_feedback_summary(username: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Get feedback statistics per learning mode.
+    
+    Args:
+        username: Username for user-specific state (optional)
+    
+    Returns:
+        Dictionary mapping mode to feedback_count, average_feedback, positive_rate and last_feedback
+    """
+    if performance_store.ensure_migrated(username):
+        return performance_store.get_mode_feedback_stats(username)
+    
+    state = load_state(username)
+    by_mode = defaultdict(list)
+    for entry in state.mode_history or []:
+        if entry.get("mode"):
+            by_mode[entry["mode"]].append(entry)
+    
+    return {
+        mode: {
+            "feedback_count": len(entries),
+            "average_feedback": sum(entry.get("feedback", 0.5) for entry in entries) / len(entries),
+            "positive_rate": sum(1 for entry in entries if entry.get("feedback", 0.5) > 0.5) / len(entries),
+            "last_feedback": max((entry.get("timestamp") or "" for entry in entries), default=None) or None
+        }
+        for mode, entries in by_mode.items()
+    }
+
+
 def extract_chunk_id_from_reference(source_reference: str, filename: Optional[str] = None) -> str:
     """
     Extract chunk identifier from source reference string.
@@ -31,14 +31,13 @@ def hash_password(password: str) -> str:
 
 
 def load_users() -> Dict[str, User]:
-    """Load all users - tries Supabase first, falls back to JSON file"""
-    # Try Supabase first
+    """Load all users - from the storage backends (see storage.py), falls back to JSON file"""
     try:
-        from .supabase_client import get_all_users_supabase
-        supabase_users = get_all_users_supabase()
-        if supabase_users:
+        from .storage import get_storage
+        stored_users = get_storage().load_users()
+        if stored_users:
             users = {}
-            for username, user_data in supabase_users.items():
+            for username, user_data in stored_users.items():
                 # Convert Supabase format to User dataclass
                 users[username] = User(
                     username=user_data.get("username", username),
@@ -50,7 +49,7 @@ def load_users() -> Dict[str, User]:
             if users:
                 return users
     except Exception as e:
-        logger.get_logger().debug(f"Supabase not available, using file storage: {e}")
+        logger.get_logger().debug(f"User storage not available, using file storage: {e}")
     
     # Fallback to JSON file
     users_path = get_users_db_path()
@@ -90,16 +89,16 @@ def load_users() -> Dict[str, User]:
 
 
 def save_users(users: Dict[str, User]) -> bool:
-    """Save users - tries Supabase first, falls back to JSON file"""
-    # Try Supabase first (save each user)
-    supabase_success = False
+    """Save users - to the storage backends (see storage.py), always also to the JSON file"""
     try:
-        from .supabase_client import save_user_supabase
+        from .storage import get_storage
+        storage = get_storage()
         for username, user in users.items():
-            if save_user_supabase(username, user.password_hash, user.email):
-                supabase_success = True
+            if not storage.save_user(username, user.password_hash, user.email):
+                # No user backend took it (none configured or all disabled); don't retry for every user
+                break
     except Exception as e:
-        logger.get_logger().debug(f"Supabase not available, using file storage: {e}")
+        logger.get_logger().debug(f"User storage not available, using file storage: {e}")
     
     # Always save to file as backup
     users_path = get_users_db_path()
@@ -161,14 +160,7 @@ def register_user(username: str, email: str, password: str) -> tuple[bool, str]:
     
     users[username] = new_user
     
-    # Try Supabase first
-    try:
-        from .supabase_client import save_user_supabase
-        if save_user_supabase(username, new_user.password_hash, new_user.email):
-            logger.get_logger().info(f"User registered in Supabase: {username}")
-    except Exception as e:
-        logger.get_logger().debug(f"Supabase not available: {e}")
-    
+    # save_users writes the new user to the storage backends and the JSON file
     if save_users(users):
         logger.get_logger().info(f"User registered: {username}")
         return True, f"Account created successfully! Welcome, {username}!"
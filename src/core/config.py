@@ -0,0 +1,66 @@
+"""Runtime settings lookup (Streamlit secrets first, then environment variables)"""
+
+import os
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def get_setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    Get a setting from Streamlit secrets, falling back to environment variables.
+
+    Args:
+        name: Setting name (e.g. "OPENAI_MODEL")
+        default: Value returned when the setting is not configured anywhere
+
+    Returns:
+        Setting value as string, or default
+    """
+    value: Any = None
+
+    # Try to get from Streamlit secrets first (for Streamlit Cloud)
+    try:
+        import streamlit as st
+        value = st.secrets.get(name)
+    except (ImportError, AttributeError, KeyError, FileNotFoundError, RuntimeError):
+        # Streamlit not available or secrets not configured
+        pass
+
+    # Fall back to environment variables
+    if value is None or value == "":
+        value = os.getenv(name, default)
+
+    return str(value) if value is not None else None
+
+
+def get_int_setting(name: str, default: int) -> int:
+    """Get an integer setting, returning default if missing or invalid"""
+    value = get_setting(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def get_float_setting(name: str, default: float) -> float:
+    """Get a float setting, returning default if missing or invalid"""
+    value = get_setting(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def get_bool_setting(name: str, default: bool = False) -> bool:
+    """Get a boolean setting ("1", "true", "yes", "on" are truthy)"""
+    value = get_setting(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
@@ -1,37 +1,154 @@
 """Database module for persistent data storage"""
 
+import os
 import sqlite3
 import json
+import threading
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 from contextlib import contextmanager
+from functools import lru_cache
+from .config import get_setting, get_bool_setting, get_int_setting
 from .logger import logger
 
 
+@lru_cache(maxsize=1)
 def get_db_path() -> Path:
-    """Get path to SQLite database file"""
+    """Get path to SQLite database file (APP_DB_PATH overrides the default location)"""
+    configured_path = get_setting("APP_DB_PATH")
+    if configured_path:
+        db_path = Path(configured_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        return db_path
+    
     # Use a persistent location that works on Streamlit Cloud
     db_dir = Path(__file__).parent.parent.parent / "data"
     db_dir.mkdir(exist_ok=True)
     return db_dir / "app_data.db"
 
 
+@lru_cache(maxsize=1)
+def get_connection_settings() -> Dict[str, Any]:
+    """SQLite connection settings (read once per process)"""
+    return {
+        "pooled": get_bool_setting("SQLITE_POOL_ENABLED", True),
+        "journal_mode": (get_setting("SQLITE_JOURNAL_MODE") or "WAL").upper(),
+        "synchronous": (get_setting("SQLITE_SYNCHRONOUS") or "NORMAL").upper(),
+        "busy_timeout_ms": get_int_setting("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "cache_size_kb": get_int_setting("SQLITE_CACHE_SIZE_KB", 16384),
+        "mmap_size_mb": get_int_setting("SQLITE_MMAP_SIZE_MB", 256),
+        "cached_statements": get_int_setting("SQLITE_STATEMENT_CACHE", 256),
+    }
+
+
+def _open_connection(db_path: Path, settings: Dict[str, Any]) -> sqlite3.Connection:
+    """Open a connection and apply the configured pragmas (timeout sets SQLite's busy timeout)"""
+    conn = sqlite3.connect(
+        str(db_path),
+        timeout=settings["busy_timeout_ms"] / 1000.0,
+        check_same_thread=False,
+        cached_statements=settings["cached_statements"]
+    )
+    conn.row_factory = sqlite3.Row  # Enable column access by name
+    conn.execute(f"PRAGMA journal_mode = {settings['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {settings['synchronous']}")
+    # Negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size = {-abs(int(settings['cache_size_kb']))}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings['mmap_size_mb']) * 1024 * 1024}")
+    return conn
+
+
+class _ThreadConnections(threading.local):
+    """Per-thread pooled connections, keyed by database path"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.connections: Dict[str, sqlite3.Connection] = {}
+        self.depth: Dict[str, int] = {}
+
+
+_thread_connections = _ThreadConnections()
+
+
+def _pooled_connection(db_path: Path, settings: Dict[str, Any]) -> sqlite3.Connection:
+    """This thread's connection to db_path, opened on first use"""
+    pool = _thread_connections
+    if pool.pid != os.getpid():
+        # Connections must never cross a fork; the child opens its own
+        pool.pid = os.getpid()
+        pool.connections = {}
+        pool.depth = {}
+    key = str(db_path)
+    conn = pool.connections.get(key)
+    if conn is None:
+        conn = _open_connection(db_path, settings)
+        pool.connections[key] = conn
+    return conn
+
+
+def close_db_connections() -> None:
+    """Close the calling thread's pooled connections (reopened on next use)"""
+    pool = _thread_connections
+    for key, conn in list(pool.connections.items()):
+        if pool.depth.get(key):
+            continue
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        del pool.connections[key]
+
+
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
+    """
+    Context manager for database connections.
+
+    Each thread reuses one connection per database (SQLITE_POOL_ENABLED), so
+    SQLite's prepared-statement cache survives between calls. Nested use in the
+    same thread shares the outer transaction; only the outermost block commits
+    or rolls back.
+    """
     db_path = get_db_path()
-    conn = sqlite3.connect(str(db_path), check_same_thread=False)
-    conn.row_factory = sqlite3.Row  # Enable column access by name
+    settings = get_connection_settings()
+    if not settings["pooled"]:
+        conn = _open_connection(db_path, settings)
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.get_logger().error(f"Database error: {e}")
+            raise
+        finally:
+            conn.close()
+        return
+
+    conn = _pooled_connection(db_path, settings)
+    pool = _thread_connections
+    key = str(db_path)
+    depth = pool.depth.get(key, 0)
+    if depth == 0 and conn.in_transaction:
+        # Left open by an interrupted caller; don't let it leak into this one
+        conn.rollback()
+    pool.depth[key] = depth + 1
     try:
         yield conn
-        conn.commit()
+        if depth == 0:
+            conn.commit()
     except Exception as e:
-        conn.rollback()
-        logger.get_logger().error(f"Database error: {e}")
+        if depth == 0:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                # Unusable connection: drop it so the next call opens a fresh one
+                pool.connections.pop(key, None)
+                conn.close()
+            logger.get_logger().error(f"Database error: {e}")
         raise
     finally:
-        conn.close()
+        pool.depth[key] = depth
 
 
 def init_database():
@@ -66,6 +183,150 @@ def init_database():
             )
         """)
         
+        # Document chunks table (maps file hash + chunk number back to chunk text)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS document_chunks (
+                file_hash TEXT NOT NULL,
+                chunk_number INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (file_hash, chunk_number)
+            )
+        """)
+        
+        # Question bank: pre-generated quiz questions, flashcards and lesson steps per document chunk
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS question_bank (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                doc_hash TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                chunk_number INTEGER,
+                difficulty TEXT NOT NULL DEFAULT 'medium',
+                item TEXT NOT NULL,
+                served_count INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_question_bank_chunk
+            ON question_bank (doc_hash, content_type, chunk_number)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_question_bank_difficulty
+            ON question_bank (doc_hash, content_type, difficulty)
+        """)
+        
+        # LLM usage: one row per chat completion call (token/cost accounting), plus one
+        # token-less row per request that shared another request's in-flight call (coalesced)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT NOT NULL,
+                username TEXT,
+                file_hash TEXT,
+                content_type TEXT,
+                priority TEXT,
+                model TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                cached_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                latency_ms REAL NOT NULL DEFAULT 0,
+                retries INTEGER NOT NULL DEFAULT 0,
+                success INTEGER NOT NULL DEFAULT 1,
+                cost_usd REAL NOT NULL DEFAULT 0,
+                coalesced INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        usage_columns = {row["name"] for row in cursor.execute("PRAGMA table_info(llm_usage)").fetchall()}
+        if "coalesced" not in usage_columns:
+            cursor.execute("ALTER TABLE llm_usage ADD COLUMN coalesced INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_user ON llm_usage (username, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_file ON llm_usage (file_hash, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_type ON llm_usage (content_type, created_at)")
+        
+        # Background jobs (extract/generate) run by the job queue's worker processes
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                username TEXT,
+                session_id TEXT,
+                action TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        
+        # Normalized performance data (indexed projection of rl_state's JSON blobs, see performance_store.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                username TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                filename TEXT,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (username, file_hash)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_stats (
+                username TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                file_hash TEXT,
+                source_reference TEXT,
+                filename TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                incorrect INTEGER NOT NULL DEFAULT 0,
+                last_attempt TEXT,
+                PRIMARY KEY (username, chunk_id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunk_stats_file ON chunk_stats (username, file_hash, chunk_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunk_stats_last ON chunk_stats (username, last_attempt)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                file_hash TEXT,
+                chunk_id TEXT NOT NULL,
+                question TEXT,
+                correct INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunk_attempts_chunk ON chunk_attempts (username, file_hash, chunk_id, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunk_attempts_time ON chunk_attempts (username, created_at)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS mode_feedback (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                feedback REAL NOT NULL,
+                session_id TEXT,
+                created_at TEXT NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_mode_feedback_user ON mode_feedback (username, mode, created_at)")
+        # Users whose blob state has been migrated into the tables above
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS normalized_users (
+                username TEXT PRIMARY KEY,
+                migrated_at TEXT NOT NULL,
+                state_version TEXT
+            )
+        """)
+        normalized_columns = {row["name"] for row in cursor.execute("PRAGMA table_info(normalized_users)").fetchall()}
+        if "state_version" not in normalized_columns:
+            cursor.execute("ALTER TABLE normalized_users ADD COLUMN state_version TEXT")
+        
         conn.commit()
         logger.get_logger().info("Database initialized successfully")
 
@@ -113,75 +374,162 @@ def get_all_users() -> Dict[str, Dict[str, Any]]:
         return {}
 
 
-def save_rl_state(username: str, state_data: Dict[str, Any]) -> bool:
+# Insert or update a whole rl_state row in one statement (created_at is kept on update)
+RL_STATE_UPSERT_SQL = """
+    INSERT INTO rl_state (
+        username, mode_alpha, mode_beta, mode_history,
+        chunk_performance, file_mapping, survey_completed,
+        initial_preference, total_sessions, last_updated,
+        created_at, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(username) DO UPDATE SET
+        mode_alpha = excluded.mode_alpha,
+        mode_beta = excluded.mode_beta,
+        mode_history = excluded.mode_history,
+        chunk_performance = excluded.chunk_performance,
+        file_mapping = excluded.file_mapping,
+        survey_completed = excluded.survey_completed,
+        initial_preference = excluded.initial_preference,
+        total_sessions = excluded.total_sessions,
+        last_updated = excluded.last_updated,
+        updated_at = excluded.updated_at
+"""
+
+
+def _rl_state_params(username: str, state_data: Dict[str, Any], now: str) -> tuple:
+    """RL_STATE_UPSERT_SQL parameters for one user's state"""
+    return (
+        username,
+        json.dumps(state_data.get("mode_alpha", {})),
+        json.dumps(state_data.get("mode_beta", {})),
+        json.dumps(state_data.get("mode_history", [])),
+        json.dumps(state_data.get("chunk_performance", {})),
+        json.dumps(state_data.get("file_mapping", {})),
+        1 if state_data.get("survey_completed", False) else 0,
+        state_data.get("initial_preference"),
+        state_data.get("total_sessions", 0),
+        state_data.get("last_updated"),
+        now,
+        now
+    )
+
+
+def save_rl_state(username: str, state_data: Dict[str, Any], raise_errors: bool = False) -> bool:
     """Save RL state to database"""
+    try:
+        with get_db_connection() as conn:
+            conn.execute(RL_STATE_UPSERT_SQL, _rl_state_params(username, state_data, datetime.now().isoformat()))
+            return True
+    except Exception as e:
+        logger.get_logger().error(f"Error saving RL state: {e}")
+        if raise_errors:
+            raise
+        return False
+
+
+def save_rl_states(states: Dict[str, Dict[str, Any]], raise_errors: bool = False) -> bool:
+    """
+    Save several users' RL states in one transaction.
+
+    Args:
+        states: username -> state data
+        raise_errors: Re-raise database errors instead of returning False
+
+    Returns:
+        True if every state was saved (all or none are)
+    """
+    if not states:
+        return True
     try:
         now = datetime.now().isoformat()
+        with get_db_connection() as conn:
+            conn.executemany(RL_STATE_UPSERT_SQL, [
+                _rl_state_params(username, state_data, now) for username, state_data in states.items()
+            ])
+            return True
+    except Exception as e:
+        logger.get_logger().error(f"Error saving RL states of {len(states)} users: {e}")
+        if raise_errors:
+            raise
+        return False
+
+
+# rl_state columns stored as JSON text
+RL_STATE_JSON_COLUMNS = ("mode_alpha", "mode_beta", "mode_history", "chunk_performance", "file_mapping")
+RL_STATE_SCALAR_COLUMNS = ("survey_completed", "initial_preference", "total_sessions", "last_updated")
+
+
+def apply_rl_state_delta(username: str, delta: Dict[str, Any], raise_errors: bool = False) -> bool:
+    """
+    Apply an RL state delta in place instead of rewriting the row.
+    
+    Changed columns are set, changed chunk_performance/file_mapping keys are upserted
+    with json_set and new history entries appended with json_insert, so only the
+    changes are serialized.
+    
+    Args:
+        username: User
+        delta: {"fields": {column: value}, "chunk_performance": {key: value},
+                "file_mapping": {key: value}, "history_append": [...], "history_limit": int}
+    
+    Returns:
+        True if applied; False if the user has no stored state (a full save is needed)
+    """
+    assignments: List[str] = []
+    args: List[Any] = []
+    for column, value in (delta.get("fields") or {}).items():
+        if column in RL_STATE_JSON_COLUMNS:
+            assignments.append(f"{column} = ?")
+            args.append(json.dumps(value if value is not None else ([] if column == "mode_history" else {})))
+        elif column in RL_STATE_SCALAR_COLUMNS:
+            assignments.append(f"{column} = ?")
+            args.append((1 if value else 0) if column == "survey_completed" else value)
+    
+    for column in ("chunk_performance", "file_mapping"):
+        entries = delta.get(column) or {}
+        if not entries:
+            continue
+        if any('"' in key for key in entries):
+            # Not expressible as a JSON path; let the caller write the full state
+            return False
+        assignments.append(f"{column} = json_set({column}, {', '.join(['?, json(?)'] * len(entries))})")
+        for key, value in entries.items():
+            args.extend([f'$."{key}"', json.dumps(value)])
+    
+    history = delta.get("history_append") or []
+    if history:
+        appends = ", ".join(["'$[#]', json(?)"] * len(history))
+        assignments.append(f"mode_history = json_insert(mode_history, {appends})")
+        args.extend(json.dumps(entry) for entry in history)
+    
+    try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
+            assignments.append("updated_at = ?")
+            args.extend([datetime.now().isoformat(), username])
+            cursor.execute(f"UPDATE rl_state SET {', '.join(assignments)} WHERE username = ?", args)
+            if cursor.rowcount == 0:
+                return False
             
-            # Check if state exists
-            cursor.execute("SELECT username FROM rl_state WHERE username = ?", (username,))
-            exists = cursor.fetchone()
-            
-            if exists:
-                # Update existing state
+            limit = delta.get("history_limit")
+            if history and limit:
+                # Drop the oldest entries beyond the limit
                 cursor.execute("""
-                    UPDATE rl_state SET
-                        mode_alpha = ?,
-                        mode_beta = ?,
-                        mode_history = ?,
-                        chunk_performance = ?,
-                        file_mapping = ?,
-                        survey_completed = ?,
-                        initial_preference = ?,
-                        total_sessions = ?,
-                        last_updated = ?,
-                        updated_at = ?
-                    WHERE username = ?
-                """, (
-                    json.dumps(state_data.get("mode_alpha", {})),
-                    json.dumps(state_data.get("mode_beta", {})),
-                    json.dumps(state_data.get("mode_history", [])),
-                    json.dumps(state_data.get("chunk_performance", {})),
-                    json.dumps(state_data.get("file_mapping", {})),
-                    1 if state_data.get("survey_completed", False) else 0,
-                    state_data.get("initial_preference"),
-                    state_data.get("total_sessions", 0),
-                    state_data.get("last_updated"),
-                    now,
-                    username
-                ))
-            else:
-                # Insert new state
-                cursor.execute("""
-                    INSERT INTO rl_state (
-                        username, mode_alpha, mode_beta, mode_history,
-                        chunk_performance, file_mapping, survey_completed,
-                        initial_preference, total_sessions, last_updated,
-                        created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    username,
-                    json.dumps(state_data.get("mode_alpha", {})),
-                    json.dumps(state_data.get("mode_beta", {})),
-                    json.dumps(state_data.get("mode_history", [])),
-                    json.dumps(state_data.get("chunk_performance", {})),
-                    json.dumps(state_data.get("file_mapping", {})),
-                    1 if state_data.get("survey_completed", False) else 0,
-                    state_data.get("initial_preference"),
-                    state_data.get("total_sessions", 0),
-                    state_data.get("last_updated"),
-                    now,
-                    now
-                ))
+                    UPDATE rl_state SET mode_history = (
+                        SELECT json_group_array(json(value)) FROM json_each(rl_state.mode_history)
+                        WHERE key >= json_array_length(rl_state.mode_history) - ?
+                    )
+                    WHERE username = ? AND json_array_length(mode_history) > ?
+                """, (limit, username, limit))
             return True
     except Exception as e:
-        logger.get_logger().error(f"Error saving RL state: {e}")
+        logger.get_logger().error(f"Error applying RL state changes: {e}")
+        if raise_errors:
+            raise
         return False
 
 
-def load_rl_state(username: str) -> Optional[Dict[str, Any]]:
+def load_rl_state(username: str, raise_errors: bool = False) -> Optional[Dict[str, Any]]:
     """Load RL state from database"""
     try:
         with get_db_connection() as conn:
@@ -204,9 +552,144 @@ def load_rl_state(username: str) -> Optional[Dict[str, Any]]:
             return None
     except Exception as e:
         logger.get_logger().error(f"Error loading RL state: {e}")
+        if raise_errors:
+            raise
         return None
 
 
+def save_document_chunks(file_hash: str, chunks: List[str]) -> bool:
+    """Save the chunk text of a document (chunk numbers are 1-based positions)"""
+    try:
+        now = datetime.now().isoformat()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM document_chunks WHERE file_hash = ?", (file_hash,))
+            cursor.executemany("""
+                INSERT INTO document_chunks (file_hash, chunk_number, content, created_at)
+                VALUES (?, ?, ?, ?)
+            """, [(file_hash, i, chunk, now) for i, chunk in enumerate(chunks, 1)])
+            return True
+    except Exception as e:
+        logger.get_logger().error(f"Error saving document chunks: {e}")
+        return False
+
+
+def load_document_chunks(file_hash: str) -> List[str]:
+    """Load the chunk text of a document in chunk number order"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT content FROM document_chunks WHERE file_hash = ? ORDER BY chunk_number",
+                (file_hash,)
+            )
+            return [row["content"] for row in cursor.fetchall()]
+    except Exception as e:
+        logger.get_logger().error(f"Error loading document chunks: {e}")
+        return []
+
+
+def save_bank_items(doc_hash: str, content_type: str, items: List[Dict[str, Any]]) -> bool:
+    """
+    Add items to the question bank.
+    
+    Args:
+        doc_hash: Digest of the document's chunks
+        content_type: "quiz", "flashcard" or "interactive"
+        items: Dicts with "chunk_number", "difficulty" and "item" (the generated question/card/step)
+    """
+    try:
+        now = datetime.now().isoformat()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO question_bank (doc_hash, content_type, chunk_number, difficulty, item, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (doc_hash, content_type, entry.get("chunk_number"), entry.get("difficulty", "medium"),
+                 json.dumps(entry["item"]), now)
+                for entry in items
+            ])
+            return True
+    except Exception as e:
+        logger.get_logger().error(f"Error saving question bank items: {e}")
+        return False
+
+
+def load_bank_items(doc_hash: str, content_type: str, difficulty: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Load question bank items of a document, least served first"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            query = """
+                SELECT id, chunk_number, difficulty, item, served_count FROM question_bank
+                WHERE doc_hash = ? AND content_type = ?
+            """
+            args = [doc_hash, content_type]
+            if difficulty:
+                query += " AND difficulty = ?"
+                args.append(difficulty)
+            query += " ORDER BY served_count, id"
+            cursor.execute(query, args)
+            return [
+                {
+                    "id": row["id"],
+                    "chunk_number": row["chunk_number"],
+                    "difficulty": row["difficulty"],
+                    "item": json.loads(row["item"]),
+                    "served_count": row["served_count"]
+                }
+                for row in cursor.fetchall()
+            ]
+    except Exception as e:
+        logger.get_logger().error(f"Error loading question bank items: {e}")
+        return []
+
+
+def claim_bank_items(item_ids: List[int]) -> bool:
+    """
+    Atomically mark never-served question bank items as served.
+
+    The claim runs in an IMMEDIATE transaction and is all or nothing: if another request
+    served any of the items first, nothing is marked.
+
+    Returns:
+        True if every item was claimed
+    """
+    try:
+        with get_db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for item_id in item_ids:
+                cursor = conn.execute(
+                    "UPDATE question_bank SET served_count = served_count + 1 WHERE id = ? AND served_count = 0",
+                    (item_id,)
+                )
+                if cursor.rowcount != 1:
+                    conn.rollback()
+                    return False
+            return True
+    except Exception as e:
+        logger.get_logger().error(f"Error claiming question bank items: {e}")
+        return False
+
+
+def count_unserved_bank_items(doc_hash: str, content_type: str) -> Dict[int, int]:
+    """Number of never-served question bank items per chunk number"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT chunk_number, SUM(CASE WHEN served_count = 0 THEN 1 ELSE 0 END) AS unserved
+                FROM question_bank
+                WHERE doc_hash = ? AND content_type = ? AND chunk_number IS NOT NULL
+                GROUP BY chunk_number
+            """, (doc_hash, content_type))
+            return {row["chunk_number"]: row["unserved"] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.get_logger().error(f"Error counting question bank items: {e}")
+        return {}
+
+
 # Initialize database on import
 try:
     init_database()
@@ -0,0 +1,367 @@
+"""SQLite-backed job queue for extraction and generation, run by a pool of worker processes"""
+
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from .config import get_bool_setting, get_float_setting, get_int_setting
+from .database import get_db_connection
+from .logger import logger
+from .memory import flush_state, invalidate_state
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# Actions that can run as background jobs
+JOB_ACTIONS = ("extract", "generate")
+
+# Seconds an idle worker waits before looking for new jobs
+WORKER_POLL_SECONDS = 0.5
+
+# Seconds between deletions of old finished jobs
+JOB_PURGE_INTERVAL_SECONDS = 600
+
+# Set in worker processes
+_in_job_worker = False
+
+
+def is_job_queue_enabled() -> bool:
+    """
+    Whether extract/generate run on background worker processes (JOB_QUEUE_ENABLED, off by default).
+
+    Workers are separate processes with their own in-memory state, so with the queue on:
+    the OpenAI rate limits are split evenly between the web process and the workers
+    (get_rate_limit_share), identical requests are only coalesced within one process,
+    and prefetching runs in the web process only (workers never prefetch).
+    """
+    return get_bool_setting("JOB_QUEUE_ENABLED", False)
+
+
+def is_job_worker() -> bool:
+    """Whether this process is a job queue worker"""
+    return _in_job_worker
+
+
+def get_rate_limit_share() -> float:
+    """Fraction of the configured OpenAI limits this process may use (1 unless the job queue is on)"""
+    if not is_job_queue_enabled():
+        return 1.0
+    return 1.0 / (max(1, get_int_setting("JOB_WORKERS", 2)) + 1)
+
+
+def _row_to_job(row) -> Dict[str, Any]:
+    """Convert a jobs row to a dict with decoded params and result"""
+    job = dict(row)
+    job["params"] = json.loads(job["params"]) if job.get("params") else {}
+    job["result"] = json.loads(job["result"]) if job.get("result") else None
+    return job
+
+
+def enqueue_job(
+    action: str,
+    params: Dict[str, Any],
+    username: Optional[str] = None,
+    session_id: Optional[str] = None
+) -> Optional[str]:
+    """
+    Add a job to the queue.
+
+    Args:
+        action: "extract" or "generate"
+        params: Command params (must be JSON serializable)
+        username: User the job runs for
+        session_id: Session the job belongs to
+
+    Returns:
+        Job ID, or None if the job could not be stored
+    """
+    job_id = uuid.uuid4().hex
+    try:
+        with get_db_connection() as conn:
+            conn.execute("""
+                INSERT INTO jobs (id, username, session_id, action, params, status, progress, message, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+            """, (
+                job_id, username, session_id, action, json.dumps(params), JOB_QUEUED,
+                "Waiting for a worker", datetime.now().isoformat()
+            ))
+        return job_id
+    except Exception as e:
+        logger.get_logger().error(f"Error enqueuing {action} job: {e}")
+        return None
+
+
+def get_job(job_id: str, username: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Get a job's status, progress and (once finished) result.
+
+    Args:
+        job_id: Job ID returned by enqueue_job
+        username: If given, only return the job if it belongs to this user
+
+    Returns:
+        Job dict, or None if not found
+    """
+    try:
+        with get_db_connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (username is not None and row["username"] != username):
+            return None
+        return _row_to_job(row)
+    except Exception as e:
+        logger.get_logger().error(f"Error loading job {job_id}: {e}")
+        return None
+
+
+def claim_next_job(worker: str) -> Optional[Dict[str, Any]]:
+    """
+    Atomically take the oldest queued job.
+
+    The claim runs in an IMMEDIATE transaction, so two workers never get the same job.
+
+    Args:
+        worker: Name of the claiming worker
+
+    Returns:
+        The claimed job, or None if the queue is empty
+    """
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+        ).fetchone()
+        if row is None:
+            return None
+        started_at = datetime.now().isoformat()
+        conn.execute("""
+            UPDATE jobs SET status = ?, worker = ?, started_at = ?, progress = 0.1, message = ?
+            WHERE id = ?
+        """, (JOB_RUNNING, worker, started_at, f"Running {row['action']}", row["id"]))
+    job = _row_to_job(row)
+    job.update({"status": JOB_RUNNING, "worker": worker, "started_at": started_at})
+    return job
+
+
+def update_job_progress(job_id: str, progress: float, message: Optional[str] = None) -> bool:
+    """Record a running job's progress (0-1) and status message"""
+    try:
+        with get_db_connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = COALESCE(?, message) WHERE id = ? AND status = ?",
+                (max(0.0, min(1.0, progress)), message, job_id, JOB_RUNNING)
+            )
+        return True
+    except Exception as e:
+        logger.get_logger().error(f"Error updating job {job_id}: {e}")
+        return False
+
+
+def finish_job(job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> bool:
+    """
+    Store a job's outcome.
+
+    Args:
+        job_id: Job ID
+        result: Command result dict; the job fails if it is missing or not successful
+        error: Error message (overrides the result's error)
+
+    Returns:
+        True if stored
+    """
+    succeeded = error is None and bool(result and result.get("success"))
+    if not succeeded and error is None:
+        error = (result or {}).get("error") or "Job failed"
+    try:
+        with get_db_connection() as conn:
+            conn.execute("""
+                UPDATE jobs SET status = ?, progress = 1, message = ?, result = ?, error = ?, finished_at = ?
+                WHERE id = ?
+            """, (
+                JOB_SUCCEEDED if succeeded else JOB_FAILED,
+                "Done" if succeeded else "Failed",
+                json.dumps(result) if result is not None else None,
+                None if succeeded else error,
+                datetime.now().isoformat(),
+                job_id
+            ))
+        return True
+    except Exception as e:
+        logger.get_logger().error(f"Error finishing job {job_id}: {e}")
+        return False
+
+
+def clear_job_result(job_id: str) -> bool:
+    """Drop a finished job's result once it has been handed out (extract results hold every chunk)"""
+    try:
+        with get_db_connection() as conn:
+            conn.execute("UPDATE jobs SET result = NULL WHERE id = ? AND status IN (?, ?)", (job_id, *JOB_FINISHED_STATUSES))
+        return True
+    except Exception as e:
+        logger.get_logger().error(f"Error clearing result of job {job_id}: {e}")
+        return False
+
+
+def purge_finished_jobs(max_age_seconds: float) -> int:
+    """Delete jobs that finished more than max_age_seconds ago (results nobody picked up)"""
+    cutoff = (datetime.now() - timedelta(seconds=max_age_seconds)).isoformat()
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (*JOB_FINISHED_STATUSES, cutoff)
+            )
+            return cursor.rowcount
+    except Exception as e:
+        logger.get_logger().error(f"Error purging finished jobs: {e}")
+        return 0
+
+
+def fail_stale_jobs(timeout_seconds: float) -> int:
+    """Fail running jobs started more than timeout_seconds ago (their worker died or hung)"""
+    cutoff = (datetime.now() - timedelta(seconds=timeout_seconds)).isoformat()
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET status = ?, progress = 1, message = 'Failed', error = 'Job timed out', finished_at = ?
+                WHERE status = ? AND started_at < ?
+            """, (JOB_FAILED, datetime.now().isoformat(), JOB_RUNNING, cutoff))
+            return cursor.rowcount
+    except Exception as e:
+        logger.get_logger().error(f"Error failing stale jobs: {e}")
+        return 0
+
+
+def run_job(job: Dict[str, Any]) -> None:
+    """Run a claimed job through the orchestrator and store its result"""
+    from .messages import ManagerCommand
+    from .orchestrator import ManagerAgent
+
+    result, error = None, None
+    try:
+        # This worker's cached copy may predate feedback the web process flushed before submitting
+        invalidate_state(job.get("username"))
+        orchestrator = ManagerAgent(username=job.get("username"))
+        update_job_progress(job["id"], 0.2, "Extracting text" if job["action"] == "extract" else "Generating content")
+        result = orchestrator.handle_command(ManagerCommand(
+            action=job["action"],
+            params=job["params"],
+            session_id=job.get("session_id")
+        ))
+    except Exception as e:
+        logger.get_logger().exception(f"Job {job['id']} ({job['action']}) crashed")
+        error = str(e)
+    # Workers can be terminated at any time, and the web process reloads the user's state
+    # once the job is finished: don't leave state changes in the write-behind queue
+    flush_state()
+    finish_job(job["id"], result=result, error=error)
+
+
+def _worker_main(worker: str) -> None:
+    """Worker process loop: claim and run jobs until the parent exits"""
+    global _in_job_worker
+    _in_job_worker = True
+    log = logger.get_logger()
+    log.info(f"Job worker {worker} started")
+    parent_pid = os.getppid()
+    while os.getppid() == parent_pid:
+        try:
+            job = claim_next_job(worker)
+        except Exception as e:
+            log.error(f"Job worker {worker} could not claim a job: {e}")
+            job = None
+        if job is None:
+            time.sleep(WORKER_POLL_SECONDS)
+            continue
+        log.info(f"Job worker {worker} running {job['action']} job {job['id']}")
+        run_job(job)
+
+
+class JobWorkerPool:
+    """Pool of worker processes that poll the jobs table"""
+
+    def __init__(self, num_workers: int = 2, job_timeout: float = 600.0, job_retention: float = 3600.0):
+        self.logger = logger.get_logger()
+        self.num_workers = max(1, num_workers)
+        self.job_timeout = job_timeout
+        self.job_retention = job_retention
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[multiprocessing.Process] = []
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def ensure_running(self) -> None:
+        """Start missing workers, replace dead ones and delete old finished jobs"""
+        with self._lock:
+            now = time.time()
+            if now - self._last_purge >= JOB_PURGE_INTERVAL_SECONDS:
+                self._last_purge = now
+                purged = purge_finished_jobs(self.job_retention)
+                if purged:
+                    self.logger.info(f"Deleted {purged} jobs finished more than {self.job_retention:.0f}s ago")
+            alive = [process for process in self._processes if process.is_alive()]
+            if len(alive) < len(self._processes):
+                self.logger.warning(f"Restarting {len(self._processes) - len(alive)} dead job workers")
+                failed = fail_stale_jobs(self.job_timeout)
+                if failed:
+                    self.logger.warning(f"Failed {failed} jobs that exceeded {self.job_timeout:.0f}s")
+            self._processes = alive
+            while len(self._processes) < self.num_workers:
+                worker = f"{socket.gethostname()}:{os.getpid()}:{len(self._processes) + 1}:{uuid.uuid4().hex[:6]}"
+                process = self._context.Process(target=_worker_main, args=(worker,), name=f"job_worker_{worker}", daemon=True)
+                process.start()
+                self._processes.append(process)
+
+    def stop(self) -> None:
+        """Terminate all workers"""
+        with self._lock:
+            for process in self._processes:
+                process.terminate()
+            for process in self._processes:
+                process.join(timeout=5)
+            self._processes = []
+
+
+_job_pool: Optional[JobWorkerPool] = None
+_job_pool_lock = threading.Lock()
+
+
+def get_job_pool() -> JobWorkerPool:
+    """Get the process-wide worker pool, starting it on first use"""
+    global _job_pool
+    if _job_pool is None:
+        with _job_pool_lock:
+            if _job_pool is None:
+                pool = JobWorkerPool(
+                    num_workers=get_int_setting("JOB_WORKERS", 2),
+                    job_timeout=get_float_setting("JOB_TIMEOUT_SECONDS", 600.0),
+                    job_retention=get_float_setting("JOB_RETENTION_SECONDS", 3600.0)
+                )
+                failed = fail_stale_jobs(pool.job_timeout)
+                if failed:
+                    logger.get_logger().warning(f"Failed {failed} stale jobs left by a previous run")
+                _job_pool = pool
+                logger.get_logger().info(f"Starting {pool.num_workers} job workers")
+    _job_pool.ensure_running()
+    return _job_pool
+
+
+def submit_job(
+    action: str,
+    params: Dict[str, Any],
+    username: Optional[str] = None,
+    session_id: Optional[str] = None
+) -> Optional[str]:
+    """Enqueue a job and make sure workers are running to pick it up; returns the job ID"""
+    job_id = enqueue_job(action, params, username, session_id)
+    if job_id:
+        get_job_pool()
+    return job_id
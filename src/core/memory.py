@@ -1,11 +1,108 @@
 """RL state persistence"""
 
+import atexit
+import copy
 import json
 import os
+import threading
+import time
 from dataclasses import dataclass, asdict, field
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set, Tuple
 from pathlib import Path
 
+from .config import get_bool_setting, get_float_setting, get_int_setting
+
+
+# Dict fields whose changes are tracked per key, so a write only upserts the changed keys
+KEYED_FIELDS = ("chunk_performance", "file_mapping")
+
+# Most users' full states written in one batched upsert by the write-behind flusher
+FLUSH_BATCH_SIZE = 50
+
+
+class StateChanges:
+    """
+    What changed in an RLState since it was loaded or last saved.
+    
+    fields are rewritten whole; keys are the changed entries of KEYED_FIELDS; the last
+    history_appended entries of mode_history are new (trimmed to history_limit). full
+    means the state has no known stored baseline and must be written completely; new
+    means that is only because nothing was stored when it was loaded, so the tracked
+    changes can still be re-applied to a state another process has stored since.
+    """
+    
+    def __init__(self, full: bool = False, new: bool = False):
+        self.full = full
+        self.new = full and new
+        self.fields: Set[str] = set()
+        self.keys: Dict[str, Set[str]] = {name: set() for name in KEYED_FIELDS}
+        self.history_appended = 0
+        self.history_limit: Optional[int] = None
+    
+    def is_empty(self) -> bool:
+        return not (self.full or self.fields or self.history_appended or any(self.keys.values()))
+    
+    def merge(self, other: "StateChanges") -> None:
+        """Add the changes of a later save"""
+        if other.full:
+            self.new = other.new and (self.new or not self.full)
+        self.full = self.full or other.full
+        self.fields |= other.fields
+        for name in KEYED_FIELDS:
+            self.keys[name] |= other.keys[name]
+        self.history_appended += other.history_appended
+        if other.history_limit is not None:
+            self.history_limit = other.history_limit
+    
+    def to_delta(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the delta written to storage from the current state values.
+        
+        Args:
+            data: Current state as a field -> value mapping
+        
+        Returns:
+            {"fields": {field: value}, "chunk_performance": {key: value}, "file_mapping": {key: value},
+             "history_append": [entries], "history_limit": int or None} (values are copies)
+        """
+        fields = set(self.fields)
+        keyed: Dict[str, Dict[str, Any]] = {}
+        for name in KEYED_FIELDS:
+            keys = self.keys[name] if name not in fields else set()
+            values = data.get(name) or {}
+            if any(key not in values for key in keys):
+                # Removed keys aren't expressed as upserts; rewrite the field
+                fields.add(name)
+                keys = set()
+            keyed[name] = {key: copy.deepcopy(values[key]) for key in keys}
+        
+        history_append: List[Dict[str, Any]] = []
+        if "mode_history" not in fields and self.history_appended:
+            history = data.get("mode_history") or []
+            history_append = copy.deepcopy(history[-min(self.history_appended, len(history)):]) if history else []
+        
+        delta = {name: keyed[name] for name in KEYED_FIELDS}
+        delta.update({
+            "fields": {name: copy.deepcopy(data.get(name)) for name in fields},
+            "history_append": history_append,
+            "history_limit": self.history_limit,
+        })
+        return delta
+    
+    def apply(self, target: Dict[str, Any], data: Dict[str, Any]) -> None:
+        """Copy the changed values from data into target (another copy of the same state)"""
+        delta = self.to_delta(data)
+        target.update(delta["fields"])
+        for name in KEYED_FIELDS:
+            if delta[name]:
+                if target.get(name) is None:
+                    target[name] = {}
+                target[name].update(delta[name])
+        if delta["history_append"]:
+            target["mode_history"].extend(delta["history_append"])
+        if delta["history_limit"] and len(target["mode_history"]) > delta["history_limit"]:
+            del target["mode_history"][:-delta["history_limit"]]
+
 
 @dataclass
 class RLState:
@@ -31,6 +128,53 @@ class RLState:
     
     # File hash to filename mapping (for analytics display)
     file_mapping: Optional[Dict[str, str]] = field(default_factory=dict)  # file_hash -> filename
+    
+    def __post_init__(self):
+        # A new state has no stored baseline; loaders call mark_clean()
+        object.__setattr__(self, "_changes", StateChanges(full=True))
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Assigning a field marks it changed (nested edits use mark_changed)
+        changes = self.__dict__.get("_changes")
+        if changes is not None and name in self.__dataclass_fields__:
+            changes.fields.add(name)
+        object.__setattr__(self, name, value)
+    
+    def mark_changed(self, field_name: str, key: Optional[str] = None) -> None:
+        """
+        Record an in-place change (e.g. state.mode_alpha[mode] += 1).
+        
+        Args:
+            field_name: Changed field
+            key: Changed key of a KEYED_FIELDS dict (default: the whole field)
+        """
+        if key is not None and field_name in KEYED_FIELDS:
+            self._changes.keys[field_name].add(key)
+        else:
+            self._changes.fields.add(field_name)
+    
+    def append_history(self, entry: Dict[str, Any], max_entries: Optional[int] = None) -> None:
+        """Append to mode_history, keeping at most max_entries (the oldest are dropped)"""
+        self.mode_history.append(entry)
+        self._changes.history_appended += 1
+        if max_entries is not None:
+            self._changes.history_limit = max_entries
+            if len(self.mode_history) > max_entries:
+                del self.mode_history[:-max_entries]
+    
+    def mark_new(self) -> None:
+        """Mark a default state created because nothing was stored (see StateChanges.new)"""
+        object.__setattr__(self, "_changes", StateChanges(full=True, new=True))
+    
+    def mark_clean(self) -> None:
+        """Treat the current values as stored (nothing to write)"""
+        object.__setattr__(self, "_changes", StateChanges())
+    
+    def take_changes(self) -> StateChanges:
+        """Return the changes since the last save and start tracking afresh"""
+        changes = self._changes
+        self.mark_clean()
+        return changes
 
 
 def get_state_path(username: Optional[str] = None) -> Path:
@@ -41,67 +185,47 @@ def get_state_path(username: Optional[str] = None) -> Path:
     return Path(__file__).parent.parent.parent / ".ma_state.json"
 
 
-def load_state(username: Optional[str] = None) -> RLState:
-    """Load RL state - tries Supabase first, then SQLite, then JSON file"""
-    # Try Supabase first (if available and username provided)
+def _normalize_state_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in modes and fields missing from stored state"""
+    # Ensure all modes are present
+    modes = ["quiz", "flashcard", "interactive"]
+    for mode in modes:
+        if mode not in data.get("mode_alpha", {}):
+            data.setdefault("mode_alpha", {})[mode] = 1.0
+        if mode not in data.get("mode_beta", {}):
+            data.setdefault("mode_beta", {})[mode] = 1.0
+    
+    # Ensure chunk_performance exists
+    if "chunk_performance" not in data:
+        data["chunk_performance"] = {}
+    
+    # Ensure file_mapping exists
+    if "file_mapping" not in data:
+        data["file_mapping"] = {}
+    
+    return data
+
+
+def _load_state_from_storage(username: Optional[str] = None) -> RLState:
+    """Load RL state - from the storage backends (primary first, see storage.py), then the JSON file"""
     if username:
-        try:
-            from .supabase_client import load_rl_state_supabase
-            supabase_state = load_rl_state_supabase(username)
-            if supabase_state:
-                # Ensure all modes are present
-                modes = ["quiz", "flashcard", "interactive"]
-                for mode in modes:
-                    if mode not in supabase_state.get("mode_alpha", {}):
-                        supabase_state.setdefault("mode_alpha", {})[mode] = 1.0
-                    if mode not in supabase_state.get("mode_beta", {}):
-                        supabase_state.setdefault("mode_beta", {})[mode] = 1.0
-                
-                # Ensure chunk_performance exists
-                if "chunk_performance" not in supabase_state:
-                    supabase_state["chunk_performance"] = {}
-                
-                # Ensure file_mapping exists
-                if "file_mapping" not in supabase_state:
-                    supabase_state["file_mapping"] = {}
-                
-                return RLState(**supabase_state)
-        except Exception as e:
-            from .logger import logger
-            logger.get_logger().debug(f"Supabase not available, trying other storage: {e}")
-        
-        # Try SQLite database (if available)
-        try:
-            from .database import load_rl_state
-            db_state = load_rl_state(username)
-            if db_state:
-                # Ensure all modes are present
-                modes = ["quiz", "flashcard", "interactive"]
-                for mode in modes:
-                    if mode not in db_state.get("mode_alpha", {}):
-                        db_state.setdefault("mode_alpha", {})[mode] = 1.0
-                    if mode not in db_state.get("mode_beta", {}):
-                        db_state.setdefault("mode_beta", {})[mode] = 1.0
-                
-                # Ensure chunk_performance exists
-                if "chunk_performance" not in db_state:
-                    db_state["chunk_performance"] = {}
-                
-                # Ensure file_mapping exists
-                if "file_mapping" not in db_state:
-                    db_state["file_mapping"] = {}
-                
-                return RLState(**db_state)
-        except Exception as e:
-            from .logger import logger
-            logger.get_logger().debug(f"Database not available, using file storage: {e}")
+        from .storage import get_storage
+        stored_state = get_storage().load_state(username)
+        if stored_state:
+            try:
+                state = RLState(**_normalize_state_data(stored_state))
+                state.mark_clean()
+                return state
+            except TypeError as e:
+                from .logger import logger
+                logger.get_logger().warning(f"Invalid stored state for user {username}, using file storage: {e}")
     
     # Fallback to JSON file
     state_path = get_state_path(username)
     
     if not state_path.exists():
         # Initialize default state
-        return RLState(
+        state = RLState(
             mode_alpha={"quiz": 1.0, "flashcard": 1.0, "interactive": 1.0},
             mode_beta={"quiz": 1.0, "flashcard": 1.0, "interactive": 1.0},
             mode_history=[],
@@ -112,28 +236,16 @@ def load_state(username: Optional[str] = None) -> RLState:
             last_updated=None,
             file_mapping={}
         )
+        state.mark_new()
+        return state
     
     try:
         with open(state_path, 'r') as f:
             data = json.load(f)
         
-        # Ensure all modes are present
-        modes = ["quiz", "flashcard", "interactive"]
-        for mode in modes:
-            if mode not in data.get("mode_alpha", {}):
-                data.setdefault("mode_alpha", {})[mode] = 1.0
-            if mode not in data.get("mode_beta", {}):
-                data.setdefault("mode_beta", {})[mode] = 1.0
-        
-        # Ensure chunk_performance exists
-        if "chunk_performance" not in data:
-            data["chunk_performance"] = {}
-        
-        # Ensure file_mapping exists
-        if "file_mapping" not in data:
-            data["file_mapping"] = {}
-        
-        return RLState(**data)
+        state = RLState(**_normalize_state_data(data))
+        state.mark_clean()
+        return state
     except (json.JSONDecodeError, KeyError, TypeError) as e:
         # If file is corrupted, return default state
         from .logger import logger
@@ -151,28 +263,15 @@ def load_state(username: Optional[str] = None) -> RLState:
         )
 
 
-def save_state(state: RLState, username: Optional[str] = None) -> bool:
-    """Save RL state - tries Supabase first, then SQLite, then JSON file"""
-    # Try Supabase first (if available and username provided)
+def _save_state_to_storage(state: RLState, username: Optional[str] = None) -> bool:
+    """Save the whole RL state - to the first healthy storage backend (see storage.py), else the JSON file"""
     if username:
-        try:
-            from .supabase_client import save_rl_state_supabase
-            data = asdict(state)
-            if save_rl_state_supabase(username, data):
-                return True
-        except Exception as e:
-            from .logger import logger
-            logger.get_logger().debug(f"Supabase not available, trying other storage: {e}")
-        
-        # Try SQLite database (if available)
-        try:
-            from .database import save_rl_state
-            data = asdict(state)
-            if save_rl_state(username, data):
-                return True
-        except Exception as e:
-            from .logger import logger
-            logger.get_logger().debug(f"Database not available, using file storage: {e}")
+        from .storage import get_storage
+        storage = get_storage()
+        if storage.save_state(username, asdict(state)):
+            return True
+        # The backends miss this write; their next write must be a full one
+        storage.forget_owner(username)
     
     # Fallback to JSON file
     state_path = get_state_path(username)
@@ -199,6 +298,320 @@ def save_state(state: RLState, username: Optional[str] = None) -> bool:
         return False
 
 
+def _save_states_to_storage(states: Dict[Optional[str], Dict[str, Any]]) -> Dict[Optional[str], bool]:
+    """
+    Save several users' whole states, batching named users into one upsert per FLUSH_BATCH_SIZE.
+    
+    Users whose batch fails (and the anonymous user) are saved one by one with the JSON fallback.
+    
+    Returns:
+        username -> whether the state was saved
+    """
+    results: Dict[Optional[str], bool] = {}
+    named = [username for username in states if username]
+    if len(named) > 1:
+        from .storage import get_storage
+        storage = get_storage()
+        for start in range(0, len(named), FLUSH_BATCH_SIZE):
+            batch = {username: states[username] for username in named[start:start + FLUSH_BATCH_SIZE]}
+            if storage.save_states(batch):
+                results.update(dict.fromkeys(batch, True))
+    for username, data in states.items():
+        if username not in results:
+            results[username] = _save_state_to_storage(RLState(**data), username)
+    return results
+
+
+def _save_state_delta_to_storage(delta: Dict[str, Any], username: Optional[str]) -> bool:
+    """
+    Apply a state delta (see StateChanges.to_delta) to the backend holding the user's stored state.
+    
+    Returns:
+        True if applied; False if a full write is needed (no username, no stored row,
+        or the backend holding it is unavailable)
+    """
+    if not username:
+        return False
+    from .storage import get_storage
+    return get_storage().save_state_delta(username, delta)
+
+
+def _rebase_on_stored(data: Dict[str, Any], changes: StateChanges, username: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Re-read storage before writing a new user's state whole.
+    
+    Another process (e.g. a job worker) may have stored the user since the state was
+    loaded; writing ours whole would overwrite its changes.
+    
+    Returns:
+        The stored state with our tracked changes applied, or None to write data as is
+    """
+    if not changes.new:
+        return None
+    stored = _load_state_from_storage(username)
+    if stored.take_changes().full:
+        return None  # Still nothing stored
+    rebased = asdict(stored)
+    changes.apply(rebased, data)
+    return rebased
+
+
+@dataclass
+class _CachedState:
+    """Cached state of one user; version increases with every save"""
+    data: Dict[str, Any]
+    version: int
+    loaded_at: float
+    dirty: bool = False
+    changes: StateChanges = field(default_factory=StateChanges)  # Unwritten changes
+
+
+class StateCache:
+    """
+    In-process per-user RLState cache with write-behind persistence.
+    
+    load_state is served from the cache (re-read from storage after ttl seconds unless
+    there are unsaved changes). save_state updates the cache immediately, stamps it with
+    a new version and queues the write; a background flusher writes only the latest
+    version of each user, once flush_interval seconds have passed since the first unsaved
+    save or as soon as max_pending saves have been coalesced (full writes of the users due
+    together are batched into one upsert). flush() writes everything
+    synchronously and runs at interpreter exit. Saves and writes only copy what changed
+    (see StateChanges); a full copy is made only for states without a stored baseline.
+    """
+    
+    def __init__(self, ttl: float = 30.0, flush_interval: float = 2.0, max_pending: int = 20):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self._lock = threading.Condition()
+        self._write_lock = threading.Lock()  # One storage write at a time (flusher vs flush())
+        self._entries: Dict[Optional[str], _CachedState] = {}
+        self._pending: Dict[Optional[str], Tuple[float, int]] = {}  # username -> (first unsaved save, saves coalesced)
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"hits": 0, "misses": 0, "saves": 0, "writes": 0, "write_errors": 0}
+    
+    def load(self, username: Optional[str]) -> RLState:
+        """Get a user's state (a private copy the caller may modify)"""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and (entry.dirty or time.time() - entry.loaded_at < self.ttl):
+                self.stats["hits"] += 1
+                state = RLState(**copy.deepcopy(entry.data))
+                state.mark_clean()
+                return state
+            self.stats["misses"] += 1
+        
+        state = _load_state_from_storage(username)
+        with self._lock:
+            entry = self._entries.get(username)
+            # Don't replace changes saved while we were reading storage
+            if entry is None or not entry.dirty:
+                version = entry.version if entry is not None else 0
+                # Nothing stored yet: later saves stay rebaseable (see StateChanges.new)
+                changes = StateChanges(full=True, new=True) if state._changes.new else StateChanges()
+                self._entries[username] = _CachedState(asdict(state), version, time.time(), changes=changes)
+        return state
+    
+    def save(self, state: RLState, username: Optional[str]) -> int:
+        """Update the cache and queue the write; returns the new version"""
+        changes = state.take_changes()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and changes.is_empty():
+                return entry.version
+            version = (entry.version if entry is not None else 0) + 1
+            if entry is None or changes.full:
+                # Keep tracking what changed, so a new user's state can be rebased on one stored meanwhile
+                pending = entry.changes if entry is not None else StateChanges(full=True)
+                pending.merge(changes)
+                self._entries[username] = _CachedState(asdict(state), version, now, dirty=True, changes=pending)
+            else:
+                changes.apply(entry.data, vars(state))
+                entry.changes.merge(changes)
+                entry.version = version
+                entry.dirty = True
+            first_saved, count = self._pending.get(username, (now, 0))
+            self._pending[username] = (first_saved, count + 1)
+            self.stats["saves"] += 1
+            self._ensure_flusher()
+            self._lock.notify_all()
+        return version
+    
+    def get_version(self, username: Optional[str]) -> int:
+        """Version of the cached state (0 if the user is not cached)"""
+        with self._lock:
+            entry = self._entries.get(username)
+            return entry.version if entry is not None else 0
+    
+    def invalidate(self, username: Optional[str]) -> None:
+        """Drop a user's cached state (unsaved changes are flushed first)"""
+        self.flush(username)
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and not entry.dirty:
+                del self._entries[username]
+    
+    def _ensure_flusher(self) -> None:
+        """Start the background flusher thread (lock held)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run_flusher, name="state_flusher", daemon=True)
+            self._thread.start()
+    
+    def _due_users(self, now: float) -> Tuple[List[Optional[str]], float]:
+        """Users whose pending writes are due, and seconds until the next one is (lock held)"""
+        due, wait = [], self.flush_interval
+        for username, (first_saved, count) in self._pending.items():
+            remaining = first_saved + self.flush_interval - now
+            if remaining <= 0 or count >= self.max_pending:
+                due.append(username)
+            else:
+                wait = min(wait, remaining)
+        return due, wait
+    
+    def _run_flusher(self) -> None:
+        """Background loop writing due users"""
+        while True:
+            with self._lock:
+                due, wait = self._due_users(time.time())
+                if not due:
+                    self._lock.wait(timeout=wait)
+                    continue
+            self._write_many(due)
+    
+    def _write_many(self, usernames: List[Optional[str]]) -> bool:
+        """
+        Write the latest cached versions of several users to storage.
+        
+        Users with a stored baseline get their delta applied; the others' full
+        states are saved together as batched upserts.
+        
+        Returns:
+            True if every write succeeded
+        """
+        with self._write_lock:
+            taken: Dict[Optional[str], Tuple[int, StateChanges, Optional[Dict[str, Any]]]] = {}
+            with self._lock:
+                for username in usernames:
+                    entry = self._entries.get(username)
+                    self._pending.pop(username, None)
+                    if entry is None or not entry.dirty:
+                        continue
+                    changes, entry.changes = entry.changes, StateChanges()
+                    delta = None if changes.full else changes.to_delta(entry.data)
+                    taken[username] = (entry.version, changes, delta)
+            
+            results: Dict[Optional[str], bool] = {}
+            full_writes = []
+            for username, (_, changes, delta) in taken.items():
+                if delta is not None and (changes.is_empty() or _save_state_delta_to_storage(delta, username)):
+                    results[username] = True
+                else:
+                    full_writes.append(username)
+            rebased: Dict[Optional[str], Dict[str, Any]] = {}
+            if full_writes:
+                with self._lock:
+                    states = {username: copy.deepcopy(self._entries[username].data) for username in full_writes}
+                for username in full_writes:
+                    stored = _rebase_on_stored(states[username], taken[username][1], username)
+                    if stored is not None:
+                        states[username] = rebased[username] = stored
+                results.update(_save_states_to_storage(states))
+            
+            with self._lock:
+                for username, (version, _, _) in taken.items():
+                    entry = self._entries.get(username)
+                    if results[username]:
+                        self.stats["writes"] += 1
+                        # A newer save may have arrived during the write; it stays dirty and pending
+                        if entry is not None and entry.version == version:
+                            if username in rebased:
+                                entry.data = rebased[username]
+                            entry.dirty = False
+                            entry.loaded_at = time.time()
+                    else:
+                        self.stats["write_errors"] += 1
+                        if entry is not None:
+                            # A failed full write leaves no stored baseline to apply deltas to
+                            entry.changes.merge(StateChanges(full=True))
+                        # Retry after another flush interval
+                        self._pending.setdefault(username, (time.time(), 1))
+            return all(results.values())
+    
+    def flush(self, username: Optional[str] = None) -> bool:
+        """
+        Write unsaved changes synchronously.
+        
+        Args:
+            username: Only flush this user (default: every user)
+        
+        Returns:
+            True if every write succeeded
+        """
+        with self._lock:
+            users = [username] if username is not None else list(self._pending)
+            users = [user for user in users if user in self._pending]
+        return self._write_many(users)
+
+
+_state_cache: Optional[StateCache] = None
+_state_cache_lock = threading.Lock()
+
+
+def get_state_cache() -> Optional[StateCache]:
+    """Get the process-wide state cache, or None if STATE_CACHE_ENABLED is off"""
+    global _state_cache
+    if not get_bool_setting("STATE_CACHE_ENABLED", True):
+        return None
+    if _state_cache is None:
+        with _state_cache_lock:
+            if _state_cache is None:
+                _state_cache = StateCache(
+                    ttl=get_float_setting("STATE_CACHE_TTL_SECONDS", 30.0),
+                    flush_interval=get_float_setting("STATE_FLUSH_INTERVAL_SECONDS", 2.0),
+                    max_pending=get_int_setting("STATE_FLUSH_MAX_PENDING", 20)
+                )
+                atexit.register(_state_cache.flush)
+    return _state_cache
+
+
+def load_state(username: Optional[str] = None) -> RLState:
+    """Load RL state (from the in-process cache when possible)"""
+    cache = get_state_cache()
+    if cache is None:
+        return _load_state_from_storage(username)
+    return cache.load(username)
+
+
+def save_state(state: RLState, username: Optional[str] = None) -> bool:
+    """Save RL state (written to storage in the background when the cache is enabled)"""
+    cache = get_state_cache()
+    if cache is None:
+        changes = state.take_changes()
+        if changes.is_empty():
+            return True
+        if not changes.full and _save_state_delta_to_storage(changes.to_delta(vars(state)), username):
+            return True
+        rebased = _rebase_on_stored(asdict(state), changes, username)
+        return _save_state_to_storage(RLState(**rebased) if rebased is not None else state, username)
+    cache.save(state, username)
+    return True
+
+
+def flush_state(username: Optional[str] = None) -> bool:
+    """Write pending state changes to storage now (all users unless username is given)"""
+    cache = get_state_cache()
+    return cache.flush(username) if cache is not None else True
+
+
+def invalidate_state(username: Optional[str] = None) -> None:
+    """Make the next load_state read storage (pending changes are written first)"""
+    cache = get_state_cache()
+    if cache is not None:
+        cache.invalidate(username)
+
+
 def reset_state(username: Optional[str] = None) -> RLState:
     """Reset RL state to initial values"""
     state = RLState(
@@ -213,5 +626,8 @@ def reset_state(username: Optional[str] = None) -> RLState:
         file_mapping={}
     )
     save_state(state, username)
+    # Normalized analytics rows are rebuilt from the (now empty) state on next use
+    from .performance_store import forget_user
+    forget_user(username)
     return state
 
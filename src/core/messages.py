@@ -46,6 +46,12 @@ class GenerationRequest:
     num_items: Optional[int] = None  # Number of questions/cards/steps
     context: Optional[str] = None
     feedback_context: Optional[Dict[str, Any]] = None  # Feedback history and preferences for adaptation
+    chunk_numbers: Optional[List[int]] = None  # Original chunk number of each chunk (defaults to 1..n)
+    priority: str = "interactive"  # "interactive" (user is waiting) or "prefetch" (rate limiter scheduling)
+    exclude_questions: Optional[List[str]] = None  # Questions the user has already seen (next quiz page)
+    rotation: int = 0  # Offset into the chunks' density ranking (regenerated content, next quiz page)
+    username: Optional[str] = None  # User the content is generated for (usage accounting)
+    file_hash: Optional[str] = None  # File the chunks come from (usage accounting)
 
 
 @dataclass
@@ -10,8 +10,20 @@ from .messages import (
     RLUpdateRequest, RLRecommendation,
     ManagerCommand, ContentType, LearningMode
 )
-from .memory import load_state, save_state, reset_state, RLState
+from .memory import flush_state, invalidate_state, load_state, save_state, reset_state, RLState
 from .logger import logger
+from .prefetch import get_prefetcher
+from .session_store import get_session_store, persist_upload
+from .job_queue import (
+    JOB_ACTIONS, JOB_FINISHED_STATUSES, JOB_QUEUED, JOB_SUCCEEDED,
+    clear_job_result, get_job, is_job_queue_enabled, submit_job
+)
+from .rate_limiter import PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+from ..tools.chunk_index import chunks_digest
+
+# Maximum seconds to wait for a prefetch that is already running before generating directly
+# (one that hasn't started yet is cancelled instead)
+PREFETCH_WAIT_SECONDS = 5
 
 
 class ManagerAgent:
@@ -19,7 +31,8 @@ class ManagerAgent:
     
     def __init__(self, username: Optional[str] = None):
         self.logger = logger.get_logger()
-        self.session_context: Dict[str, Any] = {}
+        self.session_context = get_session_store()
+        self._session_ids = set()  # Sessions this manager stored (dropped on reset)
         self.username = username
         self.state: RLState = load_state(username)
     
@@ -31,6 +44,14 @@ class ManagerAgent:
             if command.session_id:
                 params["session_id"] = command.session_id
             
+            # Run extract/generate on a background worker process and return a job ID
+            # (prefetched content lives in this process and is served directly)
+            if (
+                params.pop("async", False) and command.action in JOB_ACTIONS and is_job_queue_enabled()
+                and not (command.action == "generate" and self._has_prefetched(params))
+            ):
+                return self._handle_submit_job(command.action, params)
+            
             if command.action == "extract":
                 return self._handle_extract(params)
             elif command.action == "generate":
@@ -43,6 +64,8 @@ class ManagerAgent:
                 return self._handle_survey(params)
             elif command.action == "reset_preferences":
                 return self._handle_reset_preferences()
+            elif command.action == "job_status":
+                return self._handle_job_status(params)
             else:
                 return {"success": False, "error": f"Unknown action: {command.action}"}
         except Exception as e:
@@ -54,6 +77,88 @@ class ManagerAgent:
         # Future enhancement: use asyncio.gather for parallel operations
         return self.handle_command(command)
     
+    def _handle_submit_job(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Enqueue an extract/generate command for the worker pool"""
+        if action == "extract" and params.get("file_path"):
+            # The caller may delete its temporary upload before a worker picks the job up
+            persisted_path = persist_upload(params["file_path"], params.get("file_type"))
+            if not persisted_path:
+                return {"success": False, "error": "Could not store the uploaded file for processing"}
+            params = {**params, "file_path": persisted_path}
+        
+        # The worker reads this user's state from storage, so it must see this process's latest feedback
+        flush_state(self.username)
+        job_id = submit_job(action, params, self.username, params.get("session_id"))
+        if not job_id:
+            return {"success": False, "error": f"Could not queue {action} job"}
+        self.logger.info(f"Queued {action} job {job_id}")
+        return {"success": True, "job_id": job_id, "status": JOB_QUEUED}
+    
+    def _handle_job_status(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Status, progress and (once finished) result of a background job.
+        
+        A finished job's result is handed out once and then dropped from the jobs table.
+        """
+        job = get_job(params.get("job_id", ""), username=self.username)
+        if job is None:
+            return {"success": False, "error": "Job not found"}
+        
+        result = job["result"]
+        if job["status"] in JOB_FINISHED_STATUSES and result is not None:
+            clear_job_result(job["id"])
+            # Pick up state changes the worker wrote
+            invalidate_state(self.username)
+            self.state = load_state(self.username)
+            if job["status"] == JOB_SUCCEEDED:
+                self._on_job_result(job, result)
+        
+        return {
+            "success": True,
+            "job_id": job["id"],
+            "action": job["action"],
+            "status": job["status"],
+            "done": job["status"] in JOB_FINISHED_STATUSES,
+            "progress": job["progress"],
+            "message": job["message"],
+            "result": result,
+            "error": job["error"]
+        }
+    
+    def _on_job_result(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Keep what this process needs from a successful job's result"""
+        job_params = job["params"]
+        if job["action"] == "extract" and job.get("session_id"):
+            # Resident copy of the chunks for later generate calls that fall back to the session
+            source = {"file_path": job_params.get("file_path"), "file_type": job_params.get("file_type")}
+            self.session_context.put(job["session_id"], result.get("chunks", []), result.get("summary"), source)
+            self._session_ids.add(job["session_id"])
+        elif job["action"] == "generate" and not job_params.get("focus"):
+            # Workers don't prefetch; the next likely content is prefetched here, where the next request is served
+            chunks = self._get_request_chunks(job_params)
+            if chunks:
+                self._schedule_prefetch(job_params, ContentType(job_params.get("content_type", "quiz")), chunks, result)
+    
+    def _get_request_chunks(self, params: Dict[str, Any]) -> List[str]:
+        """Non-empty chunks of a generate request (from the params or the session)"""
+        chunks = params.get("chunks")
+        if not chunks and params.get("session_id"):
+            chunks = self.session_context.get(params["session_id"]).get("chunks", [])
+        if not chunks:
+            chunks = params.get("extracted_chunks")
+        return [chunk for chunk in chunks or [] if chunk and chunk.strip()]
+    
+    def _has_prefetched(self, params: Dict[str, Any]) -> bool:
+        """Whether content for this generate request was prefetched in this process"""
+        prefetcher = get_prefetcher()
+        if prefetcher is None or params.get("focus"):
+            return False
+        chunks = self._get_request_chunks(params)
+        if not chunks:
+            return False
+        content_type = ContentType(params.get("content_type", "quiz"))
+        return prefetcher.has(self.username, self._get_prefetch_key(content_type, chunks, params))
+    
     def _handle_extract(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Route extraction request to NLP Agent"""
         from ..agents.nlp_agent import NLPAgent
@@ -68,16 +173,38 @@ class ManagerAgent:
         session_id = params.get("session_id")
         self.logger.info(f"Extract handler - session_id: {session_id}, chunks count: {len(response.chunks) if response.chunks else 0}")
         
-        if session_id:
-            self.session_context[session_id] = {
-                "chunks": response.chunks,
-                "summary": response.summary
-            }
+        if session_id and response.success:
+            # Keep a copy of the upload so an evicted session can be re-extracted
+            source = None
+            if params.get("file_path"):
+                persisted_path = persist_upload(params["file_path"], params.get("file_type"))
+                if persisted_path:
+                    source = {"file_path": persisted_path, "file_type": params.get("file_type")}
+            self.session_context.put(session_id, response.chunks, response.summary, source)
+            self._session_ids.add(session_id)
             self.logger.info(f"Stored {len(response.chunks)} chunks in session {session_id} (total {sum(len(c) for c in response.chunks)} chars)")
-            self.logger.info(f"Session context keys: {list(self.session_context.keys())}")
+            self.logger.info(f"Session store: {self.session_context.get_stats()}")
         else:
             self.logger.warning("No session_id provided in extract params, chunks will not be stored in session context")
         
+        # Register the file's chunks so weak-area chunk IDs can be mapped back to text
+        filename = params.get("filename")
+        if filename and response.success and response.chunks:
+            from .analytics import register_file_chunks
+            register_file_chunks(filename, response.chunks)
+        
+        # Pre-generate the document's question bank in the background, adapted to this user's feedback
+        if response.success and response.chunks:
+            from .analytics import get_file_hash
+            from .question_bank import build_question_bank
+            self.state = load_state(self.username)
+            build_question_bank(
+                response.chunks,
+                {mode: self._get_feedback_context(mode) for mode in ("quiz", "flashcard", "interactive")},
+                username=self.username,
+                file_hash=get_file_hash(filename) if filename else None
+            )
+        
         return {
             "success": response.success,
             "chunks": response.chunks,
@@ -89,8 +216,6 @@ class ManagerAgent:
         """Route generation request to LLM Agent"""
         from ..agents.llm_agent import LLMAgent
         
-        llm_agent = LLMAgent()
-        
         # Determine content type
         content_type_str = params.get("content_type", "quiz")
         content_type = ContentType(content_type_str)
@@ -98,11 +223,29 @@ class ManagerAgent:
         # Get chunks from session or params
         chunks = params.get("chunks", [])
         session_id = params.get("session_id")
+        chunk_numbers = None
+        
+        # "Practice weak areas": only use the chunks the user keeps failing in this file
+        if params.get("focus") == "weak_areas":
+            from .analytics import get_weak_area_chunks
+            filename = params.get("filename")
+            weak_chunks = get_weak_area_chunks(filename, username=self.username) if filename else []
+            if not weak_chunks:
+                error_msg = "No weak areas found for this file yet. Answer more questions to identify them."
+                self.logger.warning(f"Weak-area generation requested for {filename} but no weak chunks were found")
+                return {
+                    "success": False,
+                    "content_type": content_type.value,
+                    "data": {},
+                    "error": error_msg
+                }
+            chunk_numbers = [number for number, _ in weak_chunks]
+            chunks = [chunk for _, chunk in weak_chunks]
+            self.logger.info(f"Weak-area generation for {filename}: chunks {chunk_numbers}")
         
         if not chunks and session_id:
             self.logger.info(f"Generate handler - session_id: {session_id}")
-            self.logger.info(f"Available session context keys: {list(self.session_context.keys())}")
-            session_data = self.session_context.get(session_id, {})
+            session_data = self.session_context.get(session_id)
             chunks = session_data.get("chunks", [])
             self.logger.info(f"Retrieved {len(chunks)} chunks from session {session_id}")
             if chunks:
@@ -115,9 +258,14 @@ class ManagerAgent:
                 chunks = params.get("extracted_chunks", [])
                 self.logger.info(f"Retrieved {len(chunks)} chunks from params.extracted_chunks")
         
-        # Filter out empty chunks
+        # Filter out empty chunks (with their chunk numbers, so source references stay aligned)
         if chunks:
-            chunks = [chunk for chunk in chunks if chunk and chunk.strip()]
+            if chunk_numbers is not None:
+                numbered = [(number, chunk) for number, chunk in zip(chunk_numbers, chunks) if chunk and chunk.strip()]
+                chunk_numbers = [number for number, _ in numbered]
+                chunks = [chunk for _, chunk in numbered]
+            else:
+                chunks = [chunk for chunk in chunks if chunk and chunk.strip()]
             self.logger.info(f"After filtering empty chunks: {len(chunks)} chunks remaining")
         
         # Validate chunks are present and non-empty
@@ -131,9 +279,6 @@ class ManagerAgent:
                 "error": error_msg
             }
         
-        # Filter out empty chunks
-        chunks = [chunk for chunk in chunks if chunk and chunk.strip()]
-        
         if not chunks:
             error_msg = "All extracted chunks are empty. PDF extraction may have failed."
             self.logger.error(error_msg)
@@ -144,6 +289,17 @@ class ManagerAgent:
                 "error": error_msg
             }
         
+        # Serve speculatively prefetched content (next likely mode, next quiz page) if available
+        is_prefetch = params.get("priority") == PRIORITY_PREFETCH
+        prefetcher = get_prefetcher()
+        prefetch_key = self._get_prefetch_key(content_type, chunks, params)
+        if prefetcher and not is_prefetch and prefetch_key is not None:
+            prefetched = prefetcher.take(self.username, prefetch_key, timeout=PREFETCH_WAIT_SECONDS)
+            if prefetched:
+                self.logger.info(f"Serving prefetched {content_type.value} content (page {params.get('page') or 1})")
+                self._schedule_prefetch(params, content_type, chunks, prefetched)
+                return {**prefetched, "prefetched": True}
+        
         self.logger.info(f"Generating {content_type.value} with {len(chunks)} chunks (total {sum(len(c) for c in chunks)} chars)")
         
         # Reload state to get latest feedback before generating context
@@ -218,22 +374,199 @@ class ManagerAgent:
                            f"interactive={feedback_context.get('interactive', {}).get('adaptive_count', 'N/A')}")
         
 
+        # Sample from the document's question bank when it can serve the request (no LLM round-trip)
+        if not is_prefetch and chunk_numbers is None:
+            bank_data = self._sample_question_bank(content_type, chunks, num_items, feedback_context, params)
+            if bank_data:
+                return {
+                    "success": True,
+                    "content_type": content_type.value,
+                    "data": bank_data,
+                    "error": None
+                }
+        
+        from .analytics import get_file_hash
+        
         request = GenerationRequest(    
             content_type=content_type,
             chunks=chunks,
             num_items=num_items,
             context=params.get("context"),
-            feedback_context=feedback_context
+            feedback_context=feedback_context,
+            chunk_numbers=chunk_numbers,
+            priority=params.get("priority", PRIORITY_INTERACTIVE),
+            exclude_questions=params.get("exclude_questions"),
+            rotation=self._get_rotation(content_type, params),
+            username=self.username,
+            file_hash=get_file_hash(params["filename"]) if params.get("filename") else None
         )
         
+        llm_agent = LLMAgent()
         response = llm_agent.generate(request)
         
-        return {
+        result = {
             "success": response.success,
             "content_type": response.content_type.value,
             "data": response.data,
             "error": response.error
         }
+        
+        if response.success and not is_prefetch:
+            self._schedule_prefetch(params, content_type, chunks, result)
+        
+        return result
+    
+    def _sample_question_bank(
+        self,
+        content_type: ContentType,
+        chunks: List[str],
+        num_items: Optional[int],
+        feedback_context: Dict[str, Any],
+        params: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Sample content from the question bank built for the user's feedback context
+        (easier items first for users who disliked the mode).
+        
+        Returns:
+            Generated data, or None if the bank can't serve this request
+        """
+        from .analytics import get_file_hash
+        from .question_bank import sample_bundle_from_bank, sample_from_bank
+        
+        def preferred_difficulty(fc: Dict[str, Any]) -> Optional[str]:
+            if fc and fc.get("has_feedback") and fc.get("average_feedback", 0.5) < 0.4:
+                return "easy"
+            return None
+        
+        file_hash = get_file_hash(params["filename"]) if params.get("filename") else None
+        
+        if content_type == ContentType.MIXED:
+            modes = (("quiz", "quiz"), ("flashcard", "flashcards"), ("interactive", "interactive"))
+            bundle = sample_bundle_from_bank(
+                chunks,
+                {
+                    mode: {
+                        "num_items": feedback_context.get(mode, {}).get("adaptive_count"),
+                        "difficulty": preferred_difficulty(feedback_context.get(mode, {})),
+                        "feedback_context": feedback_context.get(mode)
+                    }
+                    for mode, _ in modes
+                },
+                username=self.username,
+                file_hash=file_hash
+            )
+            if bundle is None:
+                return None
+            return {key: bundle[mode] for mode, key in modes}
+        
+        return sample_from_bank(
+            chunks,
+            content_type.value,
+            num_items,
+            preferred_difficulty(feedback_context),
+            params.get("exclude_questions"),
+            feedback_context=feedback_context,
+            username=self.username,
+            file_hash=file_hash
+        )
+    
+    def _get_rotation(self, content_type: ContentType, params: Dict[str, Any]) -> int:
+        """
+        How far to rotate the chunk selection, so regenerated content and later quiz pages
+        reach the chunks earlier generations left out.
+        
+        params["rounds"] maps each mode to the number of times the UI has already generated
+        it for the current file.
+        """
+        rounds = params.get("rounds") or {}
+        return int(rounds.get(content_type.value, 0)) + int(params.get("page") or 1) - 1
+    
+    def _get_prefetch_key(self, content_type: ContentType, chunks: List[str], params: Dict[str, Any]) -> Optional[tuple]:
+        """Key identifying prefetchable content (None for weak-area practice, which is never prefetched)"""
+        if params.get("focus"):
+            return None
+        return (
+            content_type.value,
+            chunks_digest(chunks),
+            int(params.get("page") or 1),
+            params.get("num_items"),
+            self._get_rotation(content_type, params)
+        )
+    
+    def _schedule_prefetch(
+        self,
+        params: Dict[str, Any],
+        content_type: ContentType,
+        chunks: List[str],
+        result: Dict[str, Any]
+    ) -> None:
+        """
+        Start background generation of what the user will most likely ask for next:
+        the next page of quiz questions and the next most likely learning mode.
+        
+        Args:
+            params: Params of the generation that just completed
+            content_type: Content type that was generated
+            chunks: Chunks the content was generated from
+            result: Result of the generation
+        """
+        prefetcher = get_prefetcher()
+        if prefetcher is None or params.get("focus"):
+            return
+        
+        targets = []
+        
+        # Next page of quiz questions ("More Questions")
+        if content_type == ContentType.QUIZ:
+            questions = result.get("data", {}).get("questions", [])
+            seen_questions = list(params.get("exclude_questions") or []) + [
+                q.get("question", "") for q in questions if isinstance(q, dict)
+            ]
+            targets.append({
+                "content_type": ContentType.QUIZ.value,
+                "page": int(params.get("page") or 1) + 1,
+                "num_items": params.get("num_items"),
+                "exclude_questions": seen_questions
+            })
+        
+        # Next most likely mode (a mixed bundle already contains every mode)
+        if content_type != ContentType.MIXED:
+            next_mode = self._get_next_likely_mode(content_type.value)
+            if next_mode:
+                targets.append({"content_type": next_mode})
+        
+        for target in targets:
+            target_params = {
+                **target,
+                "chunks": chunks,
+                "priority": PRIORITY_PREFETCH,
+                "filename": params.get("filename"),
+                "rounds": params.get("rounds")
+            }
+            key = self._get_prefetch_key(ContentType(target["content_type"]), chunks, target_params)
+            # A separate manager, so the prefetch thread never replaces this manager's state
+            # while the user's own request is using it
+            prefetcher.schedule(
+                self.username,
+                key,
+                lambda target_params=target_params: ManagerAgent(self.username)._handle_generate(target_params)
+            )
+    
+    def _get_next_likely_mode(self, current_mode: str) -> Optional[str]:
+        """Most likely mode other than current_mode, by the RL agent's mode probabilities"""
+        try:
+            from ..agents.rl_agent import RLAgent
+            
+            probabilities = RLAgent(username=self.username).recommend_mode().probabilities
+        except Exception as e:
+            self.logger.warning(f"Could not get mode probabilities for prefetch: {e}")
+            return None
+        
+        candidates = {mode: prob for mode, prob in probabilities.items() if mode != current_mode}
+        if not candidates:
+            return None
+        return max(candidates, key=candidates.get)
     
     def _handle_update_rl(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Route feedback update to RL Agent"""
@@ -244,6 +577,11 @@ class ManagerAgent:
             request = RLUpdateRequest(**params)
             rl_agent.update_from_feedback(request)
             
+            # Content prefetched for this mode was adapted to the old feedback
+            prefetcher = get_prefetcher()
+            if prefetcher:
+                prefetcher.invalidate(self.username, lambda key: key[0] == request.mode.lower())
+            
             # Reload state after update
             self.state = load_state(self.username)
             
@@ -280,6 +618,8 @@ class ManagerAgent:
         """Handle survey response"""
         preference = params.get("preference")
         
+        # Apply the answer to the latest state, not the one loaded when this manager was created
+        self.state = load_state(self.username)
         self.state.survey_completed = True
         self.state.initial_preference = preference
         self.state.total_sessions += 1
@@ -297,7 +637,9 @@ class ManagerAgent:
         """Reset user preferences and RL state"""
         from .memory import reset_state
         self.state = reset_state(self.username)
-        self.session_context.clear()
+        for session_id in self._session_ids:
+            self.session_context.discard(session_id)
+        self._session_ids.clear()
         
         return {
             "success": True,
@@ -376,7 +718,7 @@ class ManagerAgent:
     
     def get_session_context(self, session_id: str) -> Dict[str, Any]:
         """Get session context"""
-        return self.session_context.get(session_id, {})
+        return self.session_context.get(session_id)
     
     def _get_feedback_context(self, content_type: str) -> Dict[str, Any]:
         """
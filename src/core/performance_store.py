@@ -0,0 +1,501 @@
+"""Normalized chunk performance, mode feedback and file tables (indexed projection of the RL state blobs)"""
+
+import hashlib
+import json
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .config import get_bool_setting
+from .database import get_db_connection
+from .logger import logger
+
+
+# File hash used for legacy chunk IDs without one (same grouping as analytics.group_chunks_by_file)
+UNKNOWN_FILE_HASH = "unknown"
+
+ACCURACY_SQL = "CASE WHEN attempts > 0 THEN correct * 100.0 / attempts ELSE 0.0 END"
+
+
+def is_performance_store_enabled() -> bool:
+    """Whether analytics are served from the normalized tables (ANALYTICS_SQL_ENABLED)"""
+    return get_bool_setting("ANALYTICS_SQL_ENABLED", True)
+
+
+def get_chunk_file_hash(chunk_id: str) -> str:
+    """File hash part of a chunk ID ("{file_hash}_chunk_{n}")"""
+    return chunk_id.split("_chunk_")[0] if "_chunk_" in chunk_id else UNKNOWN_FILE_HASH
+
+
+def get_state_version(state_data: Dict[str, Any]) -> str:
+    """
+    Fingerprint of the blob data the tables are built from (chunk counters, files, feedback history).
+
+    It is stored with the user's rows; a blob with a different fingerprint was changed by a
+    writer that didn't update this database's tables (e.g. another node writing to Supabase).
+    """
+    history = state_data.get("mode_history") or []
+    payload = {
+        "chunks": {
+            chunk_id: [perf.get("attempts", 0), perf.get("correct", 0)]
+            for chunk_id, perf in (state_data.get("chunk_performance") or {}).items()
+        },
+        "files": state_data.get("file_mapping") or {},
+        "history": [len(history), history[-1].get("timestamp") if history else None],
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def migrate_user(username: str, state_data: Optional[Dict[str, Any]] = None, force: bool = False) -> bool:
+    """
+    Rebuild a user's rows from the blob layout (chunk_performance, mode_history, file_mapping).
+
+    The blob's fingerprint (get_state_version) is stored with the rows. chunk_stats takes the blob's counters; chunk_attempts gets the questions the blob kept
+    (the last 10 per chunk), so attempt history is complete only from the migration on.
+
+    Args:
+        username: User to migrate
+        state_data: RL state as a dict (loaded if not given)
+        force: Rebuild even if the user was migrated before (the blob changed since)
+
+    Returns:
+        True if the user's rows are in place
+    """
+    try:
+        if state_data is None:
+            from .memory import load_state
+            state_data = asdict(load_state(username))
+
+        now = datetime.now().isoformat()
+        chunk_rows, attempt_rows = [], []
+        files: Dict[str, Optional[str]] = dict(state_data.get("file_mapping") or {})
+        for chunk_id, perf in (state_data.get("chunk_performance") or {}).items():
+            file_hash = get_chunk_file_hash(chunk_id)
+            filename = perf.get("filename")
+            if filename and filename != "unknown_file" and not files.get(file_hash) and file_hash != UNKNOWN_FILE_HASH:
+                files[file_hash] = filename
+            chunk_rows.append((
+                username, chunk_id, file_hash, perf.get("source_reference", ""), filename,
+                perf.get("attempts", 0), perf.get("correct", 0), perf.get("incorrect", 0), perf.get("last_attempt")
+            ))
+            for question in perf.get("questions") or []:
+                attempt_rows.append((
+                    username, file_hash, chunk_id, question.get("question"),
+                    1 if question.get("correct") else 0, question.get("timestamp") or perf.get("last_attempt") or now
+                ))
+        feedback_rows = [
+            (username, entry.get("mode"), entry.get("feedback", 0.5), entry.get("session_id"), entry.get("timestamp") or now)
+            for entry in state_data.get("mode_history") or []
+            if entry.get("mode")
+        ]
+
+        with get_db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if not force and conn.execute(
+                "SELECT 1 FROM normalized_users WHERE username = ?", (username,)
+            ).fetchone():
+                # Another thread or process migrated the user meanwhile
+                return True
+            for table in ("files", "chunk_stats", "chunk_attempts", "mode_feedback"):
+                conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+            conn.executemany(
+                "INSERT INTO files (username, file_hash, filename, created_at) VALUES (?, ?, ?, ?)",
+                [(username, file_hash, filename, now) for file_hash, filename in files.items()]
+            )
+            conn.executemany("""
+                INSERT INTO chunk_stats (
+                    username, chunk_id, file_hash, source_reference, filename, attempts, correct, incorrect, last_attempt
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, chunk_rows)
+            conn.executemany("""
+                INSERT INTO chunk_attempts (username, file_hash, chunk_id, question, correct, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, attempt_rows)
+            conn.executemany("""
+                INSERT INTO mode_feedback (username, mode, feedback, session_id, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, feedback_rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO normalized_users (username, migrated_at, state_version) VALUES (?, ?, ?)",
+                (username, now, get_state_version(state_data))
+            )
+        logger.get_logger().info(
+            f"Migrated performance data of {username}: {len(chunk_rows)} chunks, {len(attempt_rows)} attempts, "
+            f"{len(feedback_rows)} feedback entries, {len(files)} files"
+        )
+        return True
+    except Exception as e:
+        logger.get_logger().error(f"Error migrating performance data of {username}: {e}")
+        return False
+
+
+def migrate_all_users() -> int:
+    """Migrate every user with a blob state in the SQLite rl_state table; returns the number migrated"""
+    try:
+        with get_db_connection() as conn:
+            usernames = [row["username"] for row in conn.execute("SELECT username FROM rl_state").fetchall()]
+    except Exception as e:
+        logger.get_logger().error(f"Error listing users to migrate: {e}")
+        return 0
+    return sum(1 for username in usernames if migrate_user(username))
+
+
+def ensure_migrated(username: Optional[str]) -> bool:
+    """
+    Make sure a user's performance data is in the normalized tables and matches the blob state.
+
+    The rows are built on first use, and rebuilt when the blob's fingerprint differs from
+    the one stored with them: answers or feedback another node or process wrote only to the
+    blob would otherwise never reach this database's tables.
+
+    Returns:
+        True if analytics for the user can be answered from the tables
+    """
+    if not username or not is_performance_store_enabled():
+        return False
+    try:
+        from .memory import load_state
+
+        state_data = asdict(load_state(username))
+        with get_db_connection() as conn:
+            row = conn.execute(
+                "SELECT state_version FROM normalized_users WHERE username = ?", (username,)
+            ).fetchone()
+    except Exception as e:
+        logger.get_logger().error(f"Error checking performance data migration of {username}: {e}")
+        return False
+    if row is not None and row["state_version"] == get_state_version(state_data):
+        return True
+    if row is not None:
+        logger.get_logger().info(f"State of {username} changed outside the performance tables, rebuilding them")
+    return migrate_user(username, state_data, force=row is not None)
+
+
+def mark_synced(username: str, previous_version: str, state_data: Dict[str, Any]) -> bool:
+    """
+    Record that a write to both the blob and the tables keeps them in sync.
+
+    Only applies if the rows matched previous_version (the blob before the write); otherwise
+    they already missed a change and the next ensure_migrated rebuilds them.
+
+    Args:
+        username: User
+        previous_version: get_state_version of the blob before the write
+        state_data: Blob state after the write
+
+    Returns:
+        True if the stored fingerprint was advanced
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.execute(
+                "UPDATE normalized_users SET state_version = ? WHERE username = ? AND state_version = ?",
+                (get_state_version(state_data), username, previous_version)
+            )
+            return cursor.rowcount == 1
+    except Exception as e:
+        logger.get_logger().error(f"Error updating performance data version of {username}: {e}")
+        return False
+
+
+def forget_user(username: Optional[str]) -> None:
+    """Drop a user's rows; they are rebuilt from the blob state on next use"""
+    if not username:
+        return
+    try:
+        with get_db_connection() as conn:
+            conn.execute("DELETE FROM normalized_users WHERE username = ?", (username,))
+            for table in ("files", "chunk_stats", "chunk_attempts", "mode_feedback"):
+                conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+    except Exception as e:
+        logger.get_logger().error(f"Error dropping performance data of {username}: {e}")
+
+
+def record_attempt(
+    username: str,
+    chunk_id: str,
+    source_reference: str,
+    is_correct: bool,
+    question_text: str = "",
+    filename: Optional[str] = None,
+    timestamp: Optional[str] = None
+) -> bool:
+    """Record one quiz answer (see record_attempts)"""
+    return record_attempts(username, [{
+        "chunk_id": chunk_id,
+        "source_reference": source_reference,
+        "is_correct": is_correct,
+        "question_text": question_text,
+        "filename": filename,
+        "timestamp": timestamp,
+    }])
+
+
+def record_attempts(username: str, attempts: List[Dict[str, Any]]) -> bool:
+    """
+    Record quiz answers in one transaction: a chunk_attempts row per answer plus the chunk_stats counters.
+
+    If the write fails, the user's rows are dropped so they are rebuilt from the blob
+    state (which has the answers) instead of silently missing them.
+
+    Args:
+        username: User who answered
+        attempts: Dicts with chunk_id, source_reference, is_correct and optionally
+            question_text, filename and timestamp (ISO time, defaults to now)
+
+    Returns:
+        True if recorded
+    """
+    if not attempts:
+        return True
+    now = datetime.now().isoformat()
+    attempt_rows, stats_rows, file_rows = [], [], []
+    for attempt in attempts:
+        chunk_id = attempt["chunk_id"]
+        timestamp = attempt.get("timestamp") or now
+        file_hash = get_chunk_file_hash(chunk_id)
+        filename = attempt.get("filename")
+        question_text = attempt.get("question_text")
+        correct = 1 if attempt.get("is_correct") else 0
+        attempt_rows.append((username, file_hash, chunk_id, question_text[:200] if question_text else None, correct, timestamp))
+        stats_rows.append((
+            username, chunk_id, file_hash, attempt.get("source_reference", ""), filename, correct, 1 - correct, timestamp
+        ))
+        if filename and filename != "unknown_file" and file_hash != UNKNOWN_FILE_HASH:
+            file_rows.append((username, file_hash, filename, timestamp))
+    try:
+        with get_db_connection() as conn:
+            conn.executemany("""
+                INSERT INTO chunk_attempts (username, file_hash, chunk_id, question, correct, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, attempt_rows)
+            conn.executemany("""
+                INSERT INTO chunk_stats (
+                    username, chunk_id, file_hash, source_reference, filename, attempts, correct, incorrect, last_attempt
+                ) VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)
+                ON CONFLICT (username, chunk_id) DO UPDATE SET
+                    attempts = chunk_stats.attempts + 1,
+                    correct = chunk_stats.correct + excluded.correct,
+                    incorrect = chunk_stats.incorrect + excluded.incorrect,
+                    last_attempt = excluded.last_attempt,
+                    filename = COALESCE(NULLIF(chunk_stats.filename, ''), excluded.filename)
+            """, stats_rows)
+            if file_rows:
+                conn.executemany("""
+                    INSERT INTO files (username, file_hash, filename, created_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (username, file_hash) DO UPDATE SET filename = COALESCE(files.filename, excluded.filename)
+                """, file_rows)
+        return True
+    except Exception as e:
+        logger.get_logger().error(f"Error recording {len(attempts)} attempts for {username}: {e}")
+        forget_user(username)
+        return False
+
+
+def record_file(username: str, file_hash: str, filename: str) -> bool:
+    """Record a user's file (hash -> filename)"""
+    try:
+        with get_db_connection() as conn:
+            conn.execute("""
+                INSERT INTO files (username, file_hash, filename, created_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (username, file_hash) DO UPDATE SET filename = excluded.filename
+            """, (username, file_hash, filename, datetime.now().isoformat()))
+        return True
+    except Exception as e:
+        logger.get_logger().error(f"Error recording file {file_hash}: {e}")
+        forget_user(username)
+        return False
+
+
+def record_mode_feedback(
+    username: str,
+    mode: str,
+    feedback: float,
+    session_id: Optional[str] = None,
+    timestamp: Optional[str] = None
+) -> bool:
+    """Record one learning mode feedback event"""
+    try:
+        with get_db_connection() as conn:
+            conn.execute("""
+                INSERT INTO mode_feedback (username, mode, feedback, session_id, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (username, mode, feedback, session_id, timestamp or datetime.now().isoformat()))
+        return True
+    except Exception as e:
+        logger.get_logger().error(f"Error recording {mode} feedback: {e}")
+        forget_user(username)
+        return False
+
+
+def _accuracy(correct: int, attempts: int) -> float:
+    return (correct / attempts * 100) if attempts > 0 else 0.0
+
+
+def _chunk_row_to_perf(row) -> Dict[str, Any]:
+    return {
+        "correct": row["correct"],
+        "incorrect": row["incorrect"],
+        "attempts": row["attempts"],
+        "accuracy": _accuracy(row["correct"], row["attempts"]),
+        "source_reference": row["source_reference"] or "",
+        "filename": row["filename"],
+        "last_attempt": row["last_attempt"],
+    }
+
+
+def get_chunk_stats(username: str, chunk_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-chunk performance (same fields as analytics.get_all_chunk_performance).
+
+    Args:
+        username: User
+        chunk_id: Only this chunk
+
+    Returns:
+        Dictionary mapping chunk_id to performance metrics
+    """
+    query = "SELECT * FROM chunk_stats WHERE username = ?"
+    args: List[Any] = [username]
+    if chunk_id is not None:
+        query += " AND chunk_id = ?"
+        args.append(chunk_id)
+    with get_db_connection() as conn:
+        rows = conn.execute(query, args).fetchall()
+    return {row["chunk_id"]: _chunk_row_to_perf(row) for row in rows}
+
+
+def get_chunk_areas(
+    username: str,
+    min_attempts: int,
+    below: Optional[float] = None,
+    at_least: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    Chunks filtered by accuracy (weak: below a threshold, strong: at least a threshold).
+
+    Returns:
+        Areas as in analytics.get_weak_areas; weakest first when filtering by below,
+        strongest first otherwise
+    """
+    conditions = ["username = ?", "attempts >= ?"]
+    args: List[Any] = [username, min_attempts]
+    if below is not None:
+        conditions.append(f"{ACCURACY_SQL} < ?")
+        args.append(below)
+    if at_least is not None:
+        conditions.append(f"{ACCURACY_SQL} >= ?")
+        args.append(at_least)
+    order = "ASC" if below is not None else "DESC"
+    with get_db_connection() as conn:
+        rows = conn.execute(f"""
+            SELECT chunk_id, source_reference, correct, incorrect, attempts, last_attempt, {ACCURACY_SQL} AS accuracy
+            FROM chunk_stats
+            WHERE {' AND '.join(conditions)}
+            ORDER BY accuracy {order}, chunk_id
+        """, args).fetchall()
+    return [
+        {
+            "chunk_id": row["chunk_id"],
+            "source_reference": row["source_reference"] or "",
+            "accuracy": _accuracy(row["correct"], row["attempts"]),
+            "correct": row["correct"],
+            "incorrect": row["incorrect"],
+            "attempts": row["attempts"],
+            "last_attempt": row["last_attempt"],
+        }
+        for row in rows
+    ]
+
+
+def get_summary(username: str) -> Dict[str, Any]:
+    """Overall totals (same fields as analytics.get_performance_summary)"""
+    with get_db_connection() as conn:
+        row = conn.execute("""
+            SELECT COUNT(*) AS total_chunks,
+                   COALESCE(SUM(attempts), 0) AS total_attempts,
+                   COALESCE(SUM(correct), 0) AS total_correct,
+                   COALESCE(SUM(incorrect), 0) AS total_incorrect,
+                   COALESCE(SUM(attempts > 0), 0) AS chunks_with_data
+            FROM chunk_stats
+            WHERE username = ?
+        """, (username,)).fetchone()
+    total_attempts = row["total_attempts"]
+    return {
+        "total_chunks": row["total_chunks"],
+        "total_attempts": total_attempts,
+        "total_correct": row["total_correct"],
+        "total_incorrect": row["total_incorrect"],
+        "overall_accuracy": _accuracy(row["total_correct"], total_attempts),
+        "chunks_with_data": row["chunks_with_data"],
+    }
+
+
+def get_file_stats(username: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-file totals of a user's chunks.
+
+    Returns:
+        Dictionary mapping file_hash to filename, totals, accuracy and last attempt
+    """
+    with get_db_connection() as conn:
+        rows = conn.execute("""
+            SELECT s.file_hash,
+                   COALESCE(f.filename, MAX(NULLIF(s.filename, 'unknown_file'))) AS filename,
+                   SUM(s.attempts) AS total_attempts,
+                   SUM(s.correct) AS total_correct,
+                   SUM(s.incorrect) AS total_incorrect,
+                   SUM(s.attempts > 0) AS chunks_with_data,
+                   MAX(s.last_attempt) AS last_attempt
+            FROM chunk_stats s
+            LEFT JOIN files f ON f.username = s.username AND f.file_hash = s.file_hash
+            WHERE s.username = ?
+            GROUP BY s.file_hash
+        """, (username,)).fetchall()
+    return {
+        row["file_hash"]: {
+            "file_hash": row["file_hash"],
+            "filename": row["filename"],
+            "total_attempts": row["total_attempts"] or 0,
+            "total_correct": row["total_correct"] or 0,
+            "total_incorrect": row["total_incorrect"] or 0,
+            "chunks_with_data": row["chunks_with_data"] or 0,
+            "accuracy": _accuracy(row["total_correct"] or 0, row["total_attempts"] or 0),
+            "last_attempt": row["last_attempt"],
+        }
+        for row in rows
+    }
+
+
+def get_mode_feedback_stats(username: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Feedback per learning mode.
+
+    Returns:
+        Dictionary mapping mode to count, average feedback, positive rate and last feedback time
+    """
+    with get_db_connection() as conn:
+        rows = conn.execute("""
+            SELECT mode,
+                   COUNT(*) AS feedback_count,
+                   AVG(feedback) AS average_feedback,
+                   AVG(feedback > 0.5) AS positive_rate,
+                   MAX(created_at) AS last_feedback
+            FROM mode_feedback
+            WHERE username = ?
+            GROUP BY mode
+        """, (username,)).fetchall()
+    return {
+        row["mode"]: {
+            "feedback_count": row["feedback_count"],
+            "average_feedback": row["average_feedback"],
+            "positive_rate": row["positive_rate"],
+            "last_feedback": row["last_feedback"],
+        }
+        for row in rows
+    }
+
+
+if __name__ == "__main__":
+    # python -m src.core.performance_store: migrate every SQLite-stored user up front
+    print(f"Migrated {migrate_all_users()} users")
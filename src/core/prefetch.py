@@ -0,0 +1,159 @@
+"""Speculative background prefetch of content the user is likely to ask for next"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .config import get_bool_setting, get_float_setting, get_int_setting
+from .logger import logger
+
+
+class Prefetcher:
+    """
+    Runs speculative generations on a small worker pool and keeps their results per user.
+
+    Each user has a budget of prefetches per time window, so speculation never costs
+    more than a few extra generations per student. Results expire after a TTL and are
+    handed out at most once.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        budget_per_user: int = 6,
+        budget_window: float = 3600.0,
+        ttl: float = 1800.0
+    ):
+        self.logger = logger.get_logger()
+        self.budget_per_user = budget_per_user
+        self.budget_window = budget_window
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[Optional[str], Hashable], Tuple[Future, float]] = {}
+        self._started: Dict[Optional[str], List[float]] = {}
+        self.stats = {"scheduled": 0, "hits": 0, "misses": 0, "over_budget": 0, "expired": 0, "cancelled": 0}
+
+    def _remaining_budget(self, username: Optional[str], now: float) -> int:
+        """Prefetches the user may still start in the current window (lock held)"""
+        started = [t for t in self._started.get(username, []) if now - t < self.budget_window]
+        self._started[username] = started
+        return self.budget_per_user - len(started)
+
+    def _expire(self, now: float) -> None:
+        """Drop finished results older than the TTL (lock held)"""
+        for entry_key, (future, created) in list(self._entries.items()):
+            if future.done() and now - created > self.ttl:
+                del self._entries[entry_key]
+                self.stats["expired"] += 1
+
+    def schedule(self, username: Optional[str], key: Hashable, func: Callable[[], Dict[str, Any]]) -> bool:
+        """
+        Start a background generation unless it is already cached or the user's budget is spent.
+
+        Args:
+            username: User the content is for
+            key: Identity of the content (must match the key used in take)
+            func: Zero-argument function returning the generation result dict
+
+        Returns:
+            True if a prefetch was started
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if (username, key) in self._entries:
+                return False
+            if self._remaining_budget(username, now) <= 0:
+                self.stats["over_budget"] += 1
+                self.logger.info(f"Prefetch budget spent for user {username}, skipping {key}")
+                return False
+            self._started[username].append(now)
+            self._entries[(username, key)] = (self._executor.submit(func), now)
+            self.stats["scheduled"] += 1
+        self.logger.info(f"Prefetching {key} for user {username}")
+        return True
+
+    def take(self, username: Optional[str], key: Hashable, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Hand out a prefetched result (waiting for it if still running).
+
+        A prefetch that is still queued behind other prefetches is cancelled rather than
+        waited for: the caller generates directly, at interactive priority.
+
+        Args:
+            username: User the content is for
+            key: Identity of the content
+            timeout: Maximum seconds to wait for a prefetch that is already running
+
+        Returns:
+            The successful result dict, or None if nothing usable was prefetched
+        """
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.pop((username, key), None)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        future, _ = entry
+        if future.cancel():
+            self.logger.info(f"Prefetch of {key} had not started yet, cancelled it")
+            self.stats["cancelled"] += 1
+            self.stats["misses"] += 1
+            return None
+        try:
+            result = future.result(timeout=timeout)
+        except Exception as e:
+            self.logger.warning(f"Prefetch of {key} failed or timed out: {e}")
+            self.stats["misses"] += 1
+            return None
+
+        if not result or not result.get("success"):
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return result
+
+    def has(self, username: Optional[str], key: Hashable) -> bool:
+        """Whether a prefetch for key was started and not yet handed out or expired"""
+        with self._lock:
+            self._expire(time.time())
+            return (username, key) in self._entries
+
+    def invalidate(self, username: Optional[str], predicate: Callable[[Hashable], bool]) -> int:
+        """Drop a user's prefetched entries whose key matches predicate; returns how many"""
+        with self._lock:
+            stale = [entry_key for entry_key in self._entries if entry_key[0] == username and predicate(entry_key[1])]
+            for entry_key in stale:
+                del self._entries[entry_key]
+        return len(stale)
+
+
+_prefetcher: Optional[Prefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Optional[Prefetcher]:
+    """
+    Get the process-wide prefetcher, or None if PREFETCH_ENABLED is off.
+
+    Job queue workers never prefetch: the next job usually runs on another worker, so
+    results are kept in the web process, which schedules them when it reads a job's result.
+    """
+    from .job_queue import is_job_worker
+
+    global _prefetcher
+    if not get_bool_setting("PREFETCH_ENABLED", True) or is_job_worker():
+        return None
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher(
+                    max_workers=get_int_setting("PREFETCH_WORKERS", 2),
+                    budget_per_user=get_int_setting("PREFETCH_BUDGET_PER_USER", 6),
+                    budget_window=get_float_setting("PREFETCH_BUDGET_WINDOW_SECONDS", 3600.0),
+                    ttl=get_float_setting("PREFETCH_TTL_SECONDS", 1800.0)
+                )
+    return _prefetcher
@@ -0,0 +1,425 @@
+"""Per-document question bank: pre-generated content sampled without an LLM round-trip"""
+
+import hashlib
+import random
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .config import get_bool_setting, get_int_setting
+from .database import save_bank_items, load_bank_items, claim_bank_items, count_unserved_bank_items
+from .logger import logger
+from .messages import ContentType, GenerationRequest
+from .rate_limiter import PRIORITY_PREFETCH
+from ..tools.chunk_index import chunks_digest, get_chunk_index
+
+
+# Items generated per chunk when the bank is built or refilled
+BANK_ITEMS_PER_CHUNK = {
+    ContentType.QUIZ.value: 2,
+    ContentType.FLASHCARD.value: 2,
+    ContentType.INTERACTIVE.value: 1,
+}
+
+# Key of the item list in each content type's generated data
+BANK_ITEM_KEYS = {
+    ContentType.QUIZ.value: "questions",
+    ContentType.FLASHCARD.value: "cards",
+    ContentType.INTERACTIVE.value: "steps",
+}
+
+# Chunks per generation call while building the bank
+BANK_CHUNKS_PER_CALL = 10
+
+# Steps (and so chunks) per banked interactive lesson: the default step count for documents
+# under 100 chunks. Lessons are served whole, and only to requests for at least this many steps
+BANK_LESSON_STEPS = 5
+
+# Times a sample is re-selected after another request claimed some of its items first
+BANK_CLAIM_ATTEMPTS = 3
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="question_bank")
+_in_progress: Set[Tuple[str, str]] = set()
+_in_progress_lock = threading.Lock()
+
+# Chunks a fill produced no items for, per (bank key, content type); refills skip them
+_barren_chunks: Dict[Tuple[str, str], Set[int]] = {}
+
+
+def is_question_bank_enabled() -> bool:
+    """Whether the question bank is enabled (QUESTION_BANK_ENABLED)"""
+    return get_bool_setting("QUESTION_BANK_ENABLED", True)
+
+
+def get_bank_key(chunks: List[str], feedback_context: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Key of the bank a request is served from: the document's chunk digest, plus a hash of the
+    feedback adaptation instructions when there are any. Users whose feedback calls for the
+    same adaptation share one bank; everyone else shares the document's plain bank.
+    """
+    doc_hash = chunks_digest(chunks)
+    fc = feedback_context or {}
+    instructions = fc.get("adaptation_instructions", "") if fc.get("has_feedback") else ""
+    if not instructions:
+        return doc_hash
+    return f"{doc_hash}:{hashlib.sha1(instructions.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _get_bank_chunks(chunks: List[str]) -> List[Tuple[int, str]]:
+    """The (chunk_number, chunk) pairs that get banked: the densest QUESTION_BANK_MAX_CHUNKS useful chunks"""
+    max_chunks = get_int_setting("QUESTION_BANK_MAX_CHUNKS", 60)
+    index = get_chunk_index(chunks)
+    positions = index.top_k(max_chunks, mask=index.features.useful_mask())
+    return [(pos + 1, chunks[pos]) for pos in positions]
+
+
+def _parse_chunk_number(item: Dict[str, Any]) -> Optional[int]:
+    """Chunk number referenced in an item's source_reference"""
+    match = re.search(r'[Cc]hunk\s*(\d+)', str(item.get("source_reference", "")))
+    return int(match.group(1)) if match else None
+
+
+def _generate_items(
+    content_type: str,
+    numbered_chunks: List[Tuple[int, str]],
+    exclude_questions: Optional[List[str]] = None,
+    feedback_context: Optional[Dict[str, Any]] = None,
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Generate bank entries for chunks with the LLM agent, BANK_CHUNKS_PER_CALL chunks per call.
+
+    Interactive steps keep the lesson they were generated in (_lesson_id/_lesson_title in the
+    item), so a lesson is only ever served whole.
+    """
+    from ..agents.llm_agent import LLMAgent
+
+    llm_agent = LLMAgent()
+    items_key = BANK_ITEM_KEYS[content_type]
+    chunks_per_call = BANK_LESSON_STEPS if content_type == ContentType.INTERACTIVE.value else BANK_CHUNKS_PER_CALL
+    entries = []
+
+    for start in range(0, len(numbered_chunks), chunks_per_call):
+        batch = numbered_chunks[start:start + chunks_per_call]
+        request = GenerationRequest(
+            content_type=ContentType(content_type),
+            chunks=[chunk for _, chunk in batch],
+            chunk_numbers=[number for number, _ in batch],
+            num_items=BANK_ITEMS_PER_CHUNK[content_type] * len(batch),
+            feedback_context=feedback_context,
+            priority=PRIORITY_PREFETCH,
+            exclude_questions=exclude_questions,
+            username=username,
+            file_hash=file_hash
+        )
+        response = llm_agent.generate(request)
+        if not response.success:
+            logger.get_logger().warning(f"Question bank generation failed for {content_type}: {response.error}")
+            continue
+
+        lesson = None
+        if content_type == ContentType.INTERACTIVE.value:
+            lesson = {"_lesson_id": uuid.uuid4().hex, "_lesson_title": response.data.get("title") or "Interactive Lesson"}
+        for item in response.data.get(items_key, []) or []:
+            if not isinstance(item, dict):
+                continue
+            if lesson:
+                item = {**item, **lesson}
+            difficulty = str(item.get("difficulty", "medium")).lower()
+            entries.append({
+                "chunk_number": _parse_chunk_number(item),
+                "difficulty": difficulty if difficulty in DIFFICULTIES else "medium",
+                "item": item
+            })
+
+    return entries
+
+
+def _fill(
+    bank_key: str,
+    content_type: str,
+    numbered_chunks: List[Tuple[int, str]],
+    feedback_context: Optional[Dict[str, Any]] = None,
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> None:
+    """Generate and store bank items for chunks (runs on the bank's worker pool)"""
+    try:
+        exclude_questions = None
+        if content_type == ContentType.QUIZ.value:
+            exclude_questions = [
+                entry["item"].get("question", "") for entry in load_bank_items(bank_key, content_type)
+            ] or None
+        entries = _generate_items(content_type, numbered_chunks, exclude_questions, feedback_context, username, file_hash)
+        if entries:
+            save_bank_items(bank_key, content_type, entries)
+        # Don't keep asking for chunks the model finds nothing to ask about
+        covered = {entry["chunk_number"] for entry in entries}
+        with _in_progress_lock:
+            _barren_chunks.setdefault((bank_key, content_type), set()).update(
+                number for number, _ in numbered_chunks if number not in covered
+            )
+        logger.get_logger().info(
+            f"Question bank: added {len(entries)} {content_type} items for {len(numbered_chunks)} chunks"
+        )
+    except Exception as e:
+        logger.get_logger().error(f"Error filling question bank: {e}")
+    finally:
+        with _in_progress_lock:
+            _in_progress.discard((bank_key, content_type))
+
+
+def _schedule_fill(
+    bank_key: str,
+    content_type: str,
+    numbered_chunks: List[Tuple[int, str]],
+    feedback_context: Optional[Dict[str, Any]] = None,
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> bool:
+    """Fill the bank in the background unless a fill for this bank and type is already running"""
+    with _in_progress_lock:
+        if (bank_key, content_type) in _in_progress:
+            return False
+        _in_progress.add((bank_key, content_type))
+    _executor.submit(_fill, bank_key, content_type, numbered_chunks, feedback_context, username, file_hash)
+    return True
+
+
+def build_question_bank(
+    chunks: List[str],
+    feedback_contexts: Optional[Dict[str, Dict[str, Any]]] = None,
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> None:
+    """
+    Start building the question bank of a document in the background (no-op if it already has one).
+
+    Args:
+        chunks: Document chunks as extracted (chunk numbers are 1-based positions)
+        feedback_contexts: Feedback context per content type of the user the bank is built for
+        username: User the build's LLM usage is recorded for
+        file_hash: File the build's LLM usage is recorded for
+    """
+    if not chunks or not is_question_bank_enabled():
+        return
+
+    numbered_chunks = _get_bank_chunks(chunks)
+    for content_type in BANK_ITEM_KEYS:
+        feedback_context = (feedback_contexts or {}).get(content_type)
+        bank_key = get_bank_key(chunks, feedback_context)
+        if count_unserved_bank_items(bank_key, content_type):
+            continue
+        if _schedule_fill(bank_key, content_type, numbered_chunks, feedback_context, username, file_hash):
+            logger.get_logger().info(f"Building {content_type} question bank for {len(numbered_chunks)} chunks")
+
+
+def _refill_low_chunks(
+    bank_key: str,
+    content_type: str,
+    chunks: List[str],
+    feedback_context: Optional[Dict[str, Any]] = None,
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> None:
+    """Refill banked chunks whose pool of never-served items ran low (including chunks with no items)"""
+    low_water = get_int_setting("QUESTION_BANK_LOW_WATER", 1)
+    unserved = count_unserved_bank_items(bank_key, content_type)
+    with _in_progress_lock:
+        barren = set(_barren_chunks.get((bank_key, content_type), ()))
+    low_chunks = [
+        (number, chunk) for number, chunk in _get_bank_chunks(chunks)
+        if unserved.get(number, 0) < low_water and number not in barren
+    ]
+    if not low_chunks:
+        return
+    # A bank that has nothing yet (e.g. a new feedback adaptation) is built in one go
+    if unserved:
+        low_chunks = low_chunks[:BANK_CHUNKS_PER_CALL]
+    if _schedule_fill(bank_key, content_type, low_chunks, feedback_context, username, file_hash):
+        logger.get_logger().info(f"Refilling {content_type} question bank for {len(low_chunks)} chunks")
+
+
+def _select_from_bank(
+    chunks: List[str],
+    content_type: str,
+    num_items: int,
+    difficulty: Optional[str] = None,
+    exclude_questions: Optional[List[str]] = None,
+    feedback_context: Optional[Dict[str, Any]] = None,
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> Optional[Tuple[Dict[str, Any], List[int], str]]:
+    """
+    Pick never-served bank items for a request without marking them served.
+
+    Returns:
+        (data, selected item IDs, bank key), or None (after scheduling a refill) if the bank
+        can't supply the request
+    """
+    bank_key = get_bank_key(chunks, feedback_context)
+    entries = [entry for entry in load_bank_items(bank_key, content_type) if entry["served_count"] == 0]
+    if exclude_questions:
+        seen = set(exclude_questions)
+        entries = [entry for entry in entries if entry["item"].get("question") not in seen]
+
+    random.shuffle(entries)
+    entries.sort(key=lambda entry: difficulty is not None and entry["difficulty"] != difficulty)
+
+    if content_type == ContentType.INTERACTIVE.value:
+        selected = _select_lesson(entries, num_items)
+    elif len(entries) >= num_items:
+        # Round-robin across chunks so items cover different parts of the document
+        by_chunk: Dict[Any, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            by_chunk.setdefault(entry["chunk_number"], []).append(entry)
+        selected = []
+        while len(selected) < num_items:
+            for chunk_entries in list(by_chunk.values()):
+                if chunk_entries and len(selected) < num_items:
+                    selected.append(chunk_entries.pop(0))
+    else:
+        selected = []
+
+    if not selected:
+        _refill_low_chunks(bank_key, content_type, chunks, feedback_context, username, file_hash)
+        return None
+
+    if content_type == ContentType.INTERACTIVE.value:
+        items = [
+            {key: value for key, value in entry["item"].items() if not key.startswith("_lesson")}
+            for entry in selected
+        ]
+        items = [dict(item, step_number=i) for i, item in enumerate(items, 1)]
+        data = {"title": selected[0]["item"].get("_lesson_title") or "Interactive Lesson", "steps": items}
+    else:
+        data = {BANK_ITEM_KEYS[content_type]: [entry["item"] for entry in selected]}
+
+    data["_source_chunks"] = chunks
+    data["_from_bank"] = True
+    return data, [entry["id"] for entry in selected], bank_key
+
+
+def _select_lesson(entries: List[Dict[str, Any]], max_steps: int) -> List[Dict[str, Any]]:
+    """
+    Steps of one whole never-served lesson with at most max_steps steps (first in entries'
+    order), in step order; [] if none is short enough
+    """
+    lessons: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        lesson_id = entry["item"].get("_lesson_id")
+        if lesson_id:
+            lessons.setdefault(lesson_id, []).append(entry)
+    steps = next((steps for steps in lessons.values() if len(steps) <= max_steps), None)
+    if steps is None:
+        return []
+    return sorted(steps, key=lambda entry: (entry["item"].get("step_number") or 0, entry["chunk_number"] or 0))
+
+
+def sample_from_bank(
+    chunks: List[str],
+    content_type: str,
+    num_items: int,
+    difficulty: Optional[str] = None,
+    exclude_questions: Optional[List[str]] = None,
+    feedback_context: Optional[Dict[str, Any]] = None,
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Sample generated content from the question bank that matches the user's feedback context.
+
+    Only never-served items are handed out, spread round-robin across chunks with items of
+    the preferred difficulty first; interactive content is one whole banked lesson of at most
+    num_items steps. When the bank runs low it is refilled in the background and None is returned, so the caller
+    generates fresh content.
+
+    Args:
+        chunks: Document chunks
+        content_type: "quiz", "flashcard" or "interactive"
+        num_items: Number of items to sample (interactive: maximum lesson steps; lessons are served whole)
+        difficulty: Preferred difficulty ("easy", "medium" or "hard")
+        exclude_questions: Quiz questions the user has already seen
+        feedback_context: Feedback context of the request (selects the bank)
+        username: User refills are recorded for
+        file_hash: File refills are recorded for
+
+    Returns:
+        Data in the same layout the LLM agent returns, or None if the bank can't supply num_items
+    """
+    bundle = sample_bundle_from_bank(
+        chunks,
+        {content_type: {
+            "num_items": num_items,
+            "difficulty": difficulty,
+            "exclude_questions": exclude_questions,
+            "feedback_context": feedback_context
+        }},
+        username,
+        file_hash
+    )
+    return bundle[content_type] if bundle else None
+
+
+def sample_bundle_from_bank(
+    chunks: List[str],
+    requests: Dict[str, Dict[str, Any]],
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Sample several content types at once; items are only marked served if every type can be served.
+
+    The chosen items are claimed atomically, so concurrent requests (e.g. a class generating
+    from the same handout) never get the same items; a sample that loses the race is
+    re-selected, and after BANK_CLAIM_ATTEMPTS the caller generates fresh content instead.
+
+    Args:
+        chunks: Document chunks
+        requests: Content type -> sample_from_bank arguments ("num_items", "difficulty",
+            "exclude_questions", "feedback_context")
+        username: User refills are recorded for
+        file_hash: File refills are recorded for
+
+    Returns:
+        Content type -> data, or None if the bank can't serve all of them
+    """
+    if not chunks or not is_question_bank_enabled() or not requests:
+        return None
+    if any(content_type not in BANK_ITEM_KEYS or not request.get("num_items") for content_type, request in requests.items()):
+        return None
+
+    for attempt in range(BANK_CLAIM_ATTEMPTS):
+        selections = {}
+        for content_type, request in requests.items():
+            selection = _select_from_bank(
+                chunks,
+                content_type,
+                request["num_items"],
+                request.get("difficulty"),
+                request.get("exclude_questions"),
+                request.get("feedback_context"),
+                username,
+                file_hash
+            )
+            if selection is None:
+                return None
+            selections[content_type] = selection
+        if claim_bank_items([item_id for _, item_ids, _ in selections.values() for item_id in item_ids]):
+            break
+        logger.get_logger().info(f"Question bank items were served to another request, re-selecting (attempt {attempt + 1})")
+    else:
+        return None
+
+    bundle = {}
+    for content_type, (data, item_ids, bank_key) in selections.items():
+        request = requests[content_type]
+        _refill_low_chunks(bank_key, content_type, chunks, request.get("feedback_context"), username, file_hash)
+        logger.get_logger().info(f"Sampled {len(item_ids)} {content_type} items from the question bank")
+        bundle[content_type] = data
+    return bundle
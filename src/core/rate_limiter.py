@@ -0,0 +1,316 @@
+"""Process-wide rate limiter for OpenAI calls (requests/min, tokens/min, concurrency)"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .config import get_float_setting, get_int_setting
+from .logger import logger
+
+
+# Request priorities: interactive requests (a user is waiting) are always served before prefetch
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_PREFETCH = "prefetch"
+PRIORITY_LEVELS = {
+    PRIORITY_INTERACTIVE: 0,
+    PRIORITY_PREFETCH: 1,
+}
+
+# AIMD: halve the allowed rate on a 429, recover slowly on every success
+RATE_DECREASE_FACTOR = 0.5
+RATE_INCREASE_STEP = 0.05
+MIN_RATE_FACTOR = 0.1
+
+# Backoff used when a 429 carries no Retry-After header
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+
+# Upper bound for a single condition wait, so waiters re-check the buckets regularly
+MAX_POLL_SECONDS = 1.0
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request waited longer than the queue timeout for a rate limit slot"""
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an exception is an HTTP 429 from the API"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Read the Retry-After delay (seconds) from a 429 error, if the server sent one"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def get_total_tokens(response: Any) -> Optional[int]:
+    """Total tokens reported in a completion response's usage, if any"""
+    usage = getattr(response, "usage", None)
+    total = getattr(usage, "total_tokens", None)
+    return int(total) if total is not None else None
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter shared by every OpenAI call in the process.
+
+    Two buckets (requests/min and tokens/min) refill continuously; a request is
+    admitted once both hold enough capacity and fewer than max_concurrency calls
+    are in flight. Waiters are served strictly by (priority, arrival order), so
+    prefetch work never delays a user who is waiting. On a 429 the allowed rate
+    is cut multiplicatively and new requests pause for Retry-After; each success
+    raises it again additively (AIMD).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        max_retries: int = 3,
+        queue_timeout: Optional[float] = None
+    ):
+        self.logger = logger.get_logger()
+        self.requests_per_minute = float(max(1, requests_per_minute))
+        self.tokens_per_minute = float(max(1, tokens_per_minute))
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._request_level = self.requests_per_minute
+        self._token_level = self.tokens_per_minute
+        self._last_refill = time.monotonic()
+        self._rate_factor = 1.0
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._waiting = []  # Heap of (priority level, arrival sequence)
+        self._sequence = itertools.count()
+
+        self._stats = {
+            "requests": 0,
+            "rate_limited": 0,
+            "timeouts": 0,
+            "total_wait_seconds": 0.0,
+        }
+
+    def _refill(self, now: float) -> None:
+        """Add capacity for the time elapsed since the last refill"""
+        elapsed = max(0.0, now - self._last_refill)
+        self._last_refill = now
+        request_capacity = self.requests_per_minute * self._rate_factor
+        token_capacity = self.tokens_per_minute * self._rate_factor
+        self._request_level = min(request_capacity, self._request_level + elapsed * request_capacity / 60.0)
+        self._token_level = min(token_capacity, self._token_level + elapsed * token_capacity / 60.0)
+
+    def _wait_time(self, ticket, estimated_tokens: int, now: float) -> float:
+        """Seconds until ticket can be admitted (0 if it can go now)"""
+        if self._waiting[0] != ticket or self._in_flight >= self.max_concurrency:
+            # Woken up by notify_all when the queue head or concurrency changes
+            return MAX_POLL_SECONDS
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        wait = 0.0
+        request_rate = self.requests_per_minute * self._rate_factor / 60.0
+        if self._request_level < 1.0:
+            wait = max(wait, (1.0 - self._request_level) / request_rate)
+
+        # A request larger than the whole bucket only needs a full bucket
+        token_rate = self.tokens_per_minute * self._rate_factor / 60.0
+        needed_tokens = min(float(estimated_tokens), self.tokens_per_minute * self._rate_factor)
+        if self._token_level < needed_tokens:
+            wait = max(wait, (needed_tokens - self._token_level) / token_rate)
+        return wait
+
+    def acquire(self, estimated_tokens: int = 0, priority: str = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> None:
+        """
+        Block until a request may be sent.
+
+        Args:
+            estimated_tokens: Expected prompt + completion tokens of the request
+            priority: PRIORITY_INTERACTIVE or PRIORITY_PREFETCH
+            timeout: Maximum seconds to wait (defaults to the limiter's queue timeout)
+
+        Raises:
+            RateLimitTimeout: If no slot became available within the timeout
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout if timeout else None
+        ticket = (PRIORITY_LEVELS.get(priority, 0), next(self._sequence))
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_time(ticket, estimated_tokens, now)
+                    if wait <= 0:
+                        heapq.heappop(self._waiting)
+                        self._request_level -= 1.0
+                        self._token_level -= estimated_tokens
+                        self._in_flight += 1
+                        self._stats["requests"] += 1
+                        self._stats["total_wait_seconds"] += now - start
+                        self._cond.notify_all()
+                        return
+                    if deadline is not None and now >= deadline:
+                        self._stats["timeouts"] += 1
+                        raise RateLimitTimeout(
+                            f"Waited {now - start:.1f}s for an OpenAI rate limit slot ({priority} request)"
+                        )
+                    remaining = deadline - now if deadline is not None else wait
+                    self._cond.wait(timeout=min(wait, remaining, MAX_POLL_SECONDS))
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def release(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None) -> None:
+        """
+        Mark a request as finished.
+
+        Args:
+            estimated_tokens: Tokens charged in acquire
+            actual_tokens: Tokens reported by the API; the difference is refunded or charged
+        """
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            if actual_tokens is not None:
+                self._token_level = min(
+                    self.tokens_per_minute * self._rate_factor,
+                    self._token_level + estimated_tokens - actual_tokens
+                )
+            self._cond.notify_all()
+
+    def on_rate_limited(self, retry_after: Optional[float] = None, attempt: int = 0) -> float:
+        """
+        Record a 429: cut the allowed rate and pause new requests.
+
+        Returns:
+            Pause in seconds before the next request is admitted
+        """
+        if retry_after is None:
+            retry_after = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt))
+            retry_after *= random.uniform(0.5, 1.0)  # Jitter so waiters don't retry in lockstep
+
+        with self._cond:
+            self._rate_factor = max(MIN_RATE_FACTOR, self._rate_factor * RATE_DECREASE_FACTOR)
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._request_level = min(self._request_level, 0.0)
+            self._stats["rate_limited"] += 1
+            factor = self._rate_factor
+
+        self.logger.warning(
+            f"OpenAI rate limit hit: pausing {retry_after:.1f}s, allowed rate now {factor * 100:.0f}% "
+            f"({self.requests_per_minute * factor:.0f} RPM, {self.tokens_per_minute * factor:.0f} TPM)"
+        )
+        return retry_after
+
+    def on_success(self) -> None:
+        """Record a successful call: raise the allowed rate additively"""
+        with self._cond:
+            if self._rate_factor < 1.0:
+                self._rate_factor = min(1.0, self._rate_factor + RATE_INCREASE_STEP)
+
+    def call(
+        self,
+        func: Callable[..., Any],
+        *args,
+        estimated_tokens: int = 0,
+        priority: str = PRIORITY_INTERACTIVE,
+        call_stats: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Run an API call under the limiter, retrying 429s with backoff.
+
+        Args:
+            func: API function (e.g. client.chat.completions.create)
+            estimated_tokens: Expected prompt + completion tokens
+            priority: PRIORITY_INTERACTIVE or PRIORITY_PREFETCH
+            call_stats: Optional dict that receives "retries" (number of retried attempts)
+            *args, **kwargs: Passed to func
+
+        Returns:
+            Result of func
+        """
+        for attempt in range(self.max_retries + 1):
+            if call_stats is not None:
+                call_stats["retries"] = attempt
+            self.acquire(estimated_tokens, priority)
+            actual_tokens = None
+            try:
+                response = func(*args, **kwargs)
+                actual_tokens = get_total_tokens(response)
+                self.on_success()
+                return response
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                self.on_rate_limited(get_retry_after(e), attempt)
+            finally:
+                self.release(estimated_tokens, actual_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current limiter state and counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiting),
+                "rate_factor": self._rate_factor,
+                "requests_per_minute": self.requests_per_minute * self._rate_factor,
+                "tokens_per_minute": self.tokens_per_minute * self._rate_factor,
+            })
+        return stats
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide OpenAI rate limiter (configured from settings on first use)"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                from .job_queue import get_rate_limit_share
+                
+                # Job queue workers are separate processes: each process gets its share of the limits
+                share = get_rate_limit_share()
+                queue_timeout = get_float_setting("OPENAI_QUEUE_TIMEOUT", 90.0)
+                _rate_limiter = RateLimiter(
+                    requests_per_minute=int(get_int_setting("OPENAI_RPM_LIMIT", 500) * share),
+                    tokens_per_minute=int(get_int_setting("OPENAI_TPM_LIMIT", 200000) * share),
+                    max_concurrency=int(get_int_setting("OPENAI_MAX_CONCURRENCY", 8) * share),
+                    max_retries=get_int_setting("OPENAI_RATE_LIMIT_RETRIES", 3),
+                    queue_timeout=queue_timeout if queue_timeout > 0 else None
+                )
+                logger.get_logger().info(
+                    f"OpenAI rate limiter: {_rate_limiter.requests_per_minute:.0f} RPM, "
+                    f"{_rate_limiter.tokens_per_minute:.0f} TPM, max {_rate_limiter.max_concurrency} concurrent"
+                )
+    return _rate_limiter
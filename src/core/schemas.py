@@ -0,0 +1,230 @@
+"""Typed models for generated content, with per-item validation and repair"""
+
+import re
+from typing import Any, Dict, List, Tuple
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator, model_validator
+
+from .logger import logger
+from .messages import ContentType
+
+
+DIFFICULTIES = ("easy", "medium", "hard")
+DEFAULT_DIFFICULTY = "medium"
+
+# Answer options of a multiple-choice question (what the prompt asks for and the quiz UI renders)
+QUIZ_OPTION_COUNT = 4
+
+# Option labels the model sometimes puts in front of options ("A) ...", "b. ...")
+_OPTION_LABEL = re.compile(r'^\s*\(?([A-Ha-h])[\)\.:]\s+')
+
+
+def _normalize_difficulty(value: Any) -> str:
+    """Lower-case difficulty, falling back to DEFAULT_DIFFICULTY for anything unknown"""
+    difficulty = str(value or "").strip().lower()
+    return difficulty if difficulty in DIFFICULTIES else DEFAULT_DIFFICULTY
+
+
+def _as_text(value: Any) -> str:
+    """Item fields are plain text; numbers and the like are converted, None becomes empty"""
+    return "" if value is None else str(value).strip()
+
+
+class GeneratedItem(BaseModel):
+    """Fields shared by every generated item; unknown fields are kept as-is"""
+    model_config = ConfigDict(extra="allow", str_strip_whitespace=True)
+
+    difficulty: str = DEFAULT_DIFFICULTY
+    source_reference: str = ""
+
+    @field_validator("difficulty", mode="before")
+    @classmethod
+    def _repair_difficulty(cls, value: Any) -> str:
+        return _normalize_difficulty(value)
+
+    @field_validator("source_reference", mode="before")
+    @classmethod
+    def _repair_source_reference(cls, value: Any) -> str:
+        return _as_text(value)
+
+
+class QuizQuestion(GeneratedItem):
+    """Multiple-choice question; correct_answer is an index into options"""
+    question: str
+    options: List[str]
+    correct_answer: int
+    explanation: str = ""
+
+    @model_validator(mode="before")
+    @classmethod
+    def _repair(cls, data: Any) -> Any:
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+
+        # Options as {"A": "...", "B": "..."} or with "A) " prefixes
+        options = data.get("options")
+        if isinstance(options, dict):
+            options = [options[key] for key in sorted(options)]
+        if isinstance(options, list):
+            options = [_OPTION_LABEL.sub("", _as_text(option)) for option in options]
+            data["options"] = [option for option in options if option]
+        else:
+            options = []
+
+        # correct_answer as a letter, a numeric string or the text of the correct option
+        answer = data.get("correct_answer")
+        if isinstance(answer, bool):
+            # True/False would otherwise pass as index 1/0
+            raise ValueError("correct_answer is a boolean, not an option index")
+        if isinstance(answer, str):
+            text = _OPTION_LABEL.sub("", answer.strip())
+            if re.fullmatch(r'[A-Ha-h]', text):
+                answer = ord(text.upper()) - ord("A")
+            elif text.isdigit():
+                answer = int(text)
+            elif text in options:
+                answer = options.index(text)
+        # Re-point the index at the same option after blank options were dropped
+        if isinstance(answer, int) and not isinstance(answer, bool) and 0 <= answer < len(options):
+            data["correct_answer"] = data["options"].index(options[answer]) if options[answer] else -1
+        elif answer is not None:
+            data["correct_answer"] = answer
+
+        if data.get("explanation") is not None:
+            data["explanation"] = _as_text(data["explanation"])
+        return data
+
+    @field_validator("question")
+    @classmethod
+    def _check_question(cls, value: str) -> str:
+        if not value:
+            raise ValueError("question is empty")
+        return value
+
+    @model_validator(mode="after")
+    def _check_answer(self) -> "QuizQuestion":
+        if len(self.options) != QUIZ_OPTION_COUNT:
+            raise ValueError(f"{len(self.options)} options instead of {QUIZ_OPTION_COUNT}")
+        if len(set(self.options)) != len(self.options):
+            raise ValueError("duplicate options")
+        if not 0 <= self.correct_answer < len(self.options):
+            raise ValueError(f"correct_answer {self.correct_answer} is not an option index")
+        return self
+
+
+class Flashcard(GeneratedItem):
+    """Flashcard with a front (question/term) and back (answer/definition)"""
+    front: str
+    back: str
+
+    @model_validator(mode="before")
+    @classmethod
+    def _repair(cls, data: Any) -> Any:
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+        for field, aliases in (("front", ("question", "term")), ("back", ("answer", "definition"))):
+            if not _as_text(data.get(field)):
+                data[field] = next((_as_text(data[alias]) for alias in aliases if _as_text(data.get(alias))), "")
+            else:
+                data[field] = _as_text(data[field])
+        return data
+
+    @model_validator(mode="after")
+    def _check_sides(self) -> "Flashcard":
+        if not self.front or not self.back:
+            raise ValueError("card has an empty side")
+        return self
+
+
+class InteractiveStep(GeneratedItem):
+    """One step of an interactive lesson"""
+    step_number: int = 0
+    title: str = ""
+    content: str
+    checkpoint: str = ""
+    checkpoint_answer: str = ""
+
+    @model_validator(mode="before")
+    @classmethod
+    def _repair(cls, data: Any) -> Any:
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+        for field in ("title", "content", "checkpoint", "checkpoint_answer"):
+            if field in data:
+                data[field] = _as_text(data[field])
+        try:
+            data["step_number"] = int(data.get("step_number") or 0)
+        except (TypeError, ValueError):
+            data["step_number"] = 0
+        return data
+
+    @field_validator("content")
+    @classmethod
+    def _check_content(cls, value: str) -> str:
+        if not value:
+            raise ValueError("step content is empty")
+        return value
+
+
+# Item model and item list key of each content type's payload
+ITEM_SCHEMAS = {
+    ContentType.QUIZ: (QuizQuestion, "questions"),
+    ContentType.FLASHCARD: (Flashcard, "cards"),
+    ContentType.INTERACTIVE: (InteractiveStep, "steps"),
+}
+
+
+def validate_items(content_type: ContentType, items: Any) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Validate and repair generated items one by one.
+
+    Args:
+        content_type: QUIZ, FLASHCARD or INTERACTIVE
+        items: Item list from the model's JSON
+
+    Returns:
+        (valid items as dicts, one error message per dropped item)
+    """
+    model, _ = ITEM_SCHEMAS[content_type]
+    valid, errors = [], []
+    for position, item in enumerate(items if isinstance(items, list) else []):
+        try:
+            valid.append(model.model_validate(item).model_dump())
+        except ValidationError as e:
+            reasons = "; ".join(error["msg"] for error in e.errors())
+            errors.append(f"item {position + 1}: {reasons}")
+
+    if content_type == ContentType.INTERACTIVE:
+        # Keep steps numbered 1..n after dropping invalid ones
+        for step_number, step in enumerate(valid, 1):
+            step["step_number"] = step_number
+    return valid, errors
+
+
+def validate_content(content_type: ContentType, data: Any) -> Dict[str, Any]:
+    """
+    Validate and repair a generated payload, dropping only the items that can't be repaired.
+
+    Args:
+        content_type: QUIZ, FLASHCARD or INTERACTIVE
+        data: Parsed JSON returned by the model
+
+    Returns:
+        Payload with the same layout and only valid items (other top-level keys are kept)
+    """
+    _, items_key = ITEM_SCHEMAS[content_type]
+    data = dict(data) if isinstance(data, dict) else {}
+    items, errors = validate_items(content_type, data.get(items_key))
+    data[items_key] = items
+
+    if content_type == ContentType.INTERACTIVE:
+        data["title"] = _as_text(data.get("title")) or "Interactive Lesson"
+
+    if errors:
+        logger.get_logger().warning(
+            f"Dropped {len(errors)} invalid {content_type.value} items: {' | '.join(errors[:5])}"
+        )
+    return data
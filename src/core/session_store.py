@@ -0,0 +1,247 @@
+"""Bounded store for per-session extraction context (chunks and summary)"""
+
+import hashlib
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import get_setting, get_float_setting, get_int_setting
+from .logger import logger
+
+
+# Remembered upload copies per resident session (sources outlive evicted sessions for rehydration)
+SOURCES_PER_SESSION = 4
+
+
+def get_upload_dir() -> Path:
+    """Directory for persisted upload copies (UPLOAD_DIR overrides the default location)"""
+    configured_path = get_setting("UPLOAD_DIR")
+    upload_dir = Path(configured_path) if configured_path else Path(__file__).parent.parent.parent / "data" / "uploads"
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    return upload_dir
+
+
+def persist_upload(file_path: str, file_type: Optional[str] = None) -> Optional[str]:
+    """
+    Keep a copy of an uploaded file so its chunks can be re-extracted later.
+
+    Copies are named by content hash, so the same upload is stored once.
+
+    Args:
+        file_path: Path of the (temporary) uploaded file
+        file_type: File extension without the dot
+
+    Returns:
+        Path of the persisted copy, or None if it could not be written
+    """
+    try:
+        hasher = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(block)
+        suffix = f".{file_type}" if file_type else Path(file_path).suffix
+        target = get_upload_dir() / f"{hasher.hexdigest()}{suffix}"
+        if not target.exists():
+            shutil.copyfile(file_path, target)
+        return str(target)
+    except Exception as e:
+        logger.get_logger().warning(f"Could not persist upload {file_path}: {e}")
+        return None
+
+
+def estimate_size(chunks: List[str], summary: Optional[str]) -> int:
+    """Approximate resident bytes of a session's chunks and summary"""
+    return sum(sys.getsizeof(chunk) for chunk in chunks) + sys.getsizeof(summary or "")
+
+
+class SessionStore:
+    """
+    LRU store of session context with idle-TTL eviction and a total-bytes cap.
+
+    Each session holds its chunk list and summary. Sessions are evicted least
+    recently used first when there are more than max_sessions, when the resident
+    size exceeds max_bytes, or after idle_ttl seconds without access. The source
+    of each session (a persisted copy of the upload) is remembered separately, so
+    an evicted session is rehydrated by re-extracting it on its next access.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 200,
+        max_bytes: int = 256 * 1024 * 1024,
+        idle_ttl: float = 3600.0,
+        rehydrate: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None
+    ):
+        self.logger = logger.get_logger()
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.rehydrate = rehydrate
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sources: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._resident_bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "rehydrated": 0,
+            "evicted_lru": 0,
+            "evicted_bytes": 0,
+            "evicted_idle": 0,
+        }
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        """Drop a resident session, keeping its source (lock held)"""
+        entry = self._sessions.pop(session_id)
+        self._resident_bytes -= entry["size"]
+        self.stats[f"evicted_{reason}"] += 1
+        self.logger.info(f"Evicted session {session_id} ({reason}, {entry['size']} bytes)")
+
+    def _enforce_limits(self, now: float) -> None:
+        """Evict idle sessions, then least recently used ones until within limits (lock held)"""
+        if self.idle_ttl > 0:
+            for session_id, entry in list(self._sessions.items()):
+                if now - entry["last_access"] > self.idle_ttl:
+                    self._evict(session_id, "idle")
+
+        while len(self._sessions) > self.max_sessions:
+            self._evict(next(iter(self._sessions)), "lru")
+        # The most recent session stays even if it alone exceeds the cap
+        while self._resident_bytes > self.max_bytes and len(self._sessions) > 1:
+            self._evict(next(iter(self._sessions)), "bytes")
+
+        # Forget the oldest sources and delete upload copies no remaining source refers to
+        max_sources = self.max_sessions * SOURCES_PER_SESSION
+        while len(self._sources) > max_sources:
+            _, source = self._sources.popitem(last=False)
+            path = source.get("file_path")
+            if path and not any(other.get("file_path") == path for other in self._sources.values()):
+                Path(path).unlink(missing_ok=True)
+
+    def put(
+        self,
+        session_id: str,
+        chunks: List[str],
+        summary: Optional[str] = None,
+        source: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Store a session's context.
+
+        Args:
+            session_id: Session identifier
+            chunks: Extracted chunks
+            summary: Extraction summary
+            source: How to re-extract the chunks ({"file_path": ..., "file_type": ...})
+        """
+        now = time.time()
+        size = estimate_size(chunks, summary)
+        with self._lock:
+            previous = self._sessions.pop(session_id, None)
+            if previous is not None:
+                self._resident_bytes -= previous["size"]
+            self._sessions[session_id] = {
+                "chunks": chunks,
+                "summary": summary,
+                "size": size,
+                "last_access": now,
+            }
+            self._resident_bytes += size
+            if source:
+                self._sources[session_id] = source
+                self._sources.move_to_end(session_id)
+            self._enforce_limits(now)
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """
+        Get a session's context, re-extracting it from its persisted upload if it was evicted.
+
+        Returns:
+            {"chunks": [...], "summary": ...}, or {} if the session is unknown
+        """
+        now = time.time()
+        with self._lock:
+            self._enforce_limits(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry["last_access"] = now
+                self._sessions.move_to_end(session_id)
+                self.stats["hits"] += 1
+                return {"chunks": entry["chunks"], "summary": entry["summary"]}
+            self.stats["misses"] += 1
+            source = self._sources.get(session_id)
+
+        if source is None or self.rehydrate is None:
+            return {}
+
+        # Re-extract outside the lock; extraction can take seconds
+        restored = self.rehydrate(source)
+        if not restored or not restored.get("chunks"):
+            self.logger.warning(f"Could not rehydrate session {session_id} from {source.get('file_path')}")
+            return {}
+        self.put(session_id, restored["chunks"], restored.get("summary"), source)
+        with self._lock:
+            self.stats["rehydrated"] += 1
+        self.logger.info(f"Rehydrated session {session_id} ({len(restored['chunks'])} chunks)")
+        return {"chunks": restored["chunks"], "summary": restored.get("summary")}
+
+    def discard(self, session_id: str) -> None:
+        """Forget a session and its source"""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._resident_bytes -= entry["size"]
+            self._sources.pop(session_id, None)
+
+    def session_ids(self) -> List[str]:
+        """Resident session ids, least recently used first"""
+        with self._lock:
+            return list(self._sessions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus current resident size"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                "sessions": len(self._sessions),
+                "sources": len(self._sources),
+                "resident_bytes": self._resident_bytes,
+                "max_bytes": self.max_bytes,
+            })
+        return stats
+
+
+def _extract_source(source: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Re-extract chunks from a persisted upload"""
+    from ..agents.nlp_agent import NLPAgent
+    from .messages import ExtractionRequest
+
+    if not source.get("file_path") or not Path(source["file_path"]).exists():
+        return None
+    response = NLPAgent().extract(ExtractionRequest(file_path=source["file_path"], file_type=source.get("file_type") or "pdf"))
+    if not response.success:
+        return None
+    return {"chunks": response.chunks, "summary": response.summary}
+
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Get the process-wide session store (configured from settings on first use)"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore(
+                    max_sessions=get_int_setting("SESSION_STORE_MAX_SESSIONS", 200),
+                    max_bytes=get_int_setting("SESSION_STORE_MAX_MB", 256) * 1024 * 1024,
+                    idle_ttl=get_float_setting("SESSION_STORE_IDLE_TTL_SECONDS", 3600.0),
+                    rehydrate=_extract_source
+                )
+    return _session_store
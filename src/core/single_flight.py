@@ -0,0 +1,85 @@
+"""Single-flight coalescing: concurrent calls with the same key share one execution"""
+
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from .logger import logger
+
+
+class _Call:
+    """One in-flight execution and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent work by key.
+
+    The first caller for a key (the leader) runs the function; callers that arrive
+    while it is running wait for it and receive a deep copy of its result (or its
+    exception). Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self.logger = logger.get_logger()
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run func once for all concurrent callers with the same key.
+
+        Args:
+            key: Identity of the work
+            func: Zero-argument function producing the result
+
+        Returns:
+            (result, shared) - shared is True if the result came from another caller's execution
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["leaders"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Copy so callers can't modify each other's results
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+            if call.waiters:
+                self.logger.info(f"Shared one in-flight result with {call.waiters} coalesced request(s)")
+
+        if call.waiters:
+            # Waiters copy call.result, so the leader gets its own copy as well
+            return copy.deepcopy(call.result), False
+        return call.result, False
+
+    def in_flight(self) -> int:
+        """Number of keys currently executing"""
+        with self._lock:
+            return len(self._calls)
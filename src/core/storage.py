@@ -0,0 +1,412 @@
+"""Storage backends for RL state and users, with health-aware routing and circuit breakers"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import get_float_setting, get_int_setting, get_setting
+from .logger import logger
+
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+
+# Values of STORAGE_PRIMARY; "json" keeps everything in local files
+STORAGE_PRIMARIES = ("supabase", "sqlite", "json")
+
+
+class CircuitBreaker:
+    """
+    Per-backend circuit breaker.
+
+    After failure_threshold consecutive failures the breaker opens and the router
+    skips the backend without calling it. While open, a background thread calls
+    probe() every probe_interval seconds and closes the breaker on the first success,
+    so requests never pay for finding out that a backend is back.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        probe: Callable[[], bool],
+        failure_threshold: int = 3,
+        probe_interval: float = 30.0
+    ):
+        self.logger = logger.get_logger()
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._state = BREAKER_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._prober: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether requests may be sent to the backend"""
+        return self._state == BREAKER_CLOSED
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+
+    def record_failure(self, error: Exception) -> None:
+        """Count a failure; open the breaker and start probing once the threshold is reached"""
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == BREAKER_OPEN or self._consecutive_failures < self.failure_threshold:
+                return
+            self._state = BREAKER_OPEN
+            self._opened_at = time.time()
+            self._prober = threading.Thread(target=self._run_prober, name=f"storage_probe_{self.name}", daemon=True)
+            self._prober.start()
+        self.logger.warning(
+            f"Storage backend {self.name} disabled after {self._consecutive_failures} failures "
+            f"({error}); probing every {self.probe_interval:.0f}s"
+        )
+
+    def _run_prober(self) -> None:
+        """Probe the backend until it answers, then close the breaker"""
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                healthy = self.probe()
+            except Exception as e:
+                self.logger.debug(f"Storage backend {self.name} probe failed: {e}")
+                healthy = False
+            if healthy:
+                with self._lock:
+                    downtime = time.time() - (self._opened_at or time.time())
+                    self._state = BREAKER_CLOSED
+                    self._consecutive_failures = 0
+                    self._opened_at = None
+                    self._prober = None
+                self.logger.info(f"Storage backend {self.name} is back after {downtime:.0f}s")
+                return
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "open_seconds": time.time() - self._opened_at if self._opened_at else 0.0,
+            }
+
+
+class StorageBackend:
+    """
+    A place RL state (and optionally users) can be stored.
+
+    Methods raise on errors instead of returning a failure value, so the router can
+    tell "not found" (None / {}) apart from "backend down".
+    """
+
+    name = "backend"
+    supports_users = False
+
+    def is_configured(self) -> bool:
+        """Whether the backend can be used at all in this deployment"""
+        return True
+
+    def ping(self) -> bool:
+        """Cheap health check used by the circuit breaker's probe"""
+        raise NotImplementedError
+
+    def load_state(self, username: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def save_state(self, username: str, data: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def save_states(self, states: Dict[str, Dict[str, Any]]) -> bool:
+        """Save several users' states; backends with a batched write override this"""
+        return all([self.save_state(username, data) for username, data in states.items()])
+
+    def save_state_delta(self, username: str, delta: Dict[str, Any]) -> bool:
+        """Apply a state delta (see memory.StateChanges.to_delta); False if the user has no stored row"""
+        return False
+
+    def load_users(self) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    def save_user(self, username: str, password_hash: str, email: str = "") -> bool:
+        raise NotImplementedError
+
+
+class SupabaseBackend(StorageBackend):
+    """Supabase tables (rl_state, users)"""
+
+    name = "supabase"
+    supports_users = True
+
+    def is_configured(self) -> bool:
+        from .supabase_client import get_supabase_client
+        return get_supabase_client() is not None
+
+    def ping(self) -> bool:
+        from .supabase_client import get_supabase_client
+        client = get_supabase_client()
+        if client is None:
+            return False
+        client.table("rl_state").select("username").limit(1).execute()
+        return True
+
+    def load_state(self, username: str) -> Optional[Dict[str, Any]]:
+        from .supabase_client import load_rl_state_supabase
+        return load_rl_state_supabase(username, raise_errors=True)
+
+    def save_state(self, username: str, data: Dict[str, Any]) -> bool:
+        from .supabase_client import save_rl_state_supabase
+        return save_rl_state_supabase(username, data, raise_errors=True)
+
+    def save_states(self, states: Dict[str, Dict[str, Any]]) -> bool:
+        from .supabase_client import save_rl_states_supabase
+        return save_rl_states_supabase(states, raise_errors=True)
+
+    def save_state_delta(self, username: str, delta: Dict[str, Any]) -> bool:
+        from .supabase_client import apply_rl_state_delta_supabase
+        return apply_rl_state_delta_supabase(username, delta, raise_errors=True)
+
+    def load_users(self) -> Dict[str, Dict[str, Any]]:
+        from .supabase_client import get_all_users_supabase
+        return get_all_users_supabase(raise_errors=True)
+
+    def save_user(self, username: str, password_hash: str, email: str = "") -> bool:
+        from .supabase_client import save_user_supabase
+        return save_user_supabase(username, password_hash, email, raise_errors=True)
+
+
+class SQLiteBackend(StorageBackend):
+    """Local SQLite database (RL state only; users stay in users.json, which keeps their email)"""
+
+    name = "sqlite"
+
+    def ping(self) -> bool:
+        from .database import get_db_connection
+        with get_db_connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+        return True
+
+    def load_state(self, username: str) -> Optional[Dict[str, Any]]:
+        from .database import load_rl_state
+        return load_rl_state(username, raise_errors=True)
+
+    def save_state(self, username: str, data: Dict[str, Any]) -> bool:
+        from .database import save_rl_state
+        return save_rl_state(username, data, raise_errors=True)
+
+    def save_states(self, states: Dict[str, Dict[str, Any]]) -> bool:
+        from .database import save_rl_states
+        return save_rl_states(states, raise_errors=True)
+
+    def save_state_delta(self, username: str, delta: Dict[str, Any]) -> bool:
+        from .database import apply_rl_state_delta
+        return apply_rl_state_delta(username, delta, raise_errors=True)
+
+
+class StorageRouter:
+    """
+    Routes storage operations to an ordered list of backends.
+
+    The configured primary goes first, then the others as fallbacks. Backends that
+    aren't configured or whose circuit breaker is open are skipped without a call,
+    so an unreachable backend costs one threshold's worth of failures and then
+    nothing until its background probe succeeds. Every call is timed per backend.
+
+    The router remembers which backend holds each user's state (the one it was last
+    loaded from or saved to). Deltas only go to that backend; if it is unavailable
+    the caller writes the full state instead, so a backend that missed writes is
+    never patched on top of stale data.
+    """
+
+    def __init__(
+        self,
+        backends: List[StorageBackend],
+        failure_threshold: int = 3,
+        probe_interval: float = 30.0
+    ):
+        self.logger = logger.get_logger()
+        self.backends = backends
+        self.breakers = {
+            backend.name: CircuitBreaker(backend.name, backend.ping, failure_threshold, probe_interval)
+            for backend in backends
+        }
+        self._configured: Dict[str, bool] = {}
+        self._owners: Dict[str, str] = {}  # username -> backend holding the user's state
+        self._lock = threading.Lock()
+        self._metrics = {
+            backend.name: {"calls": 0, "failures": 0, "skipped": 0, "total_ms": 0.0, "max_ms": 0.0}
+            for backend in backends
+        }
+
+    def _is_configured(self, backend: StorageBackend) -> bool:
+        """Check (once) whether a backend is configured"""
+        if backend.name not in self._configured:
+            try:
+                self._configured[backend.name] = backend.is_configured()
+            except Exception as e:
+                self.logger.warning(f"Storage backend {backend.name} is not usable: {e}")
+                self._configured[backend.name] = False
+        return self._configured[backend.name]
+
+    def _record(self, name: str, elapsed_ms: float, failed: bool) -> None:
+        with self._lock:
+            metrics = self._metrics[name]
+            metrics["calls"] += 1
+            metrics["total_ms"] += elapsed_ms
+            metrics["max_ms"] = max(metrics["max_ms"], elapsed_ms)
+            if failed:
+                metrics["failures"] += 1
+
+    def _available(self, users: bool = False) -> List[StorageBackend]:
+        """Backends to try in order, counting skips of open breakers"""
+        available = []
+        for backend in self.backends:
+            if (users and not backend.supports_users) or not self._is_configured(backend):
+                continue
+            if not self.breakers[backend.name].allow():
+                with self._lock:
+                    self._metrics[backend.name]["skipped"] += 1
+                continue
+            available.append(backend)
+        return available
+
+    def _call(self, backend: StorageBackend, operation: str, *args) -> Any:
+        """Run one backend operation, timing it and feeding its breaker; re-raises failures"""
+        breaker = self.breakers[backend.name]
+        start = time.perf_counter()
+        try:
+            result = getattr(backend, operation)(*args)
+        except Exception as e:
+            self._record(backend.name, (time.perf_counter() - start) * 1000, failed=True)
+            breaker.record_failure(e)
+            raise
+        self._record(backend.name, (time.perf_counter() - start) * 1000, failed=False)
+        breaker.record_success()
+        return result
+
+    def _first(self, operation: str, *args, users: bool = False) -> Tuple[Optional[StorageBackend], Any]:
+        """Return (backend, result) for the first truthy result of operation, or (None, None)"""
+        for backend in self._available(users):
+            try:
+                result = self._call(backend, operation, *args)
+            except Exception as e:
+                self.logger.debug(f"Storage backend {backend.name} failed {operation}: {e}")
+                continue
+            if result:
+                return backend, result
+        return None, None
+
+    def _set_owner(self, username: str, backend: Optional[StorageBackend]) -> None:
+        with self._lock:
+            if backend is None:
+                self._owners.pop(username, None)
+            else:
+                self._owners[username] = backend.name
+
+    def forget_owner(self, username: str) -> None:
+        """The user's state was written elsewhere (e.g. a local file); the next write must be full"""
+        self._set_owner(username, None)
+
+    def load_state(self, username: str) -> Optional[Dict[str, Any]]:
+        """RL state from the first backend that has it, or None"""
+        backend, state = self._first("load_state", username)
+        self._set_owner(username, backend)
+        return state
+
+    def save_state(self, username: str, data: Dict[str, Any]) -> bool:
+        """Save the whole RL state to the first healthy backend; False if none took it"""
+        backend, saved = self._first("save_state", username, data)
+        self._set_owner(username, backend)
+        return bool(saved)
+
+    def save_states(self, states: Dict[str, Dict[str, Any]]) -> bool:
+        """Save several users' whole states in one batch to the first healthy backend; False if none took it"""
+        backend, saved = self._first("save_states", states)
+        for username in states:
+            self._set_owner(username, backend)
+        return bool(saved)
+
+    def save_state_delta(self, username: str, delta: Dict[str, Any]) -> bool:
+        """
+        Apply a state delta on the backend holding the user's state.
+
+        Returns:
+            True if applied; False if the caller must write the full state instead
+        """
+        with self._lock:
+            owner = self._owners.get(username)
+        backend = next((backend for backend in self._available() if backend.name == owner), None)
+        if backend is None:
+            return False
+        try:
+            applied = self._call(backend, "save_state_delta", username, delta)
+        except Exception as e:
+            self.logger.debug(f"Storage backend {backend.name} failed save_state_delta: {e}")
+            applied = False
+        if not applied:
+            self._set_owner(username, None)
+        return bool(applied)
+
+    def load_users(self) -> Dict[str, Dict[str, Any]]:
+        """Users from the first user backend that has any, or {}"""
+        return self._first("load_users", users=True)[1] or {}
+
+    def save_user(self, username: str, password_hash: str, email: str = "") -> bool:
+        """Save a user to the first healthy user backend; False if none took it"""
+        return bool(self._first("save_user", username, password_hash, email, users=True)[1])
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-backend call counts, failures, skips, latency and breaker state"""
+        stats = {}
+        with self._lock:
+            for backend in self.backends:
+                metrics = dict(self._metrics[backend.name])
+                total_ms = metrics.pop("total_ms")
+                metrics["avg_ms"] = total_ms / metrics["calls"] if metrics["calls"] else 0.0
+                metrics["configured"] = self._configured.get(backend.name)
+                stats[backend.name] = metrics
+        for name, breaker in self.breakers.items():
+            breaker_stats = breaker.get_stats()
+            stats[name]["breaker"] = breaker_stats["state"]
+            stats[name]["consecutive_failures"] = breaker_stats["consecutive_failures"]
+        return stats
+
+
+_storage: Optional[StorageRouter] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageRouter:
+    """
+    Get the process-wide storage router.
+
+    STORAGE_PRIMARY picks the primary backend ("supabase", "sqlite" or "json");
+    the remaining database backends are fallbacks, and "json" uses local files only.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                primary = (get_setting("STORAGE_PRIMARY", "supabase") or "supabase").lower()
+                if primary not in STORAGE_PRIMARIES:
+                    logger.get_logger().warning(f"Unknown STORAGE_PRIMARY {primary!r}, using supabase")
+                    primary = "supabase"
+                backends: List[StorageBackend] = []
+                if primary != "json":
+                    backends = [SupabaseBackend(), SQLiteBackend()]
+                    backends.sort(key=lambda backend: backend.name != primary)
+                _storage = StorageRouter(
+                    backends,
+                    failure_threshold=get_int_setting("STORAGE_FAILURE_THRESHOLD", 3),
+                    probe_interval=get_float_setting("STORAGE_PROBE_INTERVAL_SECONDS", 30.0)
+                )
+                logger.get_logger().info(
+                    f"Storage backends: {', '.join(backend.name for backend in backends) or 'none'} (then JSON files)"
+                )
+    return _storage
@@ -0,0 +1,192 @@
+"""
+Token usage and cost accounting for LLM calls.
+
+A call shared by several identical concurrent requests (single-flight) is charged in full
+to the request that made it. Every request that joined it gets a coalesced row without
+tokens or cost, so per-user reports show those requests without counting the call twice.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .database import get_db_connection
+from .logger import logger
+
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+}
+DEFAULT_MODEL_PRICE = MODEL_PRICES["gpt-4o-mini"]
+
+# Columns usage can be grouped by
+USAGE_GROUP_COLUMNS = ("username", "file_hash", "content_type", "model", "priority")
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of a call"""
+    input_price, cached_price, output_price = MODEL_PRICES.get(model, DEFAULT_MODEL_PRICE)
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+def get_response_usage(response: Any) -> Dict[str, int]:
+    """Prompt, cached and completion tokens reported by a completion response"""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+
+def record_usage(
+    model: str,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0,
+    latency_ms: float = 0.0,
+    retries: int = 0,
+    success: bool = True,
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None,
+    content_type: Optional[str] = None,
+    priority: Optional[str] = None,
+    coalesced: bool = False
+) -> bool:
+    """
+    Record one LLM call.
+
+    Args:
+        model: Model name
+        prompt_tokens: Prompt tokens (including cached)
+        completion_tokens: Completion tokens
+        cached_tokens: Prompt tokens served from the provider's prompt cache
+        latency_ms: Wall time of the call including rate limiter waits and retries
+        retries: Number of retried attempts (429s)
+        success: Whether the call returned a response
+        username: User the call was made for
+        file_hash: File the content was generated from
+        content_type: "quiz", "flashcard", "interactive", "mixed" or "reasoning"
+        priority: Rate limiter priority ("interactive" or "prefetch")
+        coalesced: The request reused another request's in-flight call (no tokens of its own)
+
+    Returns:
+        True if recorded
+    """
+    try:
+        cost = estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens)
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO llm_usage (
+                    created_at, username, file_hash, content_type, priority, model, prompt_tokens,
+                    cached_tokens, completion_tokens, latency_ms, retries, success, cost_usd, coalesced
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                datetime.now().isoformat(), username, file_hash, content_type, priority, model, prompt_tokens,
+                cached_tokens, completion_tokens, latency_ms, retries, 1 if success else 0, cost, 1 if coalesced else 0
+            ))
+        return True
+    except Exception as e:
+        logger.get_logger().error(f"Error recording LLM usage: {e}")
+        return False
+
+
+def get_usage_summary(
+    group_by: str = "content_type",
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None,
+    since: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate LLM usage.
+
+    Args:
+        group_by: One of USAGE_GROUP_COLUMNS
+        username: Only calls made for this user
+        file_hash: Only calls for this file
+        since: Only calls at or after this ISO timestamp
+
+    Returns:
+        One dict per group (calls, coalesced requests, tokens, cost, call latency, retries,
+        failures), most expensive first
+    """
+    if group_by not in USAGE_GROUP_COLUMNS:
+        raise ValueError(f"Unknown usage grouping: {group_by}")
+
+    conditions = []
+    args: List[Any] = []
+    if username is not None:
+        conditions.append("username = ?")
+        args.append(username)
+    if file_hash is not None:
+        conditions.append("file_hash = ?")
+        args.append(file_hash)
+    if since is not None:
+        conditions.append("created_at >= ?")
+        args.append(since)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {group_by} AS grp,
+                       SUM(1 - coalesced) AS calls,
+                       SUM(coalesced) AS coalesced,
+                       SUM(prompt_tokens) AS prompt_tokens,
+                       SUM(cached_tokens) AS cached_tokens,
+                       SUM(completion_tokens) AS completion_tokens,
+                       SUM(cost_usd) AS cost_usd,
+                       AVG(CASE WHEN coalesced = 0 THEN latency_ms END) AS avg_latency_ms,
+                       MAX(CASE WHEN coalesced = 0 THEN latency_ms END) AS max_latency_ms,
+                       SUM(retries) AS retries,
+                       SUM(CASE WHEN coalesced = 0 THEN 1 - success ELSE 0 END) AS failures
+                FROM llm_usage
+                {where}
+                GROUP BY {group_by}
+                ORDER BY cost_usd DESC
+            """, args)
+            return [
+                {
+                    group_by: row["grp"],
+                    "calls": row["calls"] or 0,
+                    "coalesced": row["coalesced"] or 0,
+                    "prompt_tokens": row["prompt_tokens"] or 0,
+                    "cached_tokens": row["cached_tokens"] or 0,
+                    "completion_tokens": row["completion_tokens"] or 0,
+                    "cost_usd": row["cost_usd"] or 0.0,
+                    "avg_latency_ms": row["avg_latency_ms"] or 0.0,
+                    "max_latency_ms": row["max_latency_ms"] or 0.0,
+                    "retries": row["retries"] or 0,
+                    "failures": row["failures"] or 0,
+                }
+                for row in cursor.fetchall()
+            ]
+    except Exception as e:
+        logger.get_logger().error(f"Error loading LLM usage: {e}")
+        return []
+
+
+def get_usage_totals(
+    username: Optional[str] = None,
+    file_hash: Optional[str] = None,
+    since: Optional[str] = None
+) -> Dict[str, Any]:
+    """Total LLM usage (same fields as get_usage_summary, over all matching calls)"""
+    totals = {
+        "calls": 0, "coalesced": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+        "cost_usd": 0.0, "retries": 0, "failures": 0
+    }
+    for group in get_usage_summary("model", username=username, file_hash=file_hash, since=since):
+        for key in totals:
+            totals[key] += group[key]
+    return totals
+
@@ -0,0 +1,266 @@
+"""Per-document BM25 index for ranking chunks by keyword relevance and information density"""
+
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..core.logger import logger
+
+
+# Common English words that carry no topical information
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just may me might
+more most must my myself no nor not now of off on once only or other our ours ourselves out over own
+same shall she should so some such than that the their theirs them themselves then there these they
+this those through to too under until up upon us very was we were what when where which while who
+whom why will with within without would you your yours yourself yourselves
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9\-]+")
+
+# Maximum number of document indexes kept in memory
+MAX_CACHED_INDEXES = 32
+
+# A chunk without sentence endings, with at most this many words and at least
+# LIST_MIN_COMMAS commas is treated as a simple list of terms
+LIST_MAX_WORDS = 20
+LIST_MIN_COMMAS = 5
+
+_WHITESPACE_BYTES = np.frombuffer(b" \t\n\r\x0b\x0c", dtype=np.uint8)
+_SENTENCE_END_BYTES = np.frombuffer(b".?!", dtype=np.uint8)
+_PUNCTUATION_BYTES = np.frombuffer(b".,;:!?()[]{}\"'-", dtype=np.uint8)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords and very short tokens"""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 2 and token not in STOPWORDS
+    ]
+
+
+def chunks_digest(chunks: List[str]) -> str:
+    """Stable digest identifying a list of chunks"""
+    hasher = hashlib.sha1()
+    for chunk in chunks:
+        hasher.update(chunk.encode("utf-8", errors="ignore"))
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+class ChunkFeatures:
+    """
+    Per-chunk surface features, one NumPy array per column.
+
+    All chunks are concatenated into a single byte array and counted with
+    bincount over chunk ids, so the table is built in one linear pass without
+    per-chunk Python loops.
+    """
+
+    def __init__(self, chunks: List[str]):
+        self.num_chunks = len(chunks)
+        encoded = [chunk.encode("utf-8", errors="ignore") for chunk in chunks]
+        lengths = np.fromiter((len(data) for data in encoded), dtype=np.int64, count=self.num_chunks)
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        row_ids = np.repeat(np.arange(self.num_chunks), lengths)
+
+        def count_per_chunk(mask: np.ndarray) -> np.ndarray:
+            return np.bincount(row_ids[mask], minlength=self.num_chunks)
+
+        # A word starts at a non-whitespace byte preceded by whitespace or the start of its chunk
+        is_space = np.isin(data, _WHITESPACE_BYTES)
+        follows_space = np.ones(len(data), dtype=bool)
+        follows_space[1:] = is_space[:-1]
+        chunk_starts = (np.cumsum(lengths) - lengths)[lengths > 0]
+        follows_space[chunk_starts] = True
+
+        self.byte_count = lengths
+        self.word_count = count_per_chunk(~is_space & follows_space)
+        self.sentence_count = count_per_chunk(np.isin(data, _SENTENCE_END_BYTES))
+        self.comma_count = count_per_chunk(data == ord(","))
+        punctuation_count = count_per_chunk(np.isin(data, _PUNCTUATION_BYTES))
+
+        self.sentence_density = self.sentence_count / np.maximum(self.word_count, 1)
+        self.punctuation_ratio = punctuation_count / np.maximum(self.byte_count, 1)
+        self.is_empty = self.word_count == 0
+        self.is_simple_list = (
+            (self.sentence_count == 0)
+            & (self.word_count <= LIST_MAX_WORDS)
+            & (self.comma_count >= LIST_MIN_COMMAS)
+        )
+
+    def useful_mask(self, min_count: int = 0) -> np.ndarray:
+        """
+        Chunks worth generating content from: non-empty and not simple lists.
+
+        Args:
+            min_count: If fewer chunks qualify, list chunks are added back in document order
+
+        Returns:
+            Boolean mask over chunk positions
+        """
+        mask = ~self.is_empty & ~self.is_simple_list
+        needed = min_count - int(mask.sum())
+        if needed > 0:
+            mask[np.flatnonzero(~self.is_empty & self.is_simple_list)[:needed]] = True
+        return mask
+
+
+class ChunkIndex:
+    """
+    BM25 index over the chunks of one document.
+
+    The term matrix is stored in CSR layout (indptr/indices/weights NumPy arrays),
+    so building and scoring stay linear in the number of tokens.
+    """
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75, num_keywords: int = 50):
+        self.num_chunks = len(chunks)
+        self.k1 = k1
+        self.b = b
+
+        vocabulary: Dict[str, int] = {}
+        indptr = [0]
+        indices: List[int] = []
+        counts: List[int] = []
+        for chunk in chunks:
+            term_counts = Counter(tokenize(chunk))
+            for term, count in term_counts.items():
+                indices.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+            indptr.append(len(indices))
+
+        self.vocabulary = vocabulary
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        tf = np.asarray(counts, dtype=np.float64)
+
+        num_terms = len(vocabulary)
+        row_lengths = np.diff(self.indptr)
+        self.row_ids = np.repeat(np.arange(self.num_chunks), row_lengths)
+
+        # Document frequency and BM25 idf per term
+        df = np.bincount(self.indices, minlength=num_terms).astype(np.float64)
+        self.idf = np.log(1.0 + (self.num_chunks - df + 0.5) / (df + 0.5))
+
+        # Chunk lengths (in informative tokens) for length normalisation
+        self.chunk_lengths = np.bincount(self.row_ids, weights=tf, minlength=self.num_chunks)
+        avg_length = self.chunk_lengths.mean() if self.num_chunks else 0.0
+        norm = self.k1 * (1.0 - self.b + self.b * self.chunk_lengths / max(avg_length, 1.0))
+
+        # BM25 weight of every (chunk, term) entry
+        self.weights = self.idf[self.indices] * tf * (self.k1 + 1.0) / (tf + norm[self.row_ids])
+
+        # Document keywords: terms with the highest total BM25 weight across the document
+        term_importance = np.bincount(self.indices, weights=self.weights, minlength=num_terms)
+        top = min(num_keywords, num_terms)
+        self.keyword_ids = np.argsort(-term_importance)[:top] if top else np.array([], dtype=np.int64)
+        inverse_vocabulary = {term_id: term for term, term_id in vocabulary.items()}
+        self.keywords = [inverse_vocabulary[int(term_id)] for term_id in self.keyword_ids]
+
+        self._density_scores = self._compute_density_scores(num_terms)
+        self.features = ChunkFeatures(chunks)
+
+    def _compute_density_scores(self, num_terms: int) -> np.ndarray:
+        """Score chunks by coverage of document keywords and informative term density"""
+        if self.num_chunks == 0:
+            return np.zeros(0)
+
+        is_keyword = np.zeros(num_terms, dtype=bool)
+        is_keyword[self.keyword_ids] = True
+        keyword_scores = np.bincount(
+            self.row_ids, weights=self.weights * is_keyword[self.indices], minlength=self.num_chunks
+        )
+
+        # Sum of idf over distinct terms, per informative token (penalises filler and repetition)
+        distinct_idf = np.bincount(self.row_ids, weights=self.idf[self.indices], minlength=self.num_chunks)
+        density = distinct_idf / np.maximum(self.chunk_lengths, 1.0)
+
+        return 0.7 * _normalize(keyword_scores) + 0.3 * _normalize(density)
+
+    def density_scores(self) -> np.ndarray:
+        """Information density score per chunk (0-1, higher is more useful)"""
+        return self._density_scores
+
+    def score_query(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for a free-text query"""
+        term_ids = [self.vocabulary[term] for term in set(tokenize(query)) if term in self.vocabulary]
+        if not term_ids or self.num_chunks == 0:
+            return np.zeros(self.num_chunks)
+        in_query = np.zeros(len(self.vocabulary), dtype=bool)
+        in_query[term_ids] = True
+        return np.bincount(
+            self.row_ids, weights=self.weights * in_query[self.indices], minlength=self.num_chunks
+        )
+
+    def top_k(
+        self,
+        k: int,
+        query: Optional[str] = None,
+        mask: Optional[np.ndarray] = None,
+        offset: int = 0
+    ) -> List[int]:
+        """
+        Get positions of the k best chunks, in document order.
+
+        Args:
+            k: Number of chunks to return
+            query: Optional query; when given chunks are ranked by BM25 relevance to it
+            mask: Optional boolean mask of candidate positions (e.g. features.useful_mask())
+            offset: Skip this many best chunks first, wrapping around to the best ones
+                (successive offsets of k walk through every candidate)
+
+        Returns:
+            List of 0-based chunk positions sorted by position
+        """
+        scores = self.score_query(query) if query else self._density_scores
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(self.num_chunks)
+        if k >= len(candidates):
+            return [int(pos) for pos in candidates]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        best = np.roll(ranked, -(offset % len(ranked)))[:k]
+        return sorted(int(pos) for pos in best)
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    """Scale values to 0-1"""
+    if values.size == 0:
+        return values
+    low, high = values.min(), values.max()
+    if high - low <= 0:
+        return np.ones_like(values) * 0.5
+    return (values - low) / (high - low)
+
+
+_index_cache: "OrderedDict[str, ChunkIndex]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def build_chunk_index(chunks: List[str]) -> ChunkIndex:
+    """Build the index for a document's chunks and cache it by chunk digest"""
+    digest = chunks_digest(chunks)
+    index = ChunkIndex(chunks)
+    with _index_lock:
+        _index_cache[digest] = index
+        _index_cache.move_to_end(digest)
+        while len(_index_cache) > MAX_CACHED_INDEXES:
+            _index_cache.popitem(last=False)
+    logger.get_logger().info(f"Built chunk index for {len(chunks)} chunks ({len(index.vocabulary)} terms)")
+    return index
+
+
+def get_chunk_index(chunks: List[str]) -> ChunkIndex:
+    """Get the cached index for chunks, building it if it was not built at extraction time"""
+    digest = chunks_digest(chunks)
+    with _index_lock:
+        index = _index_cache.get(digest)
+        if index is not None:
+            _index_cache.move_to_end(digest)
+            return index
+    return build_chunk_index(chunks)
@@ -0,0 +1,323 @@
+"""
+Local OpenAI-compatible chat completions server for offline load and latency testing.
+
+Returns schema-valid quiz / flashcard / interactive / mixed bundle JSON built from the
+chunks in the prompt, with configurable latency, error rate and 429 injection.
+
+Usage:
+    python -m src.tools.fake_llm_server --port 8088 --latency-mean 1.5 --rate-limit-rate 0.05
+
+    OPENAI_BASE_URL=http://127.0.0.1:8088/v1 OPENAI_API_KEY=fake streamlit run src/ui/app.py
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+CHUNK_PATTERN = re.compile(r"\[Chunk (\d+)\]\n(.*?)(?=\n\n\[Chunk \d+\]|\n\n\[Note:|\n\n⚠️|\Z)", re.S)
+
+
+@dataclass
+class FakeLLMConfig:
+    """Behaviour of the fake server"""
+    latency_distribution: str = "lognormal"  # "fixed", "uniform", "normal" or "lognormal"
+    latency_mean: float = 1.0  # Seconds
+    latency_stddev: float = 0.5  # Seconds (spread for uniform/normal/lognormal)
+    error_rate: float = 0.0  # Fraction of requests answered with HTTP 500
+    rate_limit_rate: float = 0.0  # Fraction of requests answered with HTTP 429
+    retry_after: float = 1.0  # Retry-After seconds sent with 429s
+    seed: Optional[int] = None
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """Draw a response latency in seconds"""
+        if self.latency_distribution == "fixed" or self.latency_mean <= 0:
+            return max(0.0, self.latency_mean)
+        if self.latency_distribution == "uniform":
+            return max(0.0, rng.uniform(self.latency_mean - self.latency_stddev, self.latency_mean + self.latency_stddev))
+        if self.latency_distribution == "normal":
+            return max(0.0, rng.gauss(self.latency_mean, self.latency_stddev))
+        # Lognormal with the requested mean and standard deviation (long tail like real APIs)
+        variance_ratio = (self.latency_stddev / self.latency_mean) ** 2
+        sigma = math.sqrt(max(1e-9, math.log(1.0 + variance_ratio)))
+        mu = math.log(self.latency_mean) - sigma ** 2 / 2
+        return rng.lognormvariate(mu, sigma)
+
+
+def parse_chunks(text: str) -> List[Tuple[int, str]]:
+    """Extract (chunk_number, chunk) pairs from a prompt"""
+    return [(int(number), chunk.strip()) for number, chunk in CHUNK_PATTERN.findall(text)]
+
+
+def _find_int(pattern: str, text: str, default: int) -> int:
+    match = re.search(pattern, text)
+    return int(match.group(1)) if match else default
+
+
+def _quote(chunk: str, words: int = 12) -> str:
+    return " ".join(chunk.split()[:words])
+
+
+def _words(chunk: str) -> List[str]:
+    words = [w.strip(".,;:!?()[]\"'") for w in chunk.split()]
+    return [w for w in words if len(w) > 3] or ["content"]
+
+
+def _make_options(answer: str, words: List[str], rng: random.Random, count: int = 4) -> List[str]:
+    """answer plus count - 1 distinct distractors (case-insensitively), padded with filler options"""
+    seen = {answer.casefold()}
+    distractors = []
+    for word in words:
+        if word.casefold() not in seen:
+            seen.add(word.casefold())
+            distractors.append(word)
+    options = [answer] + rng.sample(distractors, min(count - 1, len(distractors)))
+    filler = 1
+    while len(options) < count:
+        if f"option {filler}" not in seen:
+            seen.add(f"option {filler}")
+            options.append(f"option {filler}")
+        filler += 1
+    return options
+
+
+def make_questions(chunks: List[Tuple[int, str]], count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    questions = []
+    for i in range(count):
+        number, chunk = chunks[i % len(chunks)]
+        words = _words(chunk)
+        answer = words[rng.randrange(len(words))]
+        questions.append({
+            "question": f"Which term appears in this passage: '{_quote(chunk, 8)}...'? (#{i + 1})",
+            "options": _make_options(answer, words, rng),
+            "correct_answer": 0,
+            "explanation": f"The source states: '{_quote(chunk)}'",
+            "difficulty": rng.choice(["easy", "medium", "hard"]),
+            "source_reference": f"Chunk {number} - EXACT quote: '{_quote(chunk)}'"
+        })
+    return questions
+
+
+def make_cards(chunks: List[Tuple[int, str]], count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    cards = []
+    for i in range(count):
+        number, chunk = chunks[i % len(chunks)]
+        cards.append({
+            "front": f"What does the source say about '{_words(chunk)[0]}'?",
+            "back": _quote(chunk, 25),
+            "difficulty": rng.choice(["easy", "medium", "hard"]),
+            "source_reference": f"Chunk {number} - '{_quote(chunk)}'"
+        })
+    return cards
+
+
+def make_lesson(chunks: List[Tuple[int, str]], count: int, rng: random.Random) -> Dict[str, Any]:
+    steps = []
+    for i in range(count):
+        number, chunk = chunks[i % len(chunks)]
+        steps.append({
+            "step_number": i + 1,
+            "title": f"Step {i + 1}: {_words(chunk)[0]}",
+            "content": _quote(chunk, 40),
+            "checkpoint": f"Summarize: '{_quote(chunk, 8)}...'",
+            "checkpoint_answer": _quote(chunk, 20),
+            "difficulty": rng.choice(["easy", "medium", "hard"]),
+            "source_reference": f"Chunk {number} - '{_quote(chunk)}'"
+        })
+    return {"title": "Lesson", "steps": steps}
+
+
+def build_completion(messages: List[Dict[str, Any]], rng: random.Random) -> Dict[str, Any]:
+    """Build the JSON content the real model would return for these messages"""
+    prompt = "\n\n".join(str(message.get("content", "")) for message in messages if message.get("role") == "user")
+    last = str(messages[-1].get("content", "")) if messages else ""
+    chunks = parse_chunks(prompt) or [(1, "No source content was provided.")]
+
+    # Quiz top-up retry ("...but I need N MORE."); checked first and matched on the exact
+    # phrase, since every first quiz prompt also contains "NO FEWER, NO MORE"
+    top_up = re.search(r"I need (\d+) MORE", last)
+    if top_up:
+        return {"questions": make_questions(chunks, int(top_up.group(1)), rng)}
+    if "learning mode mix" in last:
+        quiz = rng.randint(20, 70)
+        flashcard = rng.randint(0, 100 - quiz)
+        return {"quiz": quiz, "flashcard": flashcard, "interactive": 100 - quiz - flashcard, "reasoning": "Simulated"}
+    if "mixed learning bundle" in last:
+        return {
+            "quiz": {"questions": make_questions(chunks, _find_int(r"EXACTLY (\d+) multiple-choice", last, 5), rng)},
+            "flashcards": {"cards": make_cards(chunks, _find_int(r"Generate (\d+) flashcards", last, 10), rng)},
+            "interactive": make_lesson(chunks, _find_int(r"interactive (\d+)-step", last, 3), rng)
+        }
+    if "flashcards from the source" in last:
+        return {"cards": make_cards(chunks, _find_int(r"Generate (\d+) flashcards", last, 10), rng)}
+    if "interactive lesson plan from the source" in last:
+        return make_lesson(chunks, _find_int(r"interactive (\d+)-step", last, 3), rng)
+    return {"questions": make_questions(chunks, _find_int(r"EXACTLY (\d+) QUESTIONS", last, 5), rng)}
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """HTTP server holding the fake backend's configuration and counters"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: FakeLLMConfig):
+        super().__init__(address, FakeLLMHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """Handles /v1/chat/completions and /v1/models"""
+
+    server: FakeLLMServer
+
+    def log_message(self, format: str, *args) -> None:
+        # Keep load tests quiet
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+
+        config = self.server.config
+        with self.server.rng_lock:
+            self.server.stats["requests"] += 1
+            roll = self.server.rng.random()
+            latency = config.sample_latency(self.server.rng)
+            seed = self.server.rng.random()
+
+        if roll < config.rate_limit_rate:
+            with self.server.rng_lock:
+                self.server.stats["rate_limited"] += 1
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (simulated)", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"Retry-After": f"{config.retry_after:g}"}
+            )
+            return
+
+        time.sleep(latency)
+
+        if roll < config.rate_limit_rate + config.error_rate:
+            with self.server.rng_lock:
+                self.server.stats["errors"] += 1
+            self._send_json(500, {"error": {"message": "Internal server error (simulated)", "type": "server_error"}})
+            return
+
+        messages = request.get("messages") or []
+        content = json.dumps(build_completion(messages, random.Random(seed)))
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4
+        completion_tokens = len(content) // 4
+
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0}
+            }
+        })
+
+
+def start_fake_llm_server(host: str = "127.0.0.1", port: int = 0, config: Optional[FakeLLMConfig] = None) -> FakeLLMServer:
+    """
+    Start the fake server on a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        config: Latency/error behaviour
+
+    Returns:
+        The running server (base_url gives the value for OPENAI_BASE_URL; call shutdown() to stop)
+    """
+    server = FakeLLMServer((host, port), config or FakeLLMConfig())
+    thread = threading.Thread(target=server.serve_forever, name="fake-llm-server", daemon=True)
+    thread.start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "normal", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=1.0, help="Mean latency in seconds")
+    parser.add_argument("--latency-stddev", type=float, default=0.5, help="Latency spread in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency_distribution=args.latency_distribution,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    server = FakeLLMServer((args.host, args.port), config)
+    print(f"Fake LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {server.stats['requests']} requests "
+              f"({server.stats['rate_limited']} rate limited, {server.stats['errors']} errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Token counting and prompt packing for LLM generation requests"""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.config import get_int_setting
+from ..core.logger import logger
+
+# Try to import tiktoken, but make it optional
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    logger.get_logger().warning("tiktoken not installed, token counts will be estimated. Install with: pip install tiktoken")
+
+
+# Prompt token budget per model (system prompt + instructions + source chunks).
+# These are well below the context windows and keep per-request cost predictable.
+MODEL_PROMPT_TOKEN_BUDGETS: Dict[str, int] = {
+    "gpt-4o-mini": 16000,
+    "gpt-4o": 16000,
+    "gpt-4.1-mini": 16000,
+    "gpt-4.1-nano": 16000,
+    "gpt-4.1": 16000,
+    "gpt-4-turbo": 16000,
+    "gpt-3.5-turbo": 12000,
+}
+DEFAULT_PROMPT_TOKEN_BUDGET = 12000
+
+# Chat format overhead (per message and for the assistant reply primer)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+CHUNK_SEPARATOR = "\n\n"
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str) -> Optional[Any]:
+    """Get (and cache) the tiktoken encoding for a model"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Unknown to this tiktoken version - use the GPT-4o family encoding
+        for encoding_name in ("o200k_base", "cl100k_base"):
+            try:
+                return tiktoken.get_encoding(encoding_name)
+            except (KeyError, ValueError):
+                continue
+    return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Count tokens in text for a model.
+
+    Falls back to a ~4 characters/token estimate if tiktoken is unavailable.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = "gpt-4o-mini") -> int:
+    """Count prompt tokens for a list of chat messages, including chat format overhead"""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE
+        total += count_tokens(message.get("content", ""), model)
+    return total
+
+
+def get_prompt_token_budget(model: str) -> int:
+    """Get the prompt token budget for a model (OPENAI_PROMPT_TOKEN_BUDGET overrides the per-model default)"""
+    default_budget = MODEL_PROMPT_TOKEN_BUDGETS.get(model, DEFAULT_PROMPT_TOKEN_BUDGET)
+    return get_int_setting("OPENAI_PROMPT_TOKEN_BUDGET", default_budget)
+
+
+def format_chunk(chunk_number: int, chunk: str) -> str:
+    """Format a chunk with its reference number as it appears in prompts"""
+    return f"[Chunk {chunk_number}]\n{chunk}"
+
+
+@dataclass
+class PackedChunks:
+    """Result of packing chunks into a token budget"""
+    chunks: List[Tuple[int, str]]  # Selected (chunk_number, chunk) pairs in document order
+    text: str  # Formatted chunk text ready to embed in a prompt
+    tokens: int  # Tokens used by text
+    available_tokens: int  # Tokens that were available for chunks
+    dropped: List[int] = field(default_factory=list)  # Chunk numbers that did not fit
+
+
+class PromptPacker:
+    """
+    Packs numbered source chunks into a model's prompt token budget.
+
+    Instead of cutting the document after the first N characters, the document is
+    split into contiguous strata and chunks are picked round-robin across strata,
+    so every part of the document is represented when the budget is tight.
+    """
+
+    def __init__(self, model: str, budget: Optional[int] = None):
+        self.logger = logger.get_logger()
+        self.model = model
+        self.budget = budget if budget is not None else get_prompt_token_budget(model)
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens in text for this packer's model"""
+        return count_tokens(text, self.model)
+
+    def count_message_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Count prompt tokens for chat messages for this packer's model"""
+        return count_message_tokens(messages, self.model)
+
+    def pack(
+        self,
+        numbered_chunks: List[Tuple[int, str]],
+        reserved_tokens: int = 0,
+        scores: Optional[Dict[int, float]] = None
+    ) -> PackedChunks:
+        """
+        Select chunks that fit into the budget left after reserved_tokens.
+
+        Args:
+            numbered_chunks: (chunk_number, chunk) pairs in document order
+            reserved_tokens: Tokens already used by system prompt and instructions
+            scores: Optional chunk_number -> usefulness score; within each stratum
+                higher-scoring chunks are picked first
+
+        Returns:
+            PackedChunks with the selected chunks in document order
+        """
+        available = max(0, self.budget - reserved_tokens)
+        separator_tokens = self.count_tokens(CHUNK_SEPARATOR)
+        costs = [
+            self.count_tokens(format_chunk(number, chunk)) + separator_tokens
+            for number, chunk in numbered_chunks
+        ]
+        total_cost = sum(costs)
+
+        if total_cost <= available:
+            selected_positions = list(range(len(numbered_chunks)))
+        else:
+            priorities = None
+            if scores:
+                priorities = [scores.get(number, 0.0) for number, _ in numbered_chunks]
+            selected_positions = self._select_stratified(costs, available, priorities)
+
+        selected = [numbered_chunks[pos] for pos in selected_positions]
+        selected_set = set(selected_positions)
+        dropped = [number for pos, (number, _) in enumerate(numbered_chunks) if pos not in selected_set]
+
+        text = CHUNK_SEPARATOR.join(format_chunk(number, chunk) for number, chunk in selected)
+        used_tokens = sum(costs[pos] for pos in selected_positions)
+
+        if dropped:
+            self.logger.info(
+                f"Packed {len(selected)}/{len(numbered_chunks)} chunks into {used_tokens}/{available} "
+                f"available tokens (budget {self.budget}, reserved {reserved_tokens}); "
+                f"{len(dropped)} chunks left out"
+            )
+
+        return PackedChunks(
+            chunks=selected,
+            text=text,
+            tokens=used_tokens,
+            available_tokens=available,
+            dropped=dropped
+        )
+
+    def _select_stratified(
+        self,
+        costs: List[int],
+        available: int,
+        priorities: Optional[List[float]] = None
+    ) -> List[int]:
+        """Pick chunk positions round-robin across contiguous document strata until the budget is full"""
+        if not costs or available <= 0:
+            return []
+
+        average_cost = max(1, sum(costs) // len(costs))
+        num_strata = max(1, min(len(costs), available // average_cost))
+        stratum_size = len(costs) / num_strata
+        strata = [
+            list(range(int(s * stratum_size), int((s + 1) * stratum_size)))
+            for s in range(num_strata)
+        ]
+        strata = [stratum for stratum in strata if stratum]
+        if priorities:
+            # Best chunks of each stratum first
+            strata = [sorted(stratum, key=lambda pos: -priorities[pos]) for stratum in strata]
+
+        selected = []
+        remaining = available
+        while strata and remaining > 0:
+            next_round = []
+            for stratum in strata:
+                # Take the first chunk of this stratum that still fits
+                while stratum and costs[stratum[0]] > remaining:
+                    stratum.pop(0)
+                if not stratum:
+                    continue
+                pos = stratum.pop(0)
+                selected.append(pos)
+                remaining -= costs[pos]
+                if stratum:
+                    next_round.append(stratum)
+            strata = next_round
+
+        return sorted(selected)
@@ -8,6 +8,8 @@ from typing import Dict, Any, Optional
 import json
 import random
 import html
+import time
+from datetime import datetime
 
 # Add parent directory to path for imports
 import sys
@@ -17,6 +19,17 @@ from src.agents.manager_agent import ManagerAgent
 from src.core.messages import ContentType, LearningMode
 from src.core.logger import logger
 from src.core.memory import load_state
+from src.core.config import get_float_setting
+from src.core.schemas import QUIZ_OPTION_COUNT
+
+# Seconds between job status checks while a background extract/generate job runs
+JOB_POLL_SECONDS = 0.5
+
+# Answers are buffered in the session and recorded in one batch when a quiz or lesson is
+# finished, before leaving the content, or once the oldest has waited this long
+ANSWER_FLUSH_IDLE_SECONDS = get_float_setting("ANSWER_FLUSH_IDLE_SECONDS", 30.0)
+# Record buffered answers once this many are waiting
+ANSWER_BUFFER_MAX = 50
 
 
 # Page configuration
@@ -48,6 +61,8 @@ if "manager" not in st.session_state or st.session_state.get("username") != st.s
     st.session_state.quiz_answers = {}  # For storing quiz answers
     st.session_state.quiz_submitted = {}  # For tracking submitted quizzes
     st.session_state.checkpoint_responses = {}  # For storing interactive checkpoint responses
+    st.session_state.pending_answers = []  # Answers not yet recorded for analytics
+    st.session_state.generation_rounds = {}  # filename -> mode -> times generated (rotates the chunk selection)
 
 # Load theme CSS if available
 theme_css_path = Path(__file__).parent / "theme.css"
@@ -146,6 +161,49 @@ def render_survey():
             st.error(f"Error: {result.get('error', 'Unknown error')}")
 
 
+def buffer_answer(chunk_id: str, source_reference: str, is_correct: bool, question_text: str, filename: Optional[str]):
+    """Queue an answer for analytics; buffered answers are recorded together by flush_answers()"""
+    if not st.session_state.get("pending_answers"):
+        st.session_state.pending_answers = []
+        st.session_state.pending_answers_since = time.time()
+    st.session_state.pending_answers.append({
+        "chunk_id": chunk_id,
+        "source_reference": source_reference,
+        "is_correct": is_correct,
+        "question_text": question_text,
+        "filename": filename,
+        "timestamp": datetime.now().isoformat()
+    })
+    if len(st.session_state.pending_answers) >= ANSWER_BUFFER_MAX:
+        flush_answers()
+
+
+def flush_answers(idle_only: bool = False):
+    """
+    Record buffered answers with one state load and save.
+    
+    idle_only: only flush if the oldest answer has waited ANSWER_FLUSH_IDLE_SECONDS
+    """
+    pending = st.session_state.get("pending_answers")
+    if not pending:
+        return
+    if idle_only and time.time() - st.session_state.get("pending_answers_since", 0) < ANSWER_FLUSH_IDLE_SECONDS:
+        return
+    from src.core.analytics import record_quiz_answers
+    st.session_state.pending_answers = []
+    record_quiz_answers(pending, username=st.session_state.get("username"))
+
+
+def flush_idle_answers():
+    """Record buffered answers that have waited ANSWER_FLUSH_IDLE_SECONDS"""
+    flush_answers(idle_only=True)
+
+
+if hasattr(st, "fragment"):
+    # Also re-run on a timer, so answers are recorded when the user stops interacting
+    flush_idle_answers = st.fragment(run_every=ANSWER_FLUSH_IDLE_SECONDS)(flush_idle_answers)
+
+
 def render_quiz_content(data: Dict[str, Any]):
     """Render quiz content"""
     questions = data.get("questions", [])
@@ -168,7 +226,7 @@ def render_quiz_content(data: Dict[str, Any]):
         options = q.get("options", [])
         correct_answer_idx = q.get("correct_answer", 0)
         
-        if len(options) >= 4:
+        if len(options) == QUIZ_OPTION_COUNT:
             # Shuffle options if not already shuffled for this question
             if i not in st.session_state.quiz_shuffled:
                 # Create shuffled options with mapping
@@ -221,7 +279,7 @@ def render_quiz_content(data: Dict[str, Any]):
                 st.session_state.quiz_submitted[i] = True
                 # Track performance immediately on submit (only once)
                 if "source_reference" in q and not st.session_state.get(tracking_key, False):
-                    from src.core.analytics import record_quiz_answer, extract_chunk_id_from_reference
+                    from src.core.analytics import extract_chunk_id_from_reference
                     user_selected_idx = shuffled_options.index(st.session_state.quiz_answers[answer_key]) if st.session_state.quiz_answers[answer_key] in shuffled_options else -1
                     correct_idx = shuffled_data["correct_idx"]
                     is_correct = user_selected_idx == correct_idx
@@ -229,15 +287,21 @@ def render_quiz_content(data: Dict[str, Any]):
                     source_ref = q.get("source_reference", "")
                     filename = st.session_state.get("current_filename", "unknown_file")
                     chunk_id = extract_chunk_id_from_reference(source_ref, filename=filename)
-                    record_quiz_answer(
+                    buffer_answer(
                         chunk_id=chunk_id,
                         source_reference=source_ref,
                         is_correct=is_correct,
                         question_text=q.get("question", ""),
-                        username=st.session_state.get("username"),
                         filename=filename
                     )
                     st.session_state[tracking_key] = True
+                    # Record the whole quiz once every tracked question is answered
+                    tracked_questions = [
+                        j for j, question in enumerate(questions)
+                        if "source_reference" in question and len(question.get("options", [])) == QUIZ_OPTION_COUNT
+                    ]
+                    if all(st.session_state.get(f"quiz_tracked_{j}", False) for j in tracked_questions):
+                        flush_answers()
                 st.rerun()
             
             # Show result if submitted
@@ -491,19 +555,21 @@ def render_interactive_content(data: Dict[str, Any]):
                     
                     # Track performance for analytics (only once per submission)
                     if "source_reference" in step and not st.session_state.get(tracking_key, False):
-                        from src.core.analytics import record_quiz_answer, extract_chunk_id_from_reference
+                        from src.core.analytics import extract_chunk_id_from_reference
                         source_ref = step.get("source_reference", "")
                         filename = st.session_state.get("current_filename", "unknown_file")
                         chunk_id = extract_chunk_id_from_reference(source_ref, filename=filename)
-                        record_quiz_answer(
+                        buffer_answer(
                             chunk_id=chunk_id,
                             source_reference=source_ref,
                             is_correct=is_correct,
                             question_text=f"Interactive Checkpoint: {step.get('checkpoint', '')[:50]}",
-                            username=st.session_state.get("username"),
                             filename=filename
                         )
                         st.session_state[tracking_key] = True
+                    # Record the lesson's answers at its last step
+                    if st.session_state.current_step >= len(steps) - 1:
+                        flush_answers()
                     
                     # Award stars if correct
                     if is_correct:
@@ -699,6 +765,64 @@ def render_performance_heatmap(all_perf: Dict[str, Dict[str, Any]]):
     st.plotly_chart(fig2, use_container_width=True)
 
 
+def render_usage_panel(username: str):
+    """Render token usage and estimated cost of the user's content generation"""
+    from src.core.usage import get_usage_summary, get_usage_totals
+    
+    totals = get_usage_totals(username=username)
+    st.header("💰 AI Usage")
+    if totals["calls"] == 0 and totals["coalesced"] == 0:
+        st.info("No AI usage recorded yet.")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric(
+            "AI Calls", totals["calls"],
+            help=f"Plus {totals['coalesced']} requests that shared an identical in-flight call (charged to that call)"
+        )
+    with col2:
+        st.metric("Prompt Tokens", f"{totals['prompt_tokens']:,}")
+    with col3:
+        st.metric("Completion Tokens", f"{totals['completion_tokens']:,}")
+    with col4:
+        st.metric("Estimated Cost", f"${totals['cost_usd']:.4f}")
+    
+    def usage_rows(groups, label, name_for):
+        return [
+            {
+                label: name_for(group),
+                "Calls": group["calls"],
+                "Shared Calls": group["coalesced"],
+                "Prompt Tokens": group["prompt_tokens"],
+                "Completion Tokens": group["completion_tokens"],
+                "Avg Latency (s)": round(group["avg_latency_ms"] / 1000, 2),
+                "Retries": group["retries"],
+                "Failures": group["failures"],
+                "Cost (USD)": round(group["cost_usd"], 4),
+            }
+            for group in groups
+        ]
+    
+    st.subheader("By Content Type")
+    by_type = get_usage_summary("content_type", username=username)
+    st.dataframe(
+        usage_rows(by_type, "Content Type", lambda group: group["content_type"] or "unknown"),
+        use_container_width=True
+    )
+    
+    st.subheader("By Document")
+    file_mapping = load_state(username).file_mapping or {}
+    by_file = get_usage_summary("file_hash", username=username)
+    st.dataframe(
+        usage_rows(
+            by_file, "Document",
+            lambda group: file_mapping.get(group["file_hash"], group["file_hash"]) or "unknown"
+        ),
+        use_container_width=True
+    )
+
+
 def render_feedback_buttons(mode: str):
     """Render like/dislike feedback buttons"""
     st.markdown("---")
@@ -750,6 +874,7 @@ def main():
         # User info and logout
         st.markdown(f"### 👤 {st.session_state.username}")
         if st.button("🚪 Logout", use_container_width=True):
+            flush_answers()
             st.session_state.authenticated = False
             st.session_state.username = None
             # Clear all session data including _last_username to force reinit on next login
@@ -818,13 +943,14 @@ def main():
                         tmp_path = tmp_file.name
                     
                     # Extract text
-                    extract_result = st.session_state.manager.process_user_request(
+                    extract_result = run_manager_request(
                         "extract",
                         {
                             "file_path": tmp_path,
-                            "file_type": Path(uploaded_file.name).suffix[1:]
+                            "file_type": Path(uploaded_file.name).suffix[1:],
+                            "filename": uploaded_file.name
                         },
-                        st.session_state.session_id
+                        "Extracting text"
                     )
                     
                     if extract_result.get("success"):
@@ -888,9 +1014,13 @@ def main():
                 st.text("No logs yet")
 
 
+    flush_idle_answers()
+    
     # Main area
     # Check if user wants to see analytics
     if st.session_state.get("show_analytics", False):
+        # Show answers given so far
+        flush_answers()
         # Analytics Dashboard - Full Page
         st.title("📊 Analytics & Progress Dashboard")
         
@@ -899,6 +1029,7 @@ def main():
             get_weak_areas,
             get_strong_areas,
             get_all_chunk_performance,
+            get_mode_feedback_summary,
             format_topic_name,
             group_chunks_by_file
         )
@@ -1099,6 +1230,24 @@ def main():
             st.header("⚠️ Weak Areas (Need Improvement)")
             weak_areas = get_weak_areas(threshold=60.0, min_attempts=2, username=username)
             if weak_areas:
+                # Practice buttons: generate a quiz from only the weak chunks of a file
+                from src.core.analytics import get_file_chunks
+                weak_file_hashes = []
+                for area in weak_areas:
+                    if "_chunk_" in area["chunk_id"]:
+                        file_hash = area["chunk_id"].split("_chunk_")[0]
+                        if file_hash not in weak_file_hashes:
+                            weak_file_hashes.append(file_hash)
+                file_mapping = load_state(username).file_mapping or {}
+                for file_hash in weak_file_hashes:
+                    practice_filename = file_mapping.get(file_hash)
+                    if not practice_filename or not get_file_chunks(file_hash):
+                        continue
+                    if st.button(f"🎯 Practice Weak Areas: {practice_filename}", key=f"practice_weak_{file_hash}", type="primary"):
+                        st.session_state.current_filename = practice_filename
+                        st.session_state.show_analytics = False
+                        generate_content_for_mode("quiz", focus="weak_areas")
+                
                 for area in weak_areas[:10]:  # Show top 10 weakest
                     topic_name = format_topic_name(area['source_reference'], max_length=55)
                     with st.expander(f"🔴 {topic_name} - {area['accuracy']:.1f}% accuracy"):
@@ -1152,16 +1301,40 @@ def main():
                             st.text(area['source_reference'])
             else:
                 st.info("No strong areas identified yet. Keep practicing!")
+            
+            st.divider()
+            
+            # Feedback per learning mode
+            st.header("💬 Feedback by Learning Mode")
+            mode_feedback = get_mode_feedback_summary(username)
+            if mode_feedback:
+                st.dataframe(
+                    [
+                        {
+                            "Mode": mode.capitalize(),
+                            "Feedback Given": stats["feedback_count"],
+                            "Average Rating": round(stats["average_feedback"], 2),
+                            "Positive (%)": round(stats["positive_rate"] * 100, 1),
+                        }
+                        for mode, stats in sorted(mode_feedback.items())
+                    ],
+                    use_container_width=True
+                )
+            else:
+                st.info("No feedback given yet.")
         else:
             st.info("📝 Complete some quizzes to see your progress and analytics!")
             if st.button("← Back to Learning"):
                 st.session_state.show_analytics = False
                 st.rerun()
+        
+        st.divider()
+        render_usage_panel(username)
     
     elif not survey_completed:
         render_survey()
     else:
-        if st.session_state.extracted_chunks is None:
+        if st.session_state.extracted_chunks is None and st.session_state.generated_content is None:
             st.info("👆 Upload a file in the sidebar to get started!")
         elif st.session_state.generated_content is None:
             st.info("📝 Content will appear here after processing your file.")
@@ -1198,8 +1371,15 @@ def main():
                     else:
                         st.info("🎯 Interactive content will be generated here. Try generating interactive content specifically or wait for it to be included in the mixed bundle.")
             
-            elif content_type == ContentType.QUIZ.value:
+            else:
+                render_mode_switcher(content_type)
+            
+            if content_type == ContentType.QUIZ.value:
                 render_quiz_content(content.get("data", {}))
+                if not content.get("focus"):
+                    page = st.session_state.get("quiz_page", 1)
+                    if st.button("➕ More Questions", key=f"more_questions_{page}", use_container_width=True):
+                        generate_content_for_mode("quiz", page=page + 1)
                 render_feedback_buttons("quiz")
             
             elif content_type == ContentType.FLASHCARD.value:
@@ -1211,29 +1391,97 @@ def main():
                 render_feedback_buttons("interactive")
 
 
-def generate_content_for_mode(mode: str):
-    """Generate content for a specific mode"""
+def render_mode_switcher(current_mode: str):
+    """Buttons for switching the current file to another learning mode (usually prefetched, so instant)"""
+    modes = [
+        (ContentType.QUIZ.value, "📝 Quiz"),
+        (ContentType.FLASHCARD.value, "🃏 Flashcards"),
+        (ContentType.INTERACTIVE.value, "🎯 Interactive")
+    ]
+    columns = st.columns(len(modes))
+    for column, (mode, label) in zip(columns, modes):
+        with column:
+            if st.button(label, key=f"switch_mode_{mode}", disabled=mode == current_mode, use_container_width=True):
+                generate_content_for_mode(mode)
+
+
+def run_manager_request(action: str, params: Dict[str, Any], label: str) -> Dict[str, Any]:
+    """
+    Run an extract/generate request on the background job queue, showing its progress.
+    
+    The heavy work runs in a worker process; this script only polls the job. When the
+    job queue is disabled the manager runs the request directly and returns its result.
+    """
+    manager = st.session_state.manager
+    session_id = st.session_state.session_id
+    result = manager.process_user_request(action, {**params, "async": True}, session_id)
+    job_id = result.get("job_id")
+    if not job_id:
+        return result
+    
+    progress_bar = st.progress(0.0, text=label)
+    deadline = time.time() + get_float_setting("JOB_TIMEOUT_SECONDS", 600.0)
+    try:
+        while time.time() < deadline:
+            status = manager.process_user_request("job_status", {"job_id": job_id}, session_id)
+            if not status.get("success"):
+                return status
+            progress_bar.progress(float(status["progress"]), text=f"{label}: {status['message']}")
+            if status["done"]:
+                return status["result"] or {"success": False, "error": status["error"]}
+            time.sleep(JOB_POLL_SECONDS)
+    finally:
+        progress_bar.empty()
+    return {"success": False, "error": f"{label} timed out. Please try again."}
+
+
+def generate_content_for_mode(mode: str, focus: Optional[str] = None, page: int = 1):
+    """
+    Generate content for a specific mode.
+    
+    focus="weak_areas" practices only weak chunks of the current file; page > 1 generates
+    the next set of quiz questions, avoiding the ones already shown.
+    """
+    # Answers to the current content are recorded before it is replaced
+    flush_answers()
     with st.spinner(f"Generating {mode} content..."):
         # Pass chunks directly as fallback if available in session state
         params = {
                 "content_type": mode,
-                "session_id": st.session_state.session_id
+                "session_id": st.session_state.session_id,
+                "filename": st.session_state.get("current_filename")
         }
+        if focus:
+            # Chunks are looked up from the file's chunk index by the orchestrator
+            params["focus"] = focus
         # Add chunks from session state as fallback AND primary source
-        if st.session_state.extracted_chunks:
+        elif st.session_state.extracted_chunks:
             params["extracted_chunks"] = st.session_state.extracted_chunks
             params["chunks"] = st.session_state.extracted_chunks  # Also try the standard key
             logger.get_logger().info(f"Passing {len(st.session_state.extracted_chunks)} chunks to generate function")
         else:
             logger.get_logger().warning("No extracted_chunks in session state!")
+        if page > 1:
+            params["page"] = page
+            params["exclude_questions"] = st.session_state.get("quiz_seen_questions", [])
+        # Regenerated content is drawn from chunks the previous generations left out
+        rounds = st.session_state.setdefault("generation_rounds", {}).setdefault(params["filename"], {})
+        params["rounds"] = dict(rounds)
         
-        result = st.session_state.manager.process_user_request(
-            "generate",
-            params,
-            st.session_state.session_id
-        )
+        result = run_manager_request("generate", params, f"Generating {mode} content")
         
         if result.get("success"):
+            result["focus"] = focus
+            if not focus and page == 1:
+                rounds[mode] = rounds.get(mode, 0) + 1
+            # Track quiz pages so "More Questions" doesn't repeat questions
+            if mode == ContentType.QUIZ.value:
+                new_questions = [q.get("question", "") for q in result.get("data", {}).get("questions", [])]
+                if page > 1:
+                    st.session_state.quiz_seen_questions = st.session_state.get("quiz_seen_questions", []) + new_questions
+                else:
+                    st.session_state.quiz_seen_questions = new_questions
+                st.session_state.quiz_page = page
             # Reset quiz state when new content is generated
             if "quiz_shuffled" in st.session_state:
                 st.session_state.quiz_shuffled = {}
@@ -1288,11 +1536,14 @@ def generate_content_for_mode(mode: str):
 
 def generate_mixed_bundle():
     """Generate mixed bundle with all content types"""
+    # Answers to the current content are recorded before it is replaced
+    flush_answers()
     with st.spinner("Generating mixed content bundle..."):
         # Pass chunks directly as fallback if available in session state
         params = {
                 "content_type": ContentType.MIXED.value,
-                "session_id": st.session_state.session_id
+                "session_id": st.session_state.session_id,
+                "filename": st.session_state.get("current_filename")
         }
         # Add chunks from session state as fallback AND primary source
         if st.session_state.extracted_chunks:
@@ -1301,14 +1552,13 @@ def generate_mixed_bundle():
             logger.get_logger().info(f"Passing {len(st.session_state.extracted_chunks)} chunks to generate_mixed_bundle")
         else:
             logger.get_logger().warning("No extracted_chunks in session state for mixed bundle!")
+        rounds = st.session_state.setdefault("generation_rounds", {}).setdefault(params["filename"], {})
+        params["rounds"] = dict(rounds)
         
-        result = st.session_state.manager.process_user_request(
-            "generate",
-            params,
-            st.session_state.session_id
-        )
+        result = run_manager_request("generate", params, "Generating mixed content bundle")
         
         if result.get("success"):
+            rounds[ContentType.MIXED.value] = rounds.get(ContentType.MIXED.value, 0) + 1
             # Reset quiz state when new content is generated
             if "quiz_shuffled" in st.session_state:
                 st.session_state.quiz_shuffled = {}
@@ -38,3 +38,49 @@ CREATE INDEX IF NOT EXISTS idx_rl_state_username ON rl_state(username);
 -- For now, we'll use service role key which bypasses RLS
 -- In production, you may want to add proper RLS policies
 
+
+-- Apply RL state changes in place (one round-trip per save instead of rewriting the row).
+-- Changed columns come in p_fields; changed chunk_performance/file_mapping keys are merged;
+-- new mode_history entries are appended and the oldest dropped beyond p_history_limit.
+-- Returns FALSE if the user has no row yet (the app then writes the full state).
+CREATE OR REPLACE FUNCTION apply_rl_state_delta(
+    p_username TEXT,
+    p_fields JSONB DEFAULT '{}',
+    p_chunk_performance JSONB DEFAULT '{}',
+    p_file_mapping JSONB DEFAULT '{}',
+    p_history_append JSONB DEFAULT '[]',
+    p_history_limit INTEGER DEFAULT NULL
+) RETURNS BOOLEAN AS $$
+DECLARE
+    updated_rows INTEGER;
+BEGIN
+    UPDATE rl_state SET
+        mode_alpha = CASE WHEN p_fields ? 'mode_alpha' THEN p_fields->'mode_alpha' ELSE mode_alpha END,
+        mode_beta = CASE WHEN p_fields ? 'mode_beta' THEN p_fields->'mode_beta' ELSE mode_beta END,
+        mode_history = CASE WHEN p_fields ? 'mode_history' THEN p_fields->'mode_history' ELSE mode_history || p_history_append END,
+        chunk_performance = CASE WHEN p_fields ? 'chunk_performance' THEN p_fields->'chunk_performance' ELSE chunk_performance || p_chunk_performance END,
+        file_mapping = CASE WHEN p_fields ? 'file_mapping' THEN p_fields->'file_mapping' ELSE file_mapping || p_file_mapping END,
+        survey_completed = CASE WHEN p_fields ? 'survey_completed' THEN (p_fields->>'survey_completed')::BOOLEAN ELSE survey_completed END,
+        initial_preference = CASE WHEN p_fields ? 'initial_preference' THEN p_fields->>'initial_preference' ELSE initial_preference END,
+        total_sessions = CASE WHEN p_fields ? 'total_sessions' THEN (p_fields->>'total_sessions')::INTEGER ELSE total_sessions END,
+        last_updated = CASE WHEN p_fields ? 'last_updated' THEN (p_fields->>'last_updated')::TIMESTAMP WITH TIME ZONE ELSE last_updated END,
+        updated_at = NOW()
+    WHERE username = p_username;
+
+    GET DIAGNOSTICS updated_rows = ROW_COUNT;
+    IF updated_rows = 0 THEN
+        RETURN FALSE;
+    END IF;
+
+    IF p_history_limit IS NOT NULL THEN
+        UPDATE rl_state SET mode_history = (
+            SELECT COALESCE(jsonb_agg(entry ORDER BY position), '[]'::JSONB)
+            FROM jsonb_array_elements(mode_history) WITH ORDINALITY AS history(entry, position)
+            WHERE position > jsonb_array_length(mode_history) - p_history_limit
+        )
+        WHERE username = p_username AND jsonb_array_length(mode_history) > p_history_limit;
+    END IF;
+
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;